@@ -0,0 +1,109 @@
+"""
+Aggregates for the admin dashboard.
+Each report is one GROUP BY whose filter and grouping columns lead an index, so the
+database reads an index range instead of shipping rows to Python. Results are
+cached per process for ANALYTICS_TTL_SECONDS: the dashboard tolerates a minute of
+staleness, and repeated loads then cost nothing.
+"""
+import os
+import time
+from datetime import date, datetime, timedelta
+from typing import Callable
+
+from sqlalchemy import Integer, and_, cast, func, select
+from sqlalchemy.orm import Session
+
+from models import BossEnemy, CharacterStats, DailyAppUsage, DetoxRule
+
+ANALYTICS_TTL_SECONDS = int(os.getenv("ANALYTICS_TTL_SECONDS", "60"))
+MAX_DAYS = 90
+
+# (report, days) -> (expires_at, rows)
+_cache: dict[tuple[str, int], tuple[float, list]] = {}
+
+
+def _since(days: int) -> date:
+    return date.today() - timedelta(days=days - 1)
+
+
+def level_distribution(db: Session, days: int = 0) -> list[dict]:
+    """Heroes per level (ix_character_stats_level_user)."""
+    rows = db.execute(
+        select(CharacterStats.level, func.count().label("users"))
+        .group_by(CharacterStats.level)
+        .order_by(CharacterStats.level)
+    ).all()
+    return [{"level": level or 1, "users": users} for level, users in rows]
+
+
+def daily_active_users(db: Session, days: int) -> list[dict]:
+    """Users who synced any usage, per day (ix_daily_app_usage_day_user)."""
+    rows = db.execute(
+        select(DailyAppUsage.day, func.count(func.distinct(DailyAppUsage.user_id)))
+        .where(DailyAppUsage.day >= _since(days))
+        .group_by(DailyAppUsage.day)
+        .order_by(DailyAppUsage.day)
+    ).all()
+    return [{"day": str(day), "users": users} for day, users in rows]
+
+
+def boss_kill_rate(db: Session, days: int) -> list[dict]:
+    """Bosses spawned and defeated per day (ix_boss_enemies_date_defeated)."""
+    day = func.date(BossEnemy.date)
+    rows = db.execute(
+        select(day, func.count(), func.sum(cast(BossEnemy.is_defeated, Integer)))
+        .where(BossEnemy.date >= datetime.combine(_since(days), datetime.min.time()))
+        .group_by(day)
+        .order_by(day)
+    ).all()
+    return [
+        {"day": str(d), "bosses": bosses, "defeated": defeated or 0, "kill_rate": round((defeated or 0) / bosses, 4)}
+        for d, bosses, defeated in rows
+    ]
+
+
+def blocked_app_minutes(db: Session, days: int) -> list[dict]:
+    """
+    Minutes spent in apps the user blocked, per day: the total and the average over
+    users with any blocked-app usage that day (ix_daily_app_usage_day_user, then
+    ix_detox_rules_user_app per row).
+    """
+    rows = db.execute(
+        select(DailyAppUsage.day, func.sum(DailyAppUsage.total_seconds), func.count(func.distinct(DailyAppUsage.user_id)))
+        .join(DetoxRule, and_(
+            DetoxRule.user_id == DailyAppUsage.user_id,
+            DetoxRule.app_package_name == DailyAppUsage.app_package_name,
+            DetoxRule.is_blocked == True
+        ))
+        .where(DailyAppUsage.day >= _since(days))
+        .group_by(DailyAppUsage.day)
+        .order_by(DailyAppUsage.day)
+    ).all()
+    return [
+        {"day": str(day), "total_minutes": round(seconds / 60, 1), "users": users,
+         "avg_minutes": round(seconds / 60 / users, 1)}
+        for day, seconds, users in rows
+    ]
+
+
+REPORTS: dict[str, Callable[[Session, int], list[dict]]] = {
+    "levels": level_distribution,
+    "daily_active": daily_active_users,
+    "boss_kill_rate": boss_kill_rate,
+    "blocked_minutes": blocked_app_minutes,
+}
+
+
+def report(db: Session, name: str, days: int = 30) -> list[dict]:
+    """A report's rows, from the cache while fresh."""
+    key = (name, days)
+    entry = _cache.get(key)
+    if entry is not None and entry[0] >= time.monotonic():
+        return entry[1]
+    rows = REPORTS[name](db, days)
+    _cache[key] = (time.monotonic() + ANALYTICS_TTL_SECONDS, rows)
+    return rows
+
+
+def clear_cache() -> None:
+    _cache.clear()
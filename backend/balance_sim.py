@@ -1,127 +1,287 @@
+"""
+Population balance simulator.
+Plays a population of synthetic heroes through the real game rules (game_logic and
+the batch_engine the sync endpoints use) for a number of days, and writes
+percentiles of level, resources and buildings at checkpoint days to a JSON file.
 
+Each player samples a usage profile (how often they sync, minutes in a blocked app,
+in an app with a daily limit and in other apps). Each day they get a fresh boss
+(roll_boss), and every sync resolves like game_loop._resolve_turn: battle, boss XP,
+level ups, city expansion, then quests (claimed straight away and reset nightly).
+Rule XP is not modelled, as a sync never adds it to the hero. At the end of the day
+they spend bronze, gold and diamonds on the cheapest building they can afford
+(a new one, else an upgrade).
+Stats are plain slotted objects initialized from the CharacterStats column defaults,
+so no database is involved. Players are split into chunks run on a process pool;
+results are reproducible for a given --seed, whatever the worker count.
+
+Usage: python balance_sim.py [population] [--users 100000] [--days 90] [--workers N] [--seed 1]
+                                          [--out balance_results.json]
+       python balance_sim.py sweep [--base-xp 80 100 120] [--factor 1.4 1.5] [--cost-scale 0.5 1 2]
+                                   [--boss-hp 0.8 1 1.2] [--players 1000] [--out balance_sweep.json]
+The sweep mode (balance_sweep.py) runs many configurations at once on NumPy arrays,
+caching each one's results on disk.
+"""
+import argparse
+import json
+import math
+import os
 import random
-from typing import Tuple
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from types import SimpleNamespace
+from typing import Optional
+
+import numpy as np
+
+from models import CharacterStats, CityState
+from game_logic import BASE_XP, FACTOR, BUILDING_COSTS, RuleIndex, roll_boss, apply_level_up, expand_city, calculate_upgrade_cost
+from batch_engine import encode_aggregates, batch_battle_outcome
+from quest_engine import DEFAULT_QUESTS, battle_events, codes_for
+from game_loop import STARTING_BRONZE, STARTING_GOLD
+
+# Synthetic apps: one the player blocks, one with a daily limit, one without a rule
+BLOCKED_APP = "com.sim.blocked"
+LIMITED_APP = "com.sim.limited"
+OTHER_APP = "com.sim.other"
+
+CHECKPOINT_DAYS = (1, 7, 14, 30, 60, 90)
+PERCENTILES = (5, 25, 50, 75, 95, 99)
+METRICS = ("level", "xp", "gold", "bronze", "diamond", "buildings", "building_levels", "city_level")
+CHUNK_SIZE = 1000  # Players per pool task
+
+START_DAY = date(2024, 1, 1)
 
 # ==========================================
-# MOCK GAME LOGIC (Copied/Adapted from game_logic.py)
+# SIMULATED STATE
 # ==========================================
 
-BASE_XP = 100
-FACTOR = 1.5
+def _column_default(model, column: str):
+    return model.__table__.c[column].default.arg
 
-# "Bronze" seems to be a placeholder for Wood/Stone. Let's assume Wood.
-BUILDING_COSTS = {
-    "mine": {"wood": 500, "gold": 50, "diamond": 0},
-    "town_hall": {"wood": 5000, "gold": 1000, "diamond": 50},
-}
 
-class MockStats:
+class SimStats:
+    """The CharacterStats attributes game_logic reads and writes, without the ORM."""
+    __slots__ = ("level", "xp", "health", "max_health", "attack_power", "defense", "gold", "diamond", "bronze")
+
+    def __init__(self):
+        for name in self.__slots__:
+            setattr(self, name, _column_default(CharacterStats, name))
+        # Starting resources granted at onboarding (game_loop.create_user)
+        self.bronze = STARTING_BRONZE
+        self.gold = STARTING_GOLD
+
+
+class SimCity:
+    __slots__ = ("level", "unlocked_rings", "population")
+
     def __init__(self):
-        self.level = 1
-        self.xp = 0
-        self.gold = 0
-        self.diamond = 0
-        self.wood = 0
-        self.buildings = {"mine": 0} # Level 0
-        
-def calculate_xp_required(level: int) -> int:
-    return int(BASE_XP * (level ** FACTOR))
-
-def simulate_session(stats: MockStats) -> int:
-    # Usage XP
-    usage_xp = 20 
-    stats.xp += usage_xp
-    return usage_xp
-
-def collect_resources(stats: MockStats):
-    # Base gathering (Forest foraging) = 10 Wood/day (very low) or 5/hour?
-    # Let's assume constant trickle: 5 Wood/hr * 4 hrs/session? 
-    # Or daily total?
-    # Let's assume 1 Day = 24 hours of passive income if "Idle".
-    # Base: 5 Wood/hr.
-    # Mine Lv 1: +10 Wood/hr.
-    
-    hourly_rate = 5 + (stats.buildings["mine"] * 10)
-    daily_income = hourly_rate * 24
-    stats.wood += daily_income
-    # print(f"    Collected {daily_income} Wood (Rate: {hourly_rate}/hr)")
-
-def attempt_build(stats: MockStats):
-    # Try to build Mine
-    if stats.buildings["mine"] == 0:
-        cost = BUILDING_COSTS["mine"]
-        if stats.wood >= cost["wood"] and stats.gold >= cost["gold"]:
-            stats.wood -= cost["wood"]
-            stats.gold -= cost["gold"]
-            stats.buildings["mine"] = 1
-            print(f"    [BUILD] Constructed Mine! (Wood: {stats.wood}, Gold: {stats.gold})")
-
-def simulate_day(day_num, stats: MockStats):
-    print(f"--- Day {day_num} Start: Lv {stats.level} ({stats.xp}/{calculate_xp_required(stats.level)} XP) [Wood: {stats.wood}, Gold: {stats.gold}] ---")
-    
-    # 1. Boss Battle
-    boss_hp = int(100 * stats.level * 1.25)
-    boss_xp = boss_hp * 2
-    stats.xp += boss_xp
-    check_level_up(stats)
-    
-    # 2. Sync Sessions (5 times)
-    for i in range(5):
-        simulate_session(stats)
-        check_level_up(stats)
-        
-    # 3. Daily Resource Collection (Passive)
-    collect_resources(stats)
-    
-    # 4. Try to Build
-    attempt_build(stats)
-        
-    print(f"  End Day {day_num}: Lv {stats.level} [Wood: {stats.wood}, Gold: {stats.gold}]")
-
-def check_level_up(stats: MockStats):
-    req = calculate_xp_required(stats.level)
-    while stats.xp >= req:
-        stats.xp -= req
-        stats.level += 1
-        stats.gold += 100
-        stats.diamond += 5
-        # print(f"    -> LEVEL UP! Now {stats.level}")
-        req = calculate_xp_required(stats.level)
+        for name in self.__slots__:
+            setattr(self, name, _column_default(CityState, name))
+
+
+class SimBoss:
+    __slots__ = ("name", "total_hp", "current_hp", "damage_dealt_to_user", "is_defeated")
+
+    def __init__(self, name: str, total_hp: int):
+        self.name, self.total_hp, self.current_hp = name, total_hp, total_hp
+        self.damage_dealt_to_user, self.is_defeated = 0, False
+
+
+class Profile:
+    """A player's usage habits, sampled once."""
+    __slots__ = ("syncs_per_day", "minutes", "sessions", "limit_minutes")
+
+    def __init__(self, rng: random.Random):
+        self.syncs_per_day = rng.randint(1, 6)
+        # Mean minutes per day and sessions per day for each app
+        self.minutes = {
+            BLOCKED_APP: rng.lognormvariate(math.log(40), 0.9),
+            LIMITED_APP: rng.lognormvariate(math.log(30), 0.7),
+            OTHER_APP: rng.lognormvariate(math.log(60), 0.6),
+        }
+        self.sessions = {app: rng.randint(1, 12) for app in self.minutes}
+        self.limit_minutes = rng.choice((15, 30, 45, 60, 90))
+
+    def rules(self) -> RuleIndex:
+        return RuleIndex([
+            SimpleNamespace(app_package_name=BLOCKED_APP, daily_limit_minutes=None, is_blocked=True),
+            SimpleNamespace(app_package_name=LIMITED_APP, daily_limit_minutes=self.limit_minutes, is_blocked=False),
+        ])
+
+
+QUEST_REWARDS = {quest["code"]: (quest["reward_xp"], quest["reward_gold"]) for quest in DEFAULT_QUESTS}
 
 # ==========================================
-# MAIN SIMULATION
+# ONE PLAYER
 # ==========================================
 
-def run_simulation():
-    stats = MockStats()
-    print("Starting 7-Day Simulation...")
-    print(f"Config: BASE_XP={BASE_XP}, FACTOR={FACTOR}")
-    
-    for day in range(1, 8):
-        simulate_day(day, stats)
-        
-    print("\n--- Final Report ---")
-    print(f"Day 7 Result: Level {stats.level}, Wood: {stats.wood}, Gold: {stats.gold}")
-    
-    if stats.level > 10:
-        print("VERDICT XP: Progression TOO FAST.")
-    elif stats.level < 4:
-        print("VERDICT XP: Progression TOO SLOW.")
-    else:
-        print("VERDICT XP: Progression BALANCED.")
-
-    print("\n--- Building Cost Review ---")
-    print(f"Town Hall Cost: {BUILDING_COSTS['town_hall']}")
-    
-    if stats.gold < BUILDING_COSTS['town_hall']['gold']:
-        print(f"FAIL: Gold ({stats.gold}) < Required ({BUILDING_COSTS['town_hall']['gold']}).")
-        print("  -> Suggestion: Increase Gold per Level Up or reduce Building Gold cost.")
-    
-    if stats.wood < BUILDING_COSTS['town_hall']['wood']:
-        print(f"FAIL: Wood ({stats.wood}) < Required ({BUILDING_COSTS['town_hall']['wood']}).")
-        print("  -> Suggestion: Increase Base Wood rate or Mine production.")
+def _day_syncs(profile: Profile, day: date, rng: random.Random) -> list[tuple[dict, dict]]:
+    """A day's usage as per-sync (sessions, seconds) maps keyed by (app, day), like UsageStream aggregates."""
+    syncs = [({}, {}) for _ in range(profile.syncs_per_day)]
+    for app, mean_minutes in profile.minutes.items():
+        seconds = int(rng.expovariate(1 / mean_minutes) * 60)
+        count = max(1, int(rng.gauss(profile.sessions[app], 1)))
+        for _ in range(count):
+            sessions, totals = syncs[rng.randrange(len(syncs))]
+            sessions[(app, day)] = sessions.get((app, day), 0) + 1
+            totals[(app, day)] = totals.get((app, day), 0) + seconds // count
+    return syncs
+
+
+def _claim_quests(stats: SimStats, city: SimCity, completed: set, codes: list) -> None:
+    for code in codes:
+        if code in completed:
+            continue
+        completed.add(code)
+        xp, gold = QUEST_REWARDS[code]
+        stats.xp += xp
+        stats.gold += gold
+        levels, _ = apply_level_up(stats)
+        expand_city(city, levels)
+
+
+def _play_sync(stats: SimStats, city: SimCity, boss: SimBoss, rules: RuleIndex,
+               sessions: dict, seconds: dict, daily_totals: dict, completed: set) -> None:
+    """One sync, resolved in the order of game_loop._resolve_turn."""
+    columns = encode_aggregates(sessions, seconds, daily_totals)
+    battle = None
+    if not boss.is_defeated:
+        battle = batch_battle_outcome(stats, columns, boss, rules)
+    if battle and battle["boss_defeated"]:
+        stats.xp += battle["xp_reward"]
+    levels, _ = apply_level_up(stats)
+    expand_city(city, levels)
+    if battle:
+        _claim_quests(stats, city, completed, codes_for(battle_events(battle)))
+
+
+def _build(stats: SimStats, buildings: dict) -> None:
+    """Spend on the cheapest affordable purchase (new building, else upgrade) until none is affordable."""
+    while True:
+        options = [
+            (BUILDING_COSTS[kind] if kind not in buildings else calculate_upgrade_cost(kind, buildings[kind]), kind)
+            for kind in BUILDING_COSTS
+        ]
+        affordable = [
+            (cost["bronze"] + cost["gold"] + cost["diamond"], kind, cost) for cost, kind in options
+            if stats.bronze >= cost["bronze"] and stats.gold >= cost["gold"] and stats.diamond >= cost["diamond"]
+        ]
+        if not affordable:
+            return
+        _, kind, cost = min(affordable)
+        stats.bronze -= cost["bronze"]
+        stats.gold -= cost["gold"]
+        stats.diamond -= cost["diamond"]
+        buildings[kind] = buildings.get(kind, 0) + 1
+
+
+def _snapshot(stats: SimStats, city: SimCity, buildings: dict) -> tuple:
+    return (stats.level, stats.xp, stats.gold, stats.bronze, stats.diamond,
+            len(buildings), sum(buildings.values()), city.level)
+
+
+def simulate_player(rng: random.Random, days: int, checkpoints: tuple) -> list[tuple]:
+    """Play one synthetic hero for `days` days; returns a METRICS tuple per checkpoint day."""
+    profile = Profile(rng)
+    rules = profile.rules()
+    stats, city, buildings = SimStats(), SimCity(), {}
+    results = []
+    for day_number in range(1, days + 1):
+        day = START_DAY + timedelta(days=day_number - 1)
+        boss = SimBoss(*roll_boss(stats.level, rng))
+        completed = set()  # Daily quests reset every night
+        daily_totals = {}
+        for sessions, seconds in _day_syncs(profile, day, rng):
+            for key, value in seconds.items():
+                daily_totals[key] = daily_totals.get(key, 0) + value
+            _play_sync(stats, city, boss, rules, sessions, seconds, daily_totals, completed)
+        _build(stats, buildings)
+        if day_number in checkpoints:
+            results.append(_snapshot(stats, city, buildings))
+    return results
+
+
+def simulate_chunk(seed: int, chunk: int, players: int, days: int, checkpoints: tuple) -> np.ndarray:
+    """Players of one pool task; shape (players, checkpoints, METRICS)."""
+    rng = random.Random(seed * 1_000_003 + chunk)
+    return np.array([simulate_player(rng, days, checkpoints) for _ in range(players)], dtype=np.int64)
+
+# ==========================================
+# POPULATION
+# ==========================================
+
+def run_population(users: int, days: int, workers: Optional[int] = None, seed: int = 1) -> dict:
+    """Simulate `users` players for `days` days on a process pool; returns the percentile report."""
+    checkpoints = tuple(day for day in CHECKPOINT_DAYS if day < days) + (days,)
+    chunks = [(seed, chunk, min(CHUNK_SIZE, users - start), days, checkpoints)
+              for chunk, start in enumerate(range(0, users, CHUNK_SIZE))]
+    started = time.perf_counter()
+    if workers == 1:
+        parts = [simulate_chunk(*args) for args in chunks]
     else:
-        print("SUCCESS: Enough Wood for Town Hall.")
-    
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(simulate_chunk, *zip(*chunks)))
+    results = np.concatenate(parts)  # (users, checkpoints, metrics)
+
+    report = {
+        "config": {"users": users, "days": days, "seed": seed, "percentiles": list(PERCENTILES)},
+        "elapsed_seconds": round(time.perf_counter() - started, 2),
+        "checkpoints": {},
+    }
+    for position, day in enumerate(checkpoints):
+        values = np.percentile(results[:, position, :], PERCENTILES, axis=0)
+        report["checkpoints"][str(day)] = {
+            metric: dict(zip((f"p{p}" for p in PERCENTILES), (round(float(v), 2) for v in values[:, i])))
+            for i, metric in enumerate(METRICS)
+        }
+    return report
+
+
+def _run_sweep(args) -> None:
+    import balance_sweep
+
+    params = balance_sweep.grid(args.base_xp, args.factor, args.cost_scale, args.boss_hp)
+    started = time.perf_counter()
+    report, hits = balance_sweep.run_sweep(params, args.players, args.days, args.seed,
+                                           cache_dir=None if args.no_cache else balance_sweep.CACHE_DIR)
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Swept {len(params)} parameter sets ({hits} cached) x {args.players} players x {args.days} days "
+          f"in {time.perf_counter() - started:.1f}s -> {args.out}")
+
+
 if __name__ == "__main__":
-    run_simulation()
+    parser = argparse.ArgumentParser(description="Simulate a player population through the game rules.")
+    commands = parser.add_subparsers(dest="command")
+    population = commands.add_parser("population", help="Per-sync simulation of one configuration (default)")
+    sweep = commands.add_parser("sweep", help="Vectorized day-step simulation over a parameter grid")
+    for command in (parser, population):
+        command.add_argument("--users", type=int, default=100_000)
+        command.add_argument("--days", type=int, default=90)
+        command.add_argument("--workers", type=int, default=os.cpu_count(), help="Processes (1 runs in-process)")
+        command.add_argument("--seed", type=int, default=1)
+        command.add_argument("--out", default="balance_results.json", help="Results file (JSON)")
+    sweep.add_argument("--base-xp", type=float, nargs="+", default=[BASE_XP])
+    sweep.add_argument("--factor", type=float, nargs="+", default=[FACTOR])
+    sweep.add_argument("--cost-scale", type=float, nargs="+", default=[1.0], help="Multiplier on BUILDING_COSTS")
+    sweep.add_argument("--boss-hp", type=float, nargs="+", default=[1.0], help="Multiplier on boss HP")
+    sweep.add_argument("--players", type=int, default=1000, help="Simulated players per parameter set")
+    sweep.add_argument("--days", type=int, default=90)
+    sweep.add_argument("--seed", type=int, default=1)
+    sweep.add_argument("--no-cache", action="store_true", help="Ignore and do not write the on-disk result cache")
+    sweep.add_argument("--out", default="balance_sweep.json", help="Results file (JSON)")
+    args = parser.parse_args()
+
+    if args.command == "sweep":
+        _run_sweep(args)
+        raise SystemExit
+
+    report = run_population(args.users, args.days, args.workers, args.seed)
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    final = report["checkpoints"][str(args.days)]
+    print(f"Simulated {args.users} players x {args.days} days in {report['elapsed_seconds']}s -> {args.out}")
+    print(f"Day {args.days} median: level {final['level']['p50']}, gold {final['gold']['p50']}, "
+          f"bronze {final['bronze']['p50']}, buildings {final['buildings']['p50']}")
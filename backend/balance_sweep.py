@@ -0,0 +1,247 @@
+"""
+Vectorized balance sweep.
+Runs the economy for a grid of parameter sets (XP curve BASE_XP / FACTOR, a scale on
+BUILDING_COSTS and a boss HP multiplier) as NumPy arrays: one row per parameter set,
+one column per simulated player, one step per day. Every parameter set faces the same
+sampled players (common random numbers), so differences between rows come from the
+parameters alone.
+
+Each day is one step: the day's usage is split evenly over the player's syncs,
+the boss falls if the syncs' focus damage covers its HP, and boss XP, quest
+rewards, level ups (against each row's own cumulative XP table) and building
+purchases (cheapest affordable first, at calculate_upgrade_cost prices) follow the
+game rules. balance_sim.simulate_player stays the per-sync reference; use it to
+check a configuration the sweep singles out.
+
+Results are memoized on disk, one .npz per parameter set, keyed by a hash of the
+parameters, the population settings, the game rules the model reads and
+SWEEP_MODEL_VERSION (bump it when the model itself changes). Overlapping grids only compute new points.
+"""
+import hashlib
+import itertools
+import json
+import os
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from game_logic import (
+    BASE_XP, FACTOR, BUILDING_COSTS, MAX_LEVEL, WAKING_MINUTES, LEVEL_UP_GOLD, LEVEL_UP_DIAMOND
+)
+from game_loop import STARTING_BRONZE, STARTING_GOLD
+from models import CharacterStats
+from quest_engine import DEFAULT_QUESTS
+
+SWEEP_MODEL_VERSION = 2
+CACHE_DIR = Path(os.getenv("BALANCE_CACHE_DIR", Path(__file__).resolve().parent / ".balance_cache"))
+
+CHECKPOINT_DAYS = (1, 7, 14, 30, 60, 90)
+PERCENTILES = (10, 50, 90)
+METRICS = ("level", "gold", "bronze", "diamond", "buildings", "building_levels", "boss_kill_rate")
+BLOCK_ELEMENTS = 200_000          # Parameter sets x players per block, bounds memory
+MAX_PURCHASES_PER_DAY = 10
+
+# Game rules the day step applies, beyond those imported above
+START_ATTACK = CharacterStats.__table__.c.attack_power.default.arg
+START_DEFENSE = CharacterStats.__table__.c.defense.default.arg
+QUEST_REWARDS = {quest["code"]: (quest["reward_xp"], quest["reward_gold"]) for quest in DEFAULT_QUESTS}
+BUILDING_KINDS = sorted(BUILDING_COSTS)  # Same tie order as balance_sim._build
+RESOURCES = ("bronze", "gold", "diamond")
+
+
+class SweepParams(NamedTuple):
+    base_xp: float = BASE_XP
+    factor: float = FACTOR
+    cost_scale: float = 1.0       # Multiplies every BUILDING_COSTS amount
+    boss_hp: float = 1.0          # Multiplies roll_boss HP
+
+
+def grid(base_xp=(BASE_XP,), factor=(FACTOR,), cost_scale=(1.0,), boss_hp=(1.0,)) -> list[SweepParams]:
+    """Every combination of the given values."""
+    return [SweepParams(*values) for values in itertools.product(base_xp, factor, cost_scale, boss_hp)]
+
+# ==========================================
+# POPULATION
+# ==========================================
+
+class Population(NamedTuple):
+    """Sampled usage, shared by every parameter set. Per-day arrays are (players, days)."""
+    syncs: np.ndarray
+    blocked_minutes: np.ndarray
+    boss_roll: np.ndarray         # roll_boss's uniform(1.0, 1.5) factor
+
+
+def sample_population(players: int, days: int, seed: int) -> Population:
+    """Usage habits drawn like balance_sim.Profile, vectorized."""
+    rng = np.random.default_rng(seed)
+    blocked_mean = rng.lognormal(np.log(40), 0.9, players)
+    return Population(
+        syncs=rng.integers(1, 7, players),
+        blocked_minutes=rng.exponential(blocked_mean[:, None], (players, days)),
+        boss_roll=rng.uniform(1.0, 1.5, (players, days)),
+    )
+
+# ==========================================
+# DAY STEP
+# ==========================================
+
+def cumulative_xp(base_xp: float, factor: float) -> np.ndarray:
+    """game_logic.CUMULATIVE_XP for another curve (same formula, same truncation)."""
+    required = [int(base_xp * (level ** factor)) for level in range(1, MAX_LEVEL)]
+    return np.concatenate(([0, 0], np.cumsum(required))).astype(np.int64)
+
+
+def resolve_levels(tables: np.ndarray, level: np.ndarray, xp: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """game_logic.resolve_level for every row (own XP table) and player at once."""
+    rows = np.arange(len(tables))[:, None]
+    total = tables[rows, level] + xp
+    new_level = np.empty_like(level)
+    for row, table in enumerate(tables):
+        new_level[row] = np.searchsorted(table, total[row], side="right") - 1
+    new_level = np.minimum(new_level, MAX_LEVEL)
+    return new_level, total - tables[rows, new_level]
+
+
+def building_costs(cost_scale: np.ndarray) -> np.ndarray:
+    """Base costs per row: (rows, kinds, resources)."""
+    base = np.array([[BUILDING_COSTS[kind][r] for r in RESOURCES] for kind in BUILDING_KINDS], dtype=np.float64)
+    return np.floor(base[None] * cost_scale[:, None, None])
+
+
+def purchase(base_costs: np.ndarray, wallet: np.ndarray, levels: np.ndarray) -> None:
+    """
+    Buy the cheapest affordable building or upgrade per player, repeatedly, in place.
+    wallet: (rows, players, resources); levels: (rows, players, kinds), 0 = not built.
+    """
+    for _ in range(MAX_PURCHASES_PER_DAY):
+        # calculate_upgrade_cost: int(base * 1.5 ** level); level 0 is the purchase price
+        costs = np.floor(base_costs[:, None] * 1.5 ** levels[..., None])
+        affordable = (wallet[:, :, None, :] >= costs).all(axis=-1)
+        if not affordable.any():
+            return
+        totals = np.where(affordable, costs.sum(axis=-1), np.inf)
+        choice = totals.argmin(axis=-1)
+        buying = affordable.any(axis=-1)
+        chosen_cost = np.take_along_axis(costs, choice[..., None, None], axis=2)[:, :, 0]
+        wallet -= np.where(buying[..., None], chosen_cost, 0).astype(np.int64)
+        rows, players = np.nonzero(buying)
+        levels[rows, players, choice[rows, players]] += 1
+
+
+def simulate_block(params: list[SweepParams], population: Population, checkpoints: tuple) -> np.ndarray:
+    """Run parameter sets side by side; returns (sets, checkpoints, METRICS, PERCENTILES)."""
+    rows, (players, days) = len(params), population.blocked_minutes.shape
+    tables = np.stack([cumulative_xp(p.base_xp, p.factor) for p in params])
+    boss_scale = np.array([p.boss_hp for p in params])[:, None]
+    base_costs = building_costs(np.array([p.cost_scale for p in params]))
+
+    level = np.ones((rows, players), dtype=np.int64)
+    xp = np.zeros((rows, players), dtype=np.int64)
+    attack = np.full((rows, players), START_ATTACK, dtype=np.int64)
+    wallet = np.zeros((rows, players, len(RESOURCES)), dtype=np.int64)
+    wallet[..., 0], wallet[..., 1] = STARTING_BRONZE, STARTING_GOLD
+    building_levels = np.zeros((rows, players, len(BUILDING_KINDS)), dtype=np.int64)
+    kills = np.zeros((rows, players), dtype=np.int64)
+
+    syncs = population.syncs[None]
+    daily_quest_xp, daily_quest_gold = QUEST_REWARDS["DAILY_SYNC"]
+    slayer_xp, slayer_gold = QUEST_REWARDS["BOSS_SLAYER"]
+    focus_xp, focus_gold = QUEST_REWARDS["FOCUS_MASTER"]
+
+    results = np.zeros((rows, len(checkpoints), len(METRICS), len(PERCENTILES)))
+    for day in range(days):
+        # Battle (resolve_battle), with the day's blocked minutes spread over its syncs
+        boss_hp = np.floor(100 * level * population.boss_roll[:, day] * boss_scale)
+        blocked_per_sync = population.blocked_minutes[:, day][None] / syncs
+        damage_per_sync = np.floor(np.maximum(0, WAKING_MINUTES - blocked_per_sync) * attack)
+        defeated = damage_per_sync * syncs >= boss_hp
+        zero_damage = np.floor(blocked_per_sync) - START_DEFENSE <= 0
+        kills += defeated
+
+        xp += np.where(defeated, 2 * boss_hp, 0).astype(np.int64)
+
+        # Quests, claimed the same day
+        xp += daily_quest_xp + slayer_xp * defeated + focus_xp * zero_damage
+        wallet[..., 1] += daily_quest_gold + slayer_gold * defeated + focus_gold * zero_damage
+
+        # Level ups (apply_level_up)
+        new_level, xp = resolve_levels(tables, level, xp)
+        gained = new_level - level
+        level = new_level
+        attack += gained
+        wallet[..., 1] += LEVEL_UP_GOLD * gained
+        wallet[..., 2] += LEVEL_UP_DIAMOND * gained
+
+        purchase(base_costs, wallet, building_levels)
+
+        if day + 1 in checkpoints:
+            metrics = np.stack([
+                level, wallet[..., 1], wallet[..., 0], wallet[..., 2],
+                (building_levels > 0).sum(axis=-1), building_levels.sum(axis=-1), kills / (day + 1),
+            ], axis=1)                                                    # (rows, METRICS, players)
+            results[:, checkpoints.index(day + 1)] = np.percentile(metrics, PERCENTILES, axis=-1).transpose(1, 2, 0)
+    return results
+
+# ==========================================
+# SWEEP
+# ==========================================
+
+def cache_key(params: SweepParams, players: int, days: int, seed: int) -> str:
+    payload = {
+        "params": params._asdict(), "players": players, "days": days, "seed": seed,
+        "model": SWEEP_MODEL_VERSION, "costs": BUILDING_COSTS, "quests": QUEST_REWARDS,
+        # Every game rule the day step reads, so changing one invalidates cached results
+        "rules": {
+            "waking_minutes": WAKING_MINUTES, "start_attack": START_ATTACK, "start_defense": START_DEFENSE,
+            "start_bronze": STARTING_BRONZE, "start_gold": STARTING_GOLD,
+            "level_up_gold": LEVEL_UP_GOLD, "level_up_diamond": LEVEL_UP_DIAMOND, "max_level": MAX_LEVEL,
+        },
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()[:32]
+
+
+def run_sweep(params: list[SweepParams], players: int = 1000, days: int = 90, seed: int = 1,
+              cache_dir: Optional[Path] = CACHE_DIR) -> tuple[list[dict], int]:
+    """
+    Results for every parameter set, computing only those not cached yet.
+    Returns (results, cache_hits); each result has "params" and "checkpoints"
+    (day -> metric -> percentile -> value).
+    """
+    checkpoints = tuple(day for day in CHECKPOINT_DAYS if day < days) + (days,)
+    arrays, missing = {}, []
+    for p in params:
+        path = cache_dir / f"{cache_key(p, players, days, seed)}.npz" if cache_dir else None
+        if path and path.exists():
+            with np.load(path) as cached:
+                arrays[p] = cached["results"]
+        elif p not in missing:
+            missing.append(p)
+    hits = len(params) - len(missing)
+
+    if missing:
+        population = sample_population(players, days, seed)
+        block = max(1, BLOCK_ELEMENTS // players)
+        if cache_dir:
+            cache_dir.mkdir(parents=True, exist_ok=True)
+        for start in range(0, len(missing), block):
+            chunk = missing[start:start + block]
+            for p, result in zip(chunk, simulate_block(chunk, population, checkpoints)):
+                arrays[p] = result
+                if cache_dir:
+                    np.savez_compressed(cache_dir / f"{cache_key(p, players, days, seed)}.npz", results=result)
+
+    report = []
+    for p in params:
+        result = arrays[p]
+        report.append({
+            "params": p._asdict(),
+            "checkpoints": {
+                str(day): {
+                    metric: {f"p{pct}": round(float(result[i, m, j]), 3) for j, pct in enumerate(PERCENTILES)}
+                    for m, metric in enumerate(METRICS)
+                }
+                for i, day in enumerate(checkpoints)
+            },
+        })
+    return report, hits
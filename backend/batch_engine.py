@@ -0,0 +1,119 @@
+"""
+Vectorized battle and reward engine.
+Works on columnar log arrays (dictionary-encoded package ids + durations) instead of
+one UsageLogCreate at a time. game_logic.calculate_battle_outcome and
+game_logic.calculate_hybrid_rewards stay the scalar reference; results here must match them.
+"""
+from typing import Optional, Tuple
+
+import numpy as np
+
+from game_logic import XP_NO_RULE, XP_OVER_LIMIT, XP_WITHIN_LIMIT, RuleIndex, resolve_battle
+from ingest import usage_day
+
+
+class LogColumns:
+    """
+    Column-oriented batch of usage logs. `packages[package_ids[i]]` is log i's package.
+    `usage_seconds[i]` is what log i is checked against its daily limit with:
+    its app's total for the day when rollups are available, else its own duration.
+    `sessions[i]` is how many logs row i stands for (1 unless built from aggregates).
+    """
+    __slots__ = ("packages", "package_ids", "durations", "usage_seconds", "sessions")
+
+    def __init__(self, packages: list[str], package_ids: np.ndarray, durations: np.ndarray,
+                 usage_seconds: Optional[np.ndarray] = None, sessions: Optional[np.ndarray] = None):
+        self.packages = packages
+        self.package_ids = np.asarray(package_ids, dtype=np.int32)
+        self.durations = np.asarray(durations, dtype=np.int64)
+        self.usage_seconds = self.durations if usage_seconds is None else np.asarray(usage_seconds, dtype=np.int64)
+        self.sessions = np.ones(len(self.durations), dtype=np.int64) if sessions is None else np.asarray(sessions, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.durations)
+
+
+def encode_logs(logs: list, daily_totals: Optional[dict] = None) -> LogColumns:
+    """
+    Dictionary-encode package names and pull durations into arrays.
+    `daily_totals` is the same (app_package_name, day) -> seconds map calculate_hybrid_rewards takes.
+    """
+    codes = {}
+    package_ids = np.fromiter(
+        (codes.setdefault(log.app_package_name, len(codes)) for log in logs),
+        dtype=np.int32, count=len(logs)
+    )
+    durations = np.fromiter((log.duration_seconds for log in logs), dtype=np.int64, count=len(logs))
+    usage_seconds = None
+    if daily_totals is not None:
+        usage_seconds = np.fromiter(
+            (daily_totals.get((log.app_package_name, usage_day(log)), log.duration_seconds) for log in logs),
+            dtype=np.int64, count=len(logs)
+        )
+    return LogColumns(list(codes), package_ids, durations, usage_seconds)
+
+
+def encode_aggregates(sessions: dict, seconds: dict, daily_totals: dict) -> LogColumns:
+    """
+    One row per (app_package_name, day) instead of one per log, for uploads that are
+    aggregated as they stream in. `sessions` and `seconds` are the new logs' count and
+    summed duration per key; `daily_totals` the rolled-up day totals limits are judged on.
+    Battle and reward totals over these rows equal those over the logs they summarize.
+    """
+    codes = {}
+    keys = list(sessions)
+    package_ids = np.fromiter((codes.setdefault(package, len(codes)) for package, _ in keys), dtype=np.int32, count=len(keys))
+    durations = np.fromiter((seconds[key] for key in keys), dtype=np.int64, count=len(keys))
+    usage_seconds = np.fromiter((daily_totals.get(key, seconds[key]) for key in keys), dtype=np.int64, count=len(keys))
+    counts = np.fromiter((sessions[key] for key in keys), dtype=np.int64, count=len(keys))
+    return LogColumns(list(codes), package_ids, durations, usage_seconds, counts)
+
+
+def _package_tables(columns: LogColumns, index: RuleIndex) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Per-package lookups: blocked flag, has-rule flag and limit in seconds (inf = no limit)."""
+    blocked = np.array([p in index.blocked for p in columns.packages], dtype=bool)
+    has_rule = np.array([index.has_rule(p) for p in columns.packages], dtype=bool)
+    limit_seconds = np.array(
+        [np.inf if index.limits.get(p) is None else index.limits[p] * 60 for p in columns.packages],
+        dtype=np.float64
+    )
+    return blocked, has_rule, limit_seconds
+
+
+def _log_rewards(columns: LogColumns, index: RuleIndex) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Per-row blocked mask, XP delta (for all the row's sessions) and over-limit mask."""
+    blocked, has_rule, limit_seconds = _package_tables(columns, index)
+    ids = columns.package_ids
+    log_has_rule = has_rule[ids]
+    over_limit = log_has_rule & (columns.usage_seconds > limit_seconds[ids])
+    xp = np.where(log_has_rule, np.where(over_limit, XP_OVER_LIMIT, XP_WITHIN_LIMIT), XP_NO_RULE) * columns.sessions
+    return blocked[ids], xp, over_limit
+
+
+def batch_battle_outcome(stats, columns: LogColumns, boss, index: RuleIndex) -> dict:
+    """Vectorized calculate_battle_outcome."""
+    blocked, _, _ = _package_tables(columns, index)
+    screen_time_seconds = int(columns.durations[blocked[columns.package_ids]].sum())
+    return resolve_battle(stats, boss, screen_time_seconds)
+
+
+def batch_hybrid_rewards(stats, columns: LogColumns, index: RuleIndex) -> Tuple[int, str]:
+    """Vectorized calculate_hybrid_rewards. Returns (xp_gained, message)."""
+    _, xp, over_limit = _log_rewards(columns, index)
+    message = "Limit exceeded! Lost XP." if over_limit.any() else "Good job!"
+    return int(xp.sum()), message
+
+
+def grouped_totals(columns: LogColumns, index: RuleIndex, group_ids: np.ndarray, n_groups: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Offline recomputation: reward XP and blocked screen seconds per group
+    (e.g. per day of a user's history) in one pass over any number of logs.
+    Returns (xp_per_group, screen_seconds_per_group).
+    """
+    blocked, xp, _ = _log_rewards(columns, index)
+    group_ids = np.asarray(group_ids, dtype=np.int64)
+    xp_per_group = np.bincount(group_ids, weights=xp, minlength=n_groups).astype(np.int64)
+    screen_seconds = np.bincount(
+        group_ids, weights=np.where(blocked, columns.durations, 0), minlength=n_groups
+    ).astype(np.int64)
+    return xp_per_group, screen_seconds
@@ -0,0 +1,243 @@
+"""
+Microbenchmarks for the game_logic hot paths run by every sync:
+calculate_battle_outcome, calculate_hybrid_rewards, apply_level_up, check_quests and
+calculate_upgrade_cost, at several log, rule and quest counts, plus "sync_turn": the
+four game-logic steps of one typical sync together (what a sync costs in CPU,
+database time excluded).
+
+Each case is timed over many short repeats, alternating with a fixed pure-Python
+calibration loop. A case reports its median time per call, and its normalized cost is
+the median of the per-repeat ratios to the calibration loop. Comparisons use that
+normalized cost, so a baseline recorded on one machine stays usable on another of a
+different speed, and drift or a noisy neighbour affects the case and calibration alike.
+Timings also shift by up to ~20% from one interpreter to the next (memory layout, hash
+seed), so the suite runs in several fresh processes and keeps each case's median.
+
+Usage: python bench_game_logic.py                 # compare against bench_baseline.json
+       python bench_game_logic.py --save          # record a new baseline
+       python bench_game_logic.py --threshold 0.25 --filter battle
+Exits with status 1 when a case is slower than its baseline by more than --threshold,
+after timing flagged cases a second time.
+"""
+import argparse
+import json
+import multiprocessing
+import random
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Callable, Optional
+
+from game_logic import (
+    BUILDING_COSTS, CUMULATIVE_XP, RuleIndex, calculate_battle_outcome, calculate_hybrid_rewards,
+    apply_level_up, check_quests, calculate_upgrade_cost
+)
+from models import QuestStatus
+from schemas import UsageLogCreate
+
+BASELINE_PATH = Path(__file__).resolve().parent / "bench_baseline.json"
+DEFAULT_THRESHOLD = 0.25     # Flag cases more than 25% slower than the baseline
+PROCESSES = 5
+REPEATS = 15                 # Per process
+TARGET_SECONDS = 0.01        # Per repeat; sets how many calls one repeat makes
+
+# ==========================================
+# FIXTURES
+# ==========================================
+
+def _stats() -> SimpleNamespace:
+    return SimpleNamespace(level=1, xp=0, health=100, max_health=100, attack_power=5, defense=2,
+                           gold=0, diamond=0, bronze=0)
+
+def _boss() -> SimpleNamespace:
+    # HP high enough that the boss survives every call
+    return SimpleNamespace(name="Doom Scroller", total_hp=10 ** 12, current_hp=10 ** 12,
+                           damage_dealt_to_user=0, is_defeated=False)
+
+def _rules(count: int) -> RuleIndex:
+    return RuleIndex([
+        SimpleNamespace(app_package_name=f"com.example.app{i}", daily_limit_minutes=30 if i % 2 else None,
+                        is_blocked=i % 3 == 0)
+        for i in range(count)
+    ])
+
+def _logs(count: int, rng: random.Random) -> tuple[list[UsageLogCreate], dict]:
+    """Logs over 20 apps (half of them with rules at 10+ rules) and their daily totals."""
+    start = datetime(2024, 1, 1, 8, 0, 0)
+    logs, totals = [], {}
+    for i in range(count):
+        duration = rng.randint(30, 1800)
+        package = f"com.example.app{rng.randrange(20)}"
+        log_start = start + timedelta(seconds=i * 60)
+        logs.append(UsageLogCreate(app_package_name=package, start_time=log_start,
+                                   end_time=log_start + timedelta(seconds=duration), duration_seconds=duration))
+        key = (package, log_start.date())
+        totals[key] = totals.get(key, 0) + duration
+    return logs, totals
+
+def _user_with_quests(count: int) -> SimpleNamespace:
+    """Quests spread over the three default codes, with targets they never reach."""
+    codes = ("DAILY_SYNC", "FOCUS_MASTER", "BOSS_SLAYER")
+    quests = [
+        SimpleNamespace(status=QuestStatus.IN_PROGRESS, current_progress=0, completed_at=None,
+                        definition=SimpleNamespace(code=codes[i % 3], target_progress=10 ** 12))
+        for i in range(count)
+    ]
+    return SimpleNamespace(quests=quests)
+
+# ==========================================
+# CASES
+# ==========================================
+
+def _battle(logs: int, rules: int) -> Callable[[], object]:
+    log_list, _ = _logs(logs, random.Random(1))
+    stats, boss, index = _stats(), _boss(), _rules(rules)
+    return lambda: calculate_battle_outcome(stats, log_list, boss, index)
+
+def _rewards(logs: int, rules: int) -> Callable[[], object]:
+    log_list, totals = _logs(logs, random.Random(1))
+    stats, index = _stats(), _rules(rules)
+    return lambda: calculate_hybrid_rewards(stats, log_list, index, totals)
+
+def _level_up(levels: int) -> Callable[[], object]:
+    stats = _stats()
+    xp = CUMULATIVE_XP[1 + levels]
+
+    def run():
+        stats.level, stats.xp, stats.max_health, stats.attack_power = 1, xp, 100, 5
+        return apply_level_up(stats)
+    return run
+
+def _quests(quests: int) -> Callable[[], object]:
+    user = _user_with_quests(quests)
+    summary = {"boss_damage_dealt": 0, "boss_defeated": False}
+    return lambda: check_quests(user, summary)
+
+def _upgrade_cost(level: int) -> Callable[[], object]:
+    kinds = list(BUILDING_COSTS)
+    return lambda: [calculate_upgrade_cost(kind, level) for kind in kinds]
+
+def _sync_turn(logs: int, rules: int, quests: int) -> Callable[[], object]:
+    battle, rewards, level_up, quest_check = _battle(logs, rules), _rewards(logs, rules), _level_up(1), _quests(quests)
+
+    def run():
+        battle()
+        rewards()
+        level_up()
+        quest_check()
+    return run
+
+CASES: dict[str, Callable[[], Callable[[], object]]] = {}
+for _logs_count in (10, 100, 1000):
+    for _rules_count in (1, 10, 100):
+        CASES[f"battle[logs={_logs_count},rules={_rules_count}]"] = lambda l=_logs_count, r=_rules_count: _battle(l, r)
+        CASES[f"rewards[logs={_logs_count},rules={_rules_count}]"] = lambda l=_logs_count, r=_rules_count: _rewards(l, r)
+for _levels in (1, 10, 100):
+    CASES[f"level_up[levels={_levels}]"] = lambda n=_levels: _level_up(n)
+for _quest_count in (3, 30, 300):
+    CASES[f"check_quests[quests={_quest_count}]"] = lambda n=_quest_count: _quests(n)
+for _level in (1, 10):
+    CASES[f"upgrade_cost[level={_level},kinds={len(BUILDING_COSTS)}]"] = lambda n=_level: _upgrade_cost(n)
+CASES["sync_turn[logs=50,rules=10,quests=3]"] = lambda: _sync_turn(50, 10, 3)
+
+# ==========================================
+# TIMING
+# ==========================================
+
+def _calibration() -> None:
+    total = 0
+    for i in range(10_000):
+        total += i * i % 7
+
+def _per_call(fn: Callable[[], object], number: int) -> float:
+    start = time.perf_counter()
+    for _ in range(number):
+        fn()
+    return (time.perf_counter() - start) / number
+
+def time_call(fn: Callable[[], object], repeats: int = REPEATS, target: float = TARGET_SECONDS) -> tuple[float, float, float]:
+    """(seconds per call of fn, seconds per calibration loop, fn / calibration), each the median
+    over `repeats` repeats of about `target` seconds. The two alternate, and the ratio is taken
+    per repeat, so a slowdown of the whole machine cancels out instead of moving the result."""
+    number = max(1, int(target / max(_per_call(fn, 1), 1e-7)))
+    calibration_number = max(1, int(target / max(_per_call(_calibration, 1), 1e-7)))
+    samples, calibration = [], []
+    for _ in range(repeats):
+        calibration.append(_per_call(_calibration, calibration_number))
+        samples.append(_per_call(fn, number))
+    ratios = [sample / loop for sample, loop in zip(samples, calibration)]
+    return statistics.median(samples), statistics.median(calibration), statistics.median(ratios)
+
+def run_benchmarks(names: Optional[list[str]] = None, name_filter: Optional[str] = None, repeats: int = REPEATS, target: float = TARGET_SECONDS) -> dict:
+    """{"cases": {name: {"us_per_call", "calibration_us", "normalized"}}}"""
+    cases = {}
+    for name, setup in CASES.items():
+        if (names is not None and name not in names) or (name_filter and name_filter not in name):
+            continue
+        seconds, calibration, normalized = time_call(setup(), repeats, target)
+        cases[name] = {"us_per_call": round(seconds * 1e6, 3), "calibration_us": round(calibration * 1e6, 3),
+                       "normalized": round(normalized, 6)}
+    return {"cases": cases}
+
+def run_suite(names: Optional[list[str]] = None, name_filter: Optional[str] = None, processes: int = PROCESSES,
+              repeats: int = REPEATS, target: float = TARGET_SECONDS) -> dict:
+    """run_benchmarks in `processes` fresh interpreters, one after another; each value is the median over them."""
+    spawn = multiprocessing.get_context("spawn")
+    runs = []
+    for _ in range(processes):
+        with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as pool:
+            runs.append(pool.submit(run_benchmarks, names, name_filter, repeats, target).result())
+    return {"cases": {
+        name: {key: statistics.median(run["cases"][name][key] for run in runs)
+               for key in ("us_per_call", "calibration_us", "normalized")}
+        for name in runs[0]["cases"]
+    }}
+
+def compare(results: dict, baseline: dict, threshold: float = DEFAULT_THRESHOLD) -> list[tuple[str, float]]:
+    """Cases whose normalized cost grew by more than `threshold`, as (name, ratio to baseline)."""
+    regressions = []
+    for name, case in results["cases"].items():
+        reference = baseline.get("cases", {}).get(name)
+        if reference is None:
+            continue
+        ratio = case["normalized"] / reference["normalized"]
+        if ratio > 1 + threshold:
+            regressions.append((name, ratio))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the game_logic hot paths.")
+    parser.add_argument("--save", action="store_true", help="Write the results as the new baseline")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Allowed slowdown (0.25 = 25%%)")
+    parser.add_argument("--filter", default=None, help="Only cases whose name contains this")
+    parser.add_argument("--processes", type=int, default=PROCESSES)
+    parser.add_argument("--repeats", type=int, default=REPEATS)
+    args = parser.parse_args()
+
+    results = run_suite(name_filter=args.filter, processes=args.processes, repeats=args.repeats)
+    baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+    for name, case in results["cases"].items():
+        reference = baseline.get("cases", {}).get(name)
+        change = f"{case['normalized'] / reference['normalized'] - 1:+.1%}" if reference else "new"
+        print(f"{name:<42}{case['us_per_call']:>12.2f} us{change:>10}")
+
+    if args.save:
+        args.baseline.write_text(json.dumps(results, indent=2) + "\n")
+        print(f"Baseline written to {args.baseline}")
+    else:
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            # Time flagged cases again and keep the faster run, so one noisy run does not fail the check
+            retry = run_suite([name for name, _ in regressions], processes=args.processes, repeats=args.repeats)
+            for name, case in retry["cases"].items():
+                results["cases"][name] = min(results["cases"][name], case, key=lambda c: c["normalized"])
+            regressions = compare(results, baseline, args.threshold)
+        for name, ratio in regressions:
+            print(f"REGRESSION {name}: {ratio:.2f}x baseline (threshold {1 + args.threshold:.2f}x)")
+        sys.exit(1 if regressions else 0)
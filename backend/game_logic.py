@@ -3,15 +3,19 @@ Game Logic for Idle Hero: Digital Detox RPG
 Includes Boss Battle mechanics AND City Builder logic.
 """
 import random
+import time
 from datetime import date, datetime, timedelta
-from typing import Optional, Tuple
+from typing import Optional, Tuple, Union
 import math
+from bisect import bisect_right
 
 from sqlalchemy.orm import Session
 
 # Import ALL necessary models
 from models import CharacterStats as StatsModel, BossEnemy, User, UnlockedSkill, UserQuest, QuestDefinition, QuestStatus
-from schemas import UsageLogCreate
+from schemas import UsageLogCreate, BossStatus
+from quest_engine import advance_quest, battle_events
+from ingest import usage_day
 
 # ==========================================
 # CONSTANTS & CONFIG
@@ -24,6 +28,18 @@ BOSS_NAMES = [
     "FOMO Specter", "Blue Light Vampire", "Distraction Drake", "Meme Lord of Chaos"
 ]
 
+# Battle: focus minutes are the assumed waking time minus blocked-app screen time
+WAKING_MINUTES = 480
+
+# XP per log: apps without a detox rule, and apps with one within / over its daily limit
+XP_NO_RULE = 5
+XP_WITHIN_LIMIT = 20
+XP_OVER_LIMIT = -10
+
+# Resources granted per level gained
+LEVEL_UP_GOLD = 150
+LEVEL_UP_DIAMOND = 10
+
 # Experience Curve (Friend's Logic)
 BASE_XP = 100
 FACTOR = 1.5
@@ -31,6 +47,23 @@ FACTOR = 1.5
 def calculate_xp_required(level: int) -> int:
     return int(BASE_XP * (level ** FACTOR))
 
+# Precomputed curve: CUMULATIVE_XP[level] = total XP earned on reaching `level` (index 0 unused).
+# Levels resolve with one bisect instead of stepping through calculate_xp_required.
+MAX_LEVEL = 1000
+CUMULATIVE_XP = [0, 0]
+for _level in range(1, MAX_LEVEL):
+    CUMULATIVE_XP.append(CUMULATIVE_XP[-1] + calculate_xp_required(_level))
+
+def resolve_level(level: int, xp: int) -> Tuple[int, int]:
+    """
+    Final (level, xp) for a hero at `level` holding `xp` towards the next level,
+    after every level up that XP pays for. XP past MAX_LEVEL keeps accumulating.
+    """
+    level = min(max(level or 1, 1), MAX_LEVEL)
+    total = CUMULATIVE_XP[level] + max(xp or 0, 0)
+    new_level = min(bisect_right(CUMULATIVE_XP, total) - 1, MAX_LEVEL)
+    return new_level, total - CUMULATIVE_XP[new_level]
+
 # Building Costs (Friend's Logic)
 BUILDING_COSTS = {
     "mine": {"bronze": 300, "gold": 50, "diamond": 0},
@@ -39,55 +72,144 @@ BUILDING_COSTS = {
     "fire_station": {"bronze": 1500, "gold": 300, "diamond": 10},
     "hospital": {"bronze": 2000, "gold": 500, "diamond": 20},
     "town_hall": {"bronze": 3000, "gold": 800, "diamond": 50},
-},
+}
+
+# ==========================================
+# RULE INDEX
+# ==========================================
+
+class RuleIndex:
+    """
+    Package-keyed view of a user's DetoxRules, compiled once per sync from the
+    rules loaded with the user (so it always reflects the current rule set).
+    `limits` keeps the first rule per package (same as the old linear search),
+    `blocked` holds every package with a blocking rule.
+    """
+    __slots__ = ("limits", "blocked")
+
+    def __init__(self, rules: list):
+        self.limits = {}
+        blocked = set()
+        for rule in rules:
+            self.limits.setdefault(rule.app_package_name, rule.daily_limit_minutes)
+            if rule.is_blocked:
+                blocked.add(rule.app_package_name)
+        self.blocked = frozenset(blocked)
+
+    def has_rule(self, package: str) -> bool:
+        return package in self.limits
+
+    def is_over_limit(self, package: str, duration_seconds: int) -> bool:
+        limit = self.limits.get(package)
+        return limit is not None and duration_seconds / 60 > limit
+
+def _as_rule_index(rules: Union[RuleIndex, list]) -> RuleIndex:
+    return rules if isinstance(rules, RuleIndex) else RuleIndex(rules)
 
 # ==========================================
 # BOSS BATTLE LOGIC (My Logic)
 # ==========================================
 
-def generate_daily_boss(db: Session, user: User) -> BossEnemy:
-    """Generate a new daily boss scaling with player level."""
-    level = user.stats.level if user.stats else 1
+# Per-process cache of each user's live boss for today: (user_id, day) -> (expires_at, BossStatus).
+# Written after commits that change the boss, dropped when it is defeated or replaced.
+# The TTL bounds how stale a boss changed by another worker can look.
+BOSS_CACHE_SIZE = 10000
+BOSS_CACHE_TTL_SECONDS = 30
+_boss_cache: dict[tuple[str, date], tuple[float, BossStatus]] = {}
+
+def cache_todays_boss(user_id: str, boss: Union[BossEnemy, BossStatus], today: Optional[date] = None) -> None:
+    """Remember a committed boss state; defeated bosses are dropped instead."""
+    status = BossStatus.model_validate(boss)
+    if status.is_defeated:
+        invalidate_boss_cache(user_id)
+        return
+    if len(_boss_cache) >= BOSS_CACHE_SIZE:
+        _boss_cache.pop(next(iter(_boss_cache)))  # Evict oldest entry
+    _boss_cache[(user_id, today or date.today())] = (time.monotonic() + BOSS_CACHE_TTL_SECONDS, status)
+
+def get_cached_boss(user_id: str, today: Optional[date] = None) -> Optional[BossStatus]:
+    key = (user_id, today or date.today())
+    entry = _boss_cache.get(key)
+    if entry is None:
+        return None
+    if entry[0] < time.monotonic():
+        del _boss_cache[key]
+        return None
+    return entry[1]
+
+def invalidate_boss_cache(user_id: str) -> None:
+    for key in [key for key in _boss_cache if key[0] == user_id]:
+        del _boss_cache[key]
+
+def roll_boss(level: Optional[int], rng: random.Random = random) -> Tuple[str, int]:
+    """Random name and HP for a boss facing a hero of `level`. Returns (name, total_hp)."""
     base_hp = 100
-    total_hp = int(base_hp * level * random.uniform(1.0, 1.5))
+    total_hp = int(base_hp * (level or 1) * rng.uniform(1.0, 1.5))
+    return rng.choice(BOSS_NAMES), total_hp
+
+def generate_daily_boss(db: Session, user: User) -> BossEnemy:
+    """
+    Generate a new daily boss scaling with player level.
+    Fallback for users the nightly job (jobs.pregenerate_bosses) did not cover.
+    Only flushes; the caller commits (and caches the boss once committed).
+    """
+    name, total_hp = roll_boss(user.stats.level if user.stats else 1)
     
     boss = BossEnemy(
         user_id=user.id,
-        name=random.choice(BOSS_NAMES),
+        name=name,
         total_hp=total_hp,
         current_hp=total_hp,
         damage_dealt_to_user=0,
         is_defeated=False
     )
     db.add(boss)
-    db.commit()
-    db.refresh(boss)
+    db.flush()
     return boss
 
 def get_todays_boss(db: Session, user_id: str) -> Optional[BossEnemy]:
-    """Get the boss for today."""
-    today_start = datetime.combine(date.today(), datetime.min.time())
+    """Get the undefeated boss for today (uses ix_boss_enemies_user_date_defeated)."""
+    today = date.today()
+    cached = get_cached_boss(user_id, today)
+    if cached is not None:
+        # Primary key lookup; served from the identity map if already loaded
+        boss = db.get(BossEnemy, cached.id)
+        if boss is not None and not boss.is_defeated:
+            return boss
+        invalidate_boss_cache(user_id)
+
+    today_start = datetime.combine(today, datetime.min.time())
     return db.query(BossEnemy).filter(
         BossEnemy.user_id == user_id,
         BossEnemy.date >= today_start,
+        BossEnemy.date < today_start + timedelta(days=1),
         BossEnemy.is_defeated == False
     ).first()
 
-def calculate_battle_outcome(stats: StatsModel, logs: list[UsageLogCreate], boss: BossEnemy, rules: list) -> dict:
+def calculate_battle_outcome(stats: StatsModel, logs: list[UsageLogCreate], boss: BossEnemy, rules: Union[RuleIndex, list]) -> dict:
     """
     Calculate battle outcome.
     Returns damage dealt, taken, and XP reward (BUT DOES NOT APPLY XP directly to avoid double counting).
+    `rules` may be a RuleIndex or a plain list of rules.
     """
     # 1. Identify Blocked Packages
-    blocked_packages = {r.app_package_name for r in rules if r.is_blocked}
+    if isinstance(rules, RuleIndex):
+        blocked_packages = rules.blocked
+    else:
+        blocked_packages = {r.app_package_name for r in rules if r.is_blocked}
     
     # 2. Filter logs
     screen_time_seconds = sum(log.duration_seconds for log in logs if log.app_package_name in blocked_packages)
+    return resolve_battle(stats, boss, screen_time_seconds)
+
+def resolve_battle(stats: StatsModel, boss: BossEnemy, screen_time_seconds: int) -> dict:
+    """
+    Apply one battle round given the total seconds spent in blocked apps.
+    Shared by the scalar engine above and the vectorized one in batch_engine.py.
+    """
     total_screen_minutes = screen_time_seconds / 60
     
-    # Assume 8 hours waking time
-    assumed_waking_minutes = 480
-    focus_minutes = max(0, assumed_waking_minutes - total_screen_minutes)
+    focus_minutes = max(0, WAKING_MINUTES - total_screen_minutes)
     
     # Player Attacks Boss
     player_damage = int(focus_minutes * stats.attack_power)
@@ -126,81 +248,88 @@ def calculate_battle_outcome(stats: StatsModel, logs: list[UsageLogCreate], boss
 # ==========================================
 
 def check_quests(user: User, battle_summary: dict):
-    """Evaluates active quests and updates progress."""
+    """
+    Evaluates the user's loaded quests against one battle (see quest_engine).
+    The game loop uses quest_engine.dispatch, which loads only the affected quests.
+    """
+    events = battle_events(battle_summary)
     for uq in user.quests:
-        if uq.status != QuestStatus.IN_PROGRESS:
-            continue
-            
-        code = uq.definition.code
-        
-        if code == "DAILY_SYNC":
-            uq.current_progress = 1
-        elif code == "FOCUS_MASTER":
-            if battle_summary["boss_damage_dealt"] == 0:
-                uq.current_progress += 1
-        elif code == "BOSS_SLAYER":
-             if battle_summary["boss_defeated"]:
-                 uq.current_progress += 1
-
-        if uq.current_progress >= uq.definition.target_progress:
-            uq.status = QuestStatus.COMPLETED
-            uq.completed_at = datetime.utcnow()
+        advance_quest(uq, uq.definition.code, uq.definition.target_progress, events, battle_summary)
 
 # ==========================================
 # HYBRID REWARD LOGIC (Combined)
 # ==========================================
 
-def calculate_hybrid_rewards(stats: StatsModel, logs: list[UsageLogCreate], rules: list) -> Tuple[int, str]:
+def calculate_hybrid_rewards(stats: StatsModel, logs: list[UsageLogCreate], rules: Union[RuleIndex, list],
+                             daily_totals: Optional[dict] = None) -> Tuple[int, str]:
     """
     Calculates XP/Resource checks based on Rules (Friend's Logic).
+    `rules` may be a RuleIndex or a plain list of rules.
+    `daily_totals` maps (app_package_name, day) -> seconds used that day (see ingest.update_daily_rollups).
+    When given, a log is checked against the daily limit using its app's total for the day
+    (as of this sync, so every session of a day that ends over the limit is penalized, even
+    ones that came before the limit was reached); otherwise the single session's duration is used.
     Returns (xp_gained, message).
     """
     total_xp_gained = 0
     message = "Good job!"
+    index = _as_rule_index(rules)
 
     for log in logs:
-        rule = next((r for r in rules if r.app_package_name == log.app_package_name), None)
-        duration_mins = log.duration_seconds / 60
-        
-        if rule:
-             if duration_mins > rule.daily_limit_minutes:
-                 total_xp_gained -= 10 # Penalty
+        if index.has_rule(log.app_package_name):
+             used_seconds = log.duration_seconds
+             if daily_totals is not None:
+                 used_seconds = daily_totals.get((log.app_package_name, usage_day(log)), used_seconds)
+             if index.is_over_limit(log.app_package_name, used_seconds):
+                 total_xp_gained += XP_OVER_LIMIT # Penalty
                  message = "Limit exceeded! Lost XP."
              else:
-                 total_xp_gained += 20 # Reward
+                 total_xp_gained += XP_WITHIN_LIMIT # Reward
         else:
-             total_xp_gained += 5 # Default
+             total_xp_gained += XP_NO_RULE
 
     # Ensure non-negative per tick? Or allow regression? Use max(0) generally.
     return total_xp_gained, message
 
-def apply_level_up(stats: StatsModel) -> Tuple[bool, str]:
+def apply_level_up(stats: StatsModel) -> Tuple[int, str]:
     """
     Checks if player levels up based on current XP and Curve.
-    Updates Level, resets XP, restores Health.
-    Returns (leveled_up, message).
+    Advances as many levels as the XP covers, applying every level's rewards at once:
+    heal, +10 max health, +1 attack, +LEVEL_UP_GOLD gold, +LEVEL_UP_DIAMOND diamond per level.
+    Returns (levels_gained, message).
     """
     if stats.level is None: stats.level = 1
-    xp_req = calculate_xp_required(stats.level)
+    new_level, remaining_xp = resolve_level(stats.level, stats.xp)
+    levels = new_level - stats.level
     
-    if stats.xp >= xp_req:
-        stats.level += 1
-        stats.xp -= xp_req
+    if levels > 0:
+        stats.level = new_level
+        stats.xp = remaining_xp
         
         # Stat Improvements
-        stats.health = stats.max_health # Heal
-        stats.max_health += 10
-        stats.attack_power += 1
+        stats.health = stats.max_health + 10 * (levels - 1) # Heal (to the max before the last level's increase)
+        stats.max_health += 10 * levels
+        stats.attack_power += levels
         
         # Resource Bonus (Friend's Logic)
         if stats.gold is None: stats.gold = 0
         if stats.diamond is None: stats.diamond = 0
-        stats.gold += 150
-        stats.diamond += 10
+        stats.gold += LEVEL_UP_GOLD * levels
+        stats.diamond += LEVEL_UP_DIAMOND * levels
         
-        return True, "LEVEL UP! City expanded."
+        if levels > 1:
+            return levels, f"LEVEL UP x{levels}! City expanded."
+        return levels, "LEVEL UP! City expanded."
     
-    return False, ""
+    return 0, ""
+
+def expand_city(city, levels: int) -> None:
+    """City Expansion effect: one city level per hero level, a new ring every 5 city levels."""
+    if not city or levels <= 0:
+        return
+    old_level = city.level or 1
+    city.level = old_level + levels
+    city.unlocked_rings = (city.unlocked_rings or 1) + city.level // 5 - old_level // 5
 
 def calculate_upgrade_cost(building_type: str, current_level: int) -> dict:
     base_cost = BUILDING_COSTS.get(building_type)
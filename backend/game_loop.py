@@ -0,0 +1,294 @@
+"""
+Game loop services shared by the sync and async endpoints.
+Each function takes a plain SQLAlchemy Session, so the async routes can run
+them unchanged through AsyncSession.run_sync.
+"""
+from collections import Counter
+from typing import Optional, Union
+
+from fastapi import HTTPException, Response
+from sqlalchemy import func
+from sqlalchemy.orm import Session, joinedload, selectinload
+
+import models
+import schemas
+import quest_engine
+import profile_cache
+from quest_engine import battle_events
+from models import User, BossEnemy, CharacterStats, UserQuest
+from schemas import UsageLogCreate, BattleSummary
+from game_logic import (
+    generate_daily_boss,
+    get_todays_boss,
+    get_cached_boss,
+    cache_todays_boss,
+    calculate_battle_outcome,
+    calculate_hybrid_rewards,
+    expand_city,
+    RuleIndex
+)
+from ingest import insert_new_usage_logs, update_daily_rollups, usage_day
+from stat_mutations import snapshot, commit_stat_changes, level_up
+from reference_data import etag_matches
+from batch_engine import LogColumns, encode_logs, encode_aggregates, batch_battle_outcome, batch_hybrid_rewards
+
+# Uploads at least this large go through the vectorized engine
+BATCH_ENGINE_MIN_LOGS = 256
+
+
+# One-to-one parts of the game state, joined into the user row query
+_STATE_CORE = (
+    joinedload(User.stats).joinedload(CharacterStats.hero_class),
+    joinedload(User.city_state),
+)
+
+# Collections, each fetched with one extra SELECT ... WHERE user_id IN (...)
+_STATE_COLLECTIONS = {
+    "rules": selectinload(User.rules),
+    "quests": selectinload(User.quests).joinedload(UserQuest.definition),
+    "buildings": selectinload(User.buildings),
+}
+
+
+def load_user_state(db: Session, user_id: str, collections=("rules", "quests")) -> Optional[User]:
+    """
+    Load a user with the graph the game loop touches, so nothing lazy-loads later.
+    Stats (with hero class) and city come in the user query; each requested
+    collection adds a single selectin query.
+    """
+    options = list(_STATE_CORE) + [_STATE_COLLECTIONS[name] for name in collections]
+    return db.query(User).options(*options).filter(User.id == user_id).first()
+
+
+# Starting resources for new heroes (replaces the old profile "Debug Boost")
+STARTING_BRONZE = 1000
+STARTING_GOLD = 1000
+
+_PROFILE_COLLECTIONS = ("rules", "quests", "buildings")
+
+
+def create_user(db: Session, username: str, email: str) -> User:
+    """
+    Onboard a new hero: the user with stats, city, legacy kingdom and the first
+    daily boss, committed together. Everything the profile shows exists from here on.
+    """
+    user = models.User(username=username, email=email)
+    db.add(user)
+    db.flush()
+    user.stats = models.CharacterStats(user_id=user.id, bronze=STARTING_BRONZE, gold=STARTING_GOLD)
+    user.city_state = models.CityState(user_id=user.id)
+    user.kingdom = models.Kingdom(user_id=user.id, name=f"{username}'s Kingdom")
+    db.add_all([user.stats, user.city_state, user.kingdom])
+    db.flush()
+    generate_daily_boss(db, user)
+    db.commit()
+    return user
+
+
+def load_profile(db: Session, user_id: str) -> User:
+    """Get user profile with stats, city, rules, quests. Read only."""
+    user = load_user_state(db, user_id, _PROFILE_COLLECTIONS)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    return user
+
+
+def profile_response(db: Session, user_id: str, if_none_match: Optional[str] = None) -> Response:
+    """
+    The profile as JSON, served from profile_cache while the user's state version
+    is unchanged, or 304 Not Modified when the client's copy is current.
+    A hit costs one primary-key query; nothing is ever written.
+    """
+    version = profile_cache.get_state_version(db, user_id)
+    if version is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    headers = {"ETag": profile_cache.etag_for(user_id, version), "Cache-Control": "private, no-cache"}
+    if etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    def build() -> bytes:
+        return schemas.UserProfile.model_validate(load_profile(db, user_id)).model_dump_json().encode()
+    body = profile_cache.get_profile(user_id, version, build)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def _load_sync_user(db: Session, user_id: str) -> User:
+    """Load the game state for a sync, creating missing stats/city rows."""
+    # Quests are not loaded here; quest_engine.dispatch fetches just the ones a sync affects
+    user = load_user_state(db, user_id, collections=("rules",))
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    # Ensure stats/city
+    created = False
+    if not user.stats:
+        user.stats = models.CharacterStats(user_id=user.id)
+        db.add(user.stats)
+        created = True
+    if not user.city_state:
+        user.city_state = models.CityState(user_id=user.id)
+        db.add(user.city_state)
+        created = True
+    if created:
+        db.flush()  # Apply column defaults before game logic does arithmetic on them
+    return user
+
+
+def _already_synced(db: Session, user: User) -> dict:
+    """Response for an upload whose every log was stored by an earlier sync."""
+    result = {
+        "xp_gained": 0,
+        "level_up": False,
+        "new_stats": schemas.CharacterStats.model_validate(user.stats),
+        "insight": "Already synced.",
+        "battle": None
+    }
+    db.commit()
+    return result
+
+
+def run_sync_usage(db: Session, user_id: str, logs: list[UsageLogCreate]) -> dict:
+    """
+    Core Game Loop:
+    1. Save Logs
+    2. Boss Battle (Damage Calc)
+    3. Rule Checks (XP/Resource Rewards)
+    4. Level Up Check
+    5. Quest Update
+    """
+    user = _load_sync_user(db, user_id)
+
+    # 1. Save logs. Retried uploads are deduplicated by fingerprint,
+    # and only genuinely new logs feed the battle and reward engines below.
+    new_logs = insert_new_usage_logs(db, user_id, logs)
+    if logs and not new_logs:
+        return _already_synced(db, user)
+
+    # Day totals per app, so daily limits are judged on the whole day's usage
+    daily_totals = update_daily_rollups(db, user_id, new_logs)
+
+    # Large uploads are encoded once into columns for the vectorized engine
+    columns = encode_logs(new_logs, daily_totals) if len(new_logs) >= BATCH_ENGINE_MIN_LOGS else None
+    return _resolve_turn(db, user, new_logs, daily_totals, columns)
+
+
+def _resolve_turn(db: Session, user: User, new_logs: list[UsageLogCreate], daily_totals: dict,
+                  columns: Optional[LogColumns] = None) -> dict:
+    """Steps 2-5 of the game loop over the newly stored logs, then commit."""
+    rule_index = RuleIndex(user.rules)
+
+    # 2. Boss Battle
+    boss = get_todays_boss(db, user.id)
+    if not boss:
+        boss = generate_daily_boss(db, user)
+
+    # Game logic edits user.stats in memory; the edits are written as atomic deltas below
+    before = snapshot(user.stats)
+    battle_summary = None
+    if not boss.is_defeated:
+        if columns is not None:
+            battle_result = batch_battle_outcome(user.stats, columns, boss, rule_index)
+        else:
+            battle_result = calculate_battle_outcome(user.stats, new_logs, boss, rule_index)
+        battle_summary = BattleSummary(**battle_result)
+
+        # Determine insight message from battle
+        if battle_result["boss_defeated"]:
+             insight_msg = f"Victory! {boss.name} defeated!"
+        else:
+             insight_msg = f"Battle: {boss.name} HP {boss.current_hp}/{boss.total_hp}"
+    else:
+        insight_msg = "Boss already defeated today."
+
+    # 3. Hybrid Rewards (XP, Resources based on Rules)
+    if columns is not None:
+        resource_xp, resource_msg = batch_hybrid_rewards(user.stats, columns, rule_index)
+    else:
+        resource_xp, resource_msg = calculate_hybrid_rewards(user.stats, new_logs, rule_index, daily_totals)
+
+    # If boss was defeated in THIS tick, add boss reward to stats
+    if battle_summary and battle_summary.boss_defeated and battle_summary.xp_reward > 0:
+        user.stats.xp += battle_summary.xp_reward
+        insight_msg += f" +{battle_summary.xp_reward} XP!"
+    # last_sync_time marks the user active for the nightly boss job
+    commit_stat_changes(db, user.stats, before, assign={"last_sync_time": func.now()})
+
+    # 4. Level Up, as many levels as the XP covers
+    levels_gained, level_msg = level_up(db, user.stats)
+    if levels_gained:
+        insight_msg = level_msg
+        expand_city(user.city_state, levels_gained)
+
+    # 5. Quests, checked after a battle: only the quests listening to this sync's events are loaded
+    if battle_summary:
+        context = battle_summary.model_dump()
+        quest_engine.dispatch(db, user.id, battle_events(context), context=context)
+
+    # Snapshot the response before commit expires the loaded graph
+    result = {
+        "xp_gained": resource_xp + (battle_summary.xp_reward if battle_summary else 0),
+        "level_up": levels_gained > 0,
+        "levels_gained": levels_gained,
+        "new_stats": schemas.CharacterStats.model_validate(user.stats),
+        "insight": f"{insight_msg} | {resource_msg}",
+        "battle": battle_summary
+    }
+    user_id, boss_status = user.id, schemas.BossStatus.model_validate(boss)
+    db.commit()
+    # Battles change the boss; refresh the cached copy (or drop it if defeated)
+    cache_todays_boss(user_id, boss_status)
+    return result
+
+
+class UsageStream:
+    """
+    Sync for uploads too large to buffer (multi-week backfills).
+    Logs are fed in with add_batch as they arrive; each batch is inserted and rolled up
+    straight away, and only per-(app, day) aggregates of the new logs are kept.
+    finish() then runs the game loop once over those aggregates, with the same result
+    run_sync_usage gives for the whole upload. Everything is committed in finish().
+    """
+
+    def __init__(self, db: Session, user_id: str):
+        self.db = db
+        self.user = _load_sync_user(db, user_id)
+        self.received = 0
+        self.stored = 0
+        self._sessions = Counter()
+        self._seconds = Counter()
+        self._daily_totals = {}
+
+    def add_batch(self, logs: list[UsageLogCreate]) -> None:
+        self.received += len(logs)
+        new_logs = insert_new_usage_logs(self.db, self.user.id, logs)
+        self.stored += len(new_logs)
+        for log in new_logs:
+            key = (log.app_package_name, usage_day(log))
+            self._sessions[key] += 1
+            self._seconds[key] += log.duration_seconds
+        # Later batches return later totals, so the last value seen is the day's total
+        self._daily_totals.update(update_daily_rollups(self.db, self.user.id, new_logs))
+
+    def finish(self) -> dict:
+        if self.received and not self.stored:
+            return _already_synced(self.db, self.user)
+        columns = encode_aggregates(self._sessions, self._seconds, self._daily_totals)
+        return _resolve_turn(self.db, self.user, [], self._daily_totals, columns)
+
+
+def load_todays_boss(db: Session, user_id: str) -> Union[BossEnemy, schemas.BossStatus]:
+    """Get today's boss status, generating it on first access. Polls are served from the boss cache."""
+    cached = get_cached_boss(user_id)
+    if cached is not None:
+        return cached
+
+    user = db.query(User).filter(User.id == user_id).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    boss = get_todays_boss(db, user_id)
+    if not boss:
+        boss = generate_daily_boss(db, user)
+        db.commit()
+    cache_todays_boss(user_id, boss)
+    return boss
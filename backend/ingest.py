@@ -0,0 +1,165 @@
+"""
+Usage log ingestion for the sync endpoints.
+Writes incoming logs with Core INSERTs instead of one ORM object per row,
+skips logs the server has already stored (retried uploads) or may already have
+archived (older than the retention cutoff), and keeps the per-day usage rollups in step.
+"""
+import hashlib
+import uuid
+from collections import defaultdict
+from datetime import date, datetime, timezone
+from typing import Optional
+
+from sqlalchemy import insert, select, update, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from models import UsageLog, DailyAppUsage
+from retention import retention_cutoff
+from schemas import UsageLogCreate
+
+# (app_package_name, day) -> total seconds that day
+DailyTotals = dict[tuple[str, date], int]
+
+# Dialects that support INSERT ... ON CONFLICT ... RETURNING
+_UPSERT_INSERTS = {
+    "sqlite": sqlite.insert,
+    "postgresql": postgresql.insert,
+}
+
+
+def _normalize_time(value: datetime) -> str:
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return value.isoformat()
+
+
+def usage_log_fingerprint(user_id: str, log: UsageLogCreate) -> str:
+    """Content hash identifying a session: same user, app and time window = same log."""
+    raw = "|".join((
+        user_id,
+        log.app_package_name,
+        _normalize_time(log.start_time),
+        _normalize_time(log.end_time),
+    ))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _log_row(user_id: str, log: UsageLogCreate, fingerprint: str) -> dict:
+    return {
+        "id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "app_package_name": log.app_package_name,
+        "start_time": log.start_time,
+        "end_time": log.end_time,
+        "duration_seconds": log.duration_seconds,
+        "fingerprint": fingerprint,
+    }
+
+
+def insert_new_usage_logs(db: Session, user_id: str, logs: list[UsageLogCreate],
+                          today: Optional[date] = None) -> list[UsageLogCreate]:
+    """
+    Insert-if-absent ingest.
+    All logs go out in a single executemany round trip (batched into multi-row
+    INSERT ... VALUES on SQLite and PostgreSQL) without touching the session identity map.
+    Logs whose fingerprint is already stored, or repeated within the batch, are skipped.
+    So are logs from before the retention cutoff: once their month is archived the
+    fingerprint is gone from the hot table and a retry would be rewarded again.
+    Returns only the logs that were actually inserted, in upload order.
+    """
+    cutoff = retention_cutoff(today)
+    pending = {}
+    for log in logs:
+        if usage_day(log) < cutoff:
+            continue
+        fingerprint = usage_log_fingerprint(user_id, log)
+        if fingerprint not in pending:
+            pending[fingerprint] = log
+    if not pending:
+        return []
+
+    rows = [_log_row(user_id, log, fingerprint) for fingerprint, log in pending.items()]
+    dialect_insert = _UPSERT_INSERTS.get(db.get_bind().dialect.name)
+
+    if dialect_insert is not None:
+        stmt = (
+            dialect_insert(UsageLog)
+            .on_conflict_do_nothing(index_elements=[UsageLog.fingerprint, UsageLog.start_time])
+            .returning(UsageLog.fingerprint)
+        )
+        inserted = set(db.scalars(stmt, rows).all())
+    else:
+        # Generic fallback: one lookup for the whole batch, then plain insert
+        existing = set(db.scalars(
+            select(UsageLog.fingerprint).where(UsageLog.fingerprint.in_(pending))
+        ).all())
+        rows = [row for row in rows if row["fingerprint"] not in existing]
+        if rows:
+            db.execute(insert(UsageLog), rows)
+        inserted = {row["fingerprint"] for row in rows}
+
+    return [log for fingerprint, log in pending.items() if fingerprint in inserted]
+
+
+def usage_day(log: UsageLogCreate) -> date:
+    """
+    The day a session counts towards (its local start date). The rollups and the
+    daily-limit lookups in game_logic and batch_engine all key days with this.
+    """
+    return log.start_time.date()
+
+
+def update_daily_rollups(db: Session, user_id: str, logs: list[UsageLogCreate]) -> DailyTotals:
+    """
+    Add new logs to the (user, app, day) rollup table in one upsert.
+    Call with the logs returned by insert_new_usage_logs, inside the same transaction.
+    Returns the updated day totals for every (app, day) the batch touched.
+    """
+    increments = defaultdict(lambda: [0, 0])
+    for log in logs:
+        entry = increments[(log.app_package_name, usage_day(log))]
+        entry[0] += log.duration_seconds
+        entry[1] += 1
+    if not increments:
+        return {}
+
+    rows = [
+        {"user_id": user_id, "app_package_name": package, "day": day,
+         "total_seconds": seconds, "session_count": sessions}
+        for (package, day), (seconds, sessions) in increments.items()
+    ]
+    dialect_insert = _UPSERT_INSERTS.get(db.get_bind().dialect.name)
+
+    if dialect_insert is not None:
+        stmt = dialect_insert(DailyAppUsage).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[DailyAppUsage.user_id, DailyAppUsage.day, DailyAppUsage.app_package_name],
+            set_={
+                "total_seconds": DailyAppUsage.total_seconds + stmt.excluded.total_seconds,
+                "session_count": DailyAppUsage.session_count + stmt.excluded.session_count,
+            }
+        ).returning(DailyAppUsage.app_package_name, DailyAppUsage.day, DailyAppUsage.total_seconds)
+        return {(package, day): total for package, day, total in db.execute(stmt)}
+
+    # Generic fallback: update each key, inserting the ones that did not exist yet
+    for row in rows:
+        result = db.execute(
+            update(DailyAppUsage)
+            .where(DailyAppUsage.user_id == user_id,
+                   DailyAppUsage.day == row["day"],
+                   DailyAppUsage.app_package_name == row["app_package_name"])
+            .values(total_seconds=DailyAppUsage.total_seconds + row["total_seconds"],
+                    session_count=DailyAppUsage.session_count + row["session_count"])
+        )
+        if result.rowcount == 0:
+            db.execute(insert(DailyAppUsage).values(row))
+    return {
+        (package, day): total
+        for package, day, total in db.execute(
+            select(DailyAppUsage.app_package_name, DailyAppUsage.day, DailyAppUsage.total_seconds).where(
+                DailyAppUsage.user_id == user_id,
+                tuple_(DailyAppUsage.app_package_name, DailyAppUsage.day).in_(list(increments))
+            )
+        )
+    }
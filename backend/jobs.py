@@ -0,0 +1,169 @@
+"""
+Batch jobs run outside the request path.
+
+pregenerate-bosses: create the next day's boss for every active user ahead of time,
+so the first sync of the day only reads its boss (generate_daily_boss stays as the
+fallback for users the job missed, e.g. sign-ups after it ran).
+
+reset-daily-quests: archive the day's progress on DAILY quests and put them back
+IN_PROGRESS, for all users at once.
+
+Usage: python jobs.py pregenerate-bosses [--day YYYY-MM-DD] [--active-days 7]
+       python jobs.py reset-daily-quests [--day YYYY-MM-DD]
+In-process: set JOB_SCHEDULER=1 to run both nightly from the API server
+(see run_daily_job). Run them from one place only: cron or one API worker.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import uuid
+from datetime import date, datetime, time, timedelta
+from typing import Optional
+
+from sqlalchemy import Date, exists, insert, literal, or_, select, update
+from sqlalchemy.orm import Session
+
+from models import BossEnemy, CharacterStats, QuestArchive, QuestDefinition, QuestStatus, QuestType, UserQuest
+from game_logic import roll_boss
+import profile_cache
+
+logger = logging.getLogger(__name__)
+
+# Users who synced within this many days get a boss generated for them
+ACTIVE_USER_DAYS = int(os.getenv("BOSS_PREGEN_ACTIVE_DAYS", "7"))
+# Local times of day the scheduler runs each job
+BOSS_PREGEN_AT = time.fromisoformat(os.getenv("BOSS_PREGEN_AT", "23:30"))      # For the following day
+QUEST_RESET_AT = time.fromisoformat(os.getenv("QUEST_RESET_AT", "00:00"))      # For the day that just ended
+JOB_SCHEDULER = os.getenv("JOB_SCHEDULER", "0") == "1"
+
+
+def pregenerate_bosses(db: Session, day: Optional[date] = None, active_days: int = ACTIVE_USER_DAYS,
+                       rng: random.Random = random) -> int:
+    """
+    Insert `day`'s boss (default: tomorrow) for every user active in the last
+    `active_days` days who does not have one yet. One SELECT finds the users and
+    their levels, one multi-row INSERT writes all bosses. Returns bosses created.
+    """
+    day = day or date.today() + timedelta(days=1)
+    day_start = datetime.combine(day, datetime.min.time())
+    active_since = day_start - timedelta(days=active_days)
+
+    has_boss = exists().where(
+        BossEnemy.user_id == CharacterStats.user_id,
+        BossEnemy.date >= day_start,
+        BossEnemy.date < day_start + timedelta(days=1)
+    )
+    users = db.execute(
+        select(CharacterStats.user_id, CharacterStats.level).where(
+            CharacterStats.last_sync_time >= active_since,
+            ~has_boss
+        )
+    ).all()
+
+    rows = []
+    for user_id, level in users:
+        name, total_hp = roll_boss(level, rng)
+        rows.append({
+            "id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "date": day_start,
+            "name": name,
+            "total_hp": total_hp,
+            "current_hp": total_hp,
+            "damage_dealt_to_user": 0,
+            "is_defeated": False,
+        })
+    if rows:
+        db.execute(insert(BossEnemy), rows)
+    db.commit()
+    return len(rows)
+
+
+def reset_daily_quests(db: Session, day: Optional[date] = None) -> int:
+    """
+    End `day` (default: yesterday) for every user's DAILY quests in two statements:
+    INSERT ... SELECT copies each touched quest (progress made or completed) into
+    quest_archive, then one UPDATE puts those quests back to IN_PROGRESS at 0
+    (and one more bumps the owners' profile versions).
+    Completed but unclaimed rewards lapse with the reset. Returns quests reset.
+    """
+    day = day or date.today() - timedelta(days=1)
+    touched = (
+        UserQuest.quest_def_id.in_(
+            select(QuestDefinition.id).where(QuestDefinition.quest_type == QuestType.DAILY)
+        ),
+        or_(UserQuest.status != QuestStatus.IN_PROGRESS, UserQuest.current_progress > 0),
+    )
+    db.execute(insert(QuestArchive).from_select(
+        ["user_quest_id", "user_id", "quest_def_id", "period", "status", "current_progress", "completed_at"],
+        select(
+            UserQuest.id, UserQuest.user_id, UserQuest.quest_def_id, literal(day, Date),
+            UserQuest.status, UserQuest.current_progress, UserQuest.completed_at
+        ).where(*touched)
+    ))
+    profile_cache.bump_state_version(db, select(UserQuest.user_id).where(*touched).distinct())
+    reset = db.execute(
+        update(UserQuest).where(*touched).values(
+            status=QuestStatus.IN_PROGRESS, current_progress=0, completed_at=None
+        ).execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return reset.rowcount
+
+
+def _seconds_until(at: time, now: datetime) -> float:
+    run = datetime.combine(now.date(), at)
+    if run <= now:
+        run += timedelta(days=1)
+    return (run - now).total_seconds()
+
+
+async def run_daily_job(job, session_factory, at: time) -> None:
+    """Run `job(db)` every day at local time `at`, until cancelled."""
+    def run_once():
+        db = session_factory()
+        try:
+            return job(db)
+        finally:
+            db.close()
+
+    while True:
+        await asyncio.sleep(_seconds_until(at, datetime.now()))
+        try:
+            count = await asyncio.to_thread(run_once)
+            logger.info("%s: %d rows", job.__name__, count)
+        except Exception:
+            logger.exception("%s failed", job.__name__)
+
+
+def scheduled_jobs(session_factory) -> list:
+    """Coroutines for every nightly job, for the API server to run as tasks."""
+    return [
+        run_daily_job(pregenerate_bosses, session_factory, BOSS_PREGEN_AT),
+        run_daily_job(reset_daily_quests, session_factory, QUEST_RESET_AT),
+    ]
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Idle Hero batch jobs.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    pregen = commands.add_parser("pregenerate-bosses", help="Create the next day's bosses for active users")
+    pregen.add_argument("--day", type=date.fromisoformat, default=None, help="Day to generate (default: tomorrow)")
+    pregen.add_argument("--active-days", type=int, default=ACTIVE_USER_DAYS)
+    reset = commands.add_parser("reset-daily-quests", help="Archive and reset every user's daily quests")
+    reset.add_argument("--day", type=date.fromisoformat, default=None, help="Day being closed (default: yesterday)")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.command == "pregenerate-bosses":
+            created = pregenerate_bosses(db, day=args.day, active_days=args.active_days)
+            print(f"Created {created} boss(es)")
+        else:
+            print(f"Reset {reset_daily_quests(db, day=args.day)} daily quest(s)")
+    finally:
+        db.close()
@@ -0,0 +1,242 @@
+"""
+Local load generator for the game loop.
+Launches the API under uvicorn on a fresh SQLite file (or --database-url, e.g. a
+Postgres database), onboards synthetic users with detox rules, then replays a mix of
+sync_usage, get_profile, get_boss and buy_building requests at a target rate.
+Arrivals are open-loop (Poisson at --rps) and latency is measured from each request's
+scheduled time, so a slow server shows up as latency rather than as a lower send rate.
+
+Reported per endpoint: p50/p95/p99 latency, throughput, error rate (transport errors
+and 5xx; 4xx such as unaffordable purchases are counted separately) and the mean
+number of SQL statements per request, read from the X-DB-Queries header the server
+adds with DB_QUERY_COUNTS=1 (see query_counter.py).
+
+Usage: python loadtest.py [--users 50] [--rps 100] [--duration 30] [--concurrency 256]
+                          [--database-url postgresql://...] [--url http://host:port]
+                          [--out loadtest_results.json]
+--url targets a server that is already running instead of launching one.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional
+
+import httpx
+import numpy as np
+
+from game_logic import BUILDING_COSTS
+from query_counter import HEADER as QUERY_HEADER
+
+# Endpoint -> share of the traffic
+TRAFFIC_MIX = {
+    "sync_usage": 0.45,
+    "get_profile": 0.30,
+    "get_boss": 0.20,
+    "buy_building": 0.05,
+}
+APPS = {
+    "com.example.social": {"is_blocked": True},
+    "com.example.video": {"daily_limit_minutes": 60},
+    "com.example.reader": {},
+    "com.example.maps": {},
+}
+PERCENTILES = (50, 95, 99)
+
+# ==========================================
+# REQUESTS
+# ==========================================
+
+def usage_logs(rng: random.Random, now: datetime) -> list[dict]:
+    """Sessions since the previous sync: a handful of apps, a few minutes each."""
+    logs = []
+    start = now - timedelta(hours=1)
+    for _ in range(rng.randint(1, 12)):
+        duration = int(rng.expovariate(1 / 240)) + 10
+        logs.append({
+            "app_package_name": rng.choice(list(APPS)),
+            "start_time": start.isoformat(),
+            "end_time": (start + timedelta(seconds=duration)).isoformat(),
+            "duration_seconds": duration,
+        })
+        start += timedelta(seconds=duration + rng.randint(30, 300))
+    return logs
+
+
+def build_request(endpoint: str, user_id: str, rng: random.Random) -> tuple[str, str, Optional[list]]:
+    """(method, path, json body) for one request of `endpoint`."""
+    if endpoint == "sync_usage":
+        return "POST", f"/sync/usage/{user_id}", usage_logs(rng, datetime.now())
+    if endpoint == "get_profile":
+        return "GET", f"/user/profile/{user_id}", None
+    if endpoint == "get_boss":
+        return "GET", f"/game/boss/{user_id}", None
+    return "POST", f"/city/buy/{user_id}/{rng.choice(list(BUILDING_COSTS))}", None
+
+
+async def onboard_users(client: httpx.AsyncClient, count: int, run_id: str) -> list[str]:
+    """Create `count` users, each with a blocking rule and a daily limit."""
+    user_ids = []
+    for i in range(count):
+        response = await client.post("/user/onboard", json={
+            "username": f"load-{run_id}-{i}", "email": f"load-{run_id}-{i}@example.com"
+        })
+        response.raise_for_status()
+        user_id = response.json()["id"]
+        for app, rule in APPS.items():
+            if rule:
+                (await client.post(f"/rules/{user_id}", json={"app_package_name": app, **rule})).raise_for_status()
+        user_ids.append(user_id)
+    return user_ids
+
+# ==========================================
+# TRAFFIC
+# ==========================================
+
+class Recorder:
+    """Per-endpoint latencies, status counts and query counts."""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.queries = defaultdict(list)
+
+    def record(self, endpoint: str, latency: float, status: str, queries: Optional[str] = None) -> None:
+        self.latencies[endpoint].append(latency)
+        self.statuses[endpoint][status] += 1
+        if queries is not None:
+            self.queries[endpoint].append(int(queries))
+
+    def report(self, elapsed: float) -> dict:
+        report = {}
+        for endpoint in sorted(self.latencies):
+            latencies = np.array(self.latencies[endpoint]) * 1000
+            statuses = self.statuses[endpoint]
+            errors = sum(n for status, n in statuses.items() if status == "error" or status.startswith("5"))
+            client_errors = sum(n for status, n in statuses.items() if status.startswith("4"))
+            report[endpoint] = {
+                "requests": len(latencies),
+                "throughput_rps": round(len(latencies) / elapsed, 2),
+                **{f"p{p}_ms": round(float(v), 2) for p, v in zip(PERCENTILES, np.percentile(latencies, PERCENTILES))},
+                "error_rate": round(errors / len(latencies), 4),
+                "client_error_rate": round(client_errors / len(latencies), 4),
+                "db_queries_mean": round(float(np.mean(self.queries[endpoint])), 2) if self.queries[endpoint] else None,
+                "statuses": dict(statuses),
+            }
+        return report
+
+
+async def _send(client: httpx.AsyncClient, recorder: Recorder, endpoint: str, request: tuple,
+                scheduled: float, limit: asyncio.Semaphore) -> None:
+    method, path, body = request
+    async with limit:
+        try:
+            response = await client.request(method, path, json=body)
+            status, queries = str(response.status_code), response.headers.get(QUERY_HEADER)
+        except httpx.HTTPError:
+            status, queries = "error", None
+    recorder.record(endpoint, time.perf_counter() - scheduled, status, queries)
+
+
+async def run_load(client: httpx.AsyncClient, user_ids: list[str], rps: float, duration: float,
+                   concurrency: int = 256, seed: int = 1) -> dict:
+    """Replay TRAFFIC_MIX at `rps` for `duration` seconds; returns the per-endpoint report."""
+    rng = random.Random(seed)
+    endpoints, weights = zip(*TRAFFIC_MIX.items())
+    recorder, limit, tasks = Recorder(), asyncio.Semaphore(concurrency), []
+
+    started = time.perf_counter()
+    scheduled = started
+    while scheduled - started < duration:
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        endpoint = rng.choices(endpoints, weights)[0]
+        request = build_request(endpoint, rng.choice(user_ids), rng)
+        tasks.append(asyncio.create_task(_send(client, recorder, endpoint, request, scheduled, limit)))
+        scheduled += rng.expovariate(rps)
+    await asyncio.gather(*tasks)
+    return recorder.report(time.perf_counter() - started)
+
+# ==========================================
+# SERVER
+# ==========================================
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def launch_server(database_url: str, port: int) -> subprocess.Popen:
+    """uvicorn main:app in a subprocess, with query counting on."""
+    env = {**os.environ, "DATABASE_URL": database_url, "DB_QUERY_COUNTS": "1"}
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=Path(__file__).resolve().parent, env=env
+    )
+
+
+async def wait_until_up(client: httpx.AsyncClient, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            (await client.get("/")).raise_for_status()
+            return
+        except httpx.HTTPError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.2)
+
+
+async def main(args) -> dict:
+    server = None
+    url = args.url
+    if url is None:
+        database_url = args.database_url or f"sqlite:///{Path(tempfile.mkdtemp()) / 'loadtest.db'}"
+        port = _free_port()
+        server = launch_server(database_url, port)
+        url = f"http://127.0.0.1:{port}"
+    try:
+        limits = httpx.Limits(max_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30) as client:
+            await wait_until_up(client)
+            user_ids = await onboard_users(client, args.users, run_id=str(int(time.time())))
+            report = await run_load(client, user_ids, args.rps, args.duration, args.concurrency, args.seed)
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+    return {"config": {"url": url, "users": args.users, "rps": args.rps, "duration": args.duration}, "endpoints": report}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay game loop traffic against a local server.")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--rps", type=float, default=100, help="Target requests per second (open loop)")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds of traffic")
+    parser.add_argument("--concurrency", type=int, default=256, help="Max requests in flight")
+    parser.add_argument("--database-url", default=None, help="Database for the launched server (default: fresh SQLite file)")
+    parser.add_argument("--url", default=None, help="Target an already running server instead")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", default=None, help="Also write the report as JSON")
+    args = parser.parse_args()
+
+    result = asyncio.run(main(args))
+    print(f"{'endpoint':<14}{'reqs':>7}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'err':>8}{'4xx':>8}{'queries':>9}")
+    for endpoint, row in result["endpoints"].items():
+        queries = "-" if row["db_queries_mean"] is None else row["db_queries_mean"]
+        print(f"{endpoint:<14}{row['requests']:>7}{row['throughput_rps']:>9}{row['p50_ms']:>9}{row['p95_ms']:>9}"
+              f"{row['p99_ms']:>9}{row['error_rate']:>8.2%}{row['client_error_rate']:>8.2%}{queries:>9}")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
@@ -1,6 +1,13 @@
-from fastapi import FastAPI, Depends, HTTPException
+import asyncio
+from datetime import date
+from typing import Optional
+
+from fastapi import FastAPI, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
+from sqlalchemy import update
 from sqlalchemy.orm import Session
-from database import get_db, engine
+from database import get_db, engine, SessionLocal, USE_ASYNC_DB
 from models import Base, User, CharacterStats, UsageLog, BossEnemy, Kingdom, Building
 import schemas
 from schemas import (
@@ -8,15 +15,19 @@ from schemas import (
     BossStatus, BattleSummary
 )
 from game_logic import (
-    generate_daily_boss, 
-    get_todays_boss, 
-    calculate_battle_outcome,
-    calculate_hybrid_rewards,
-    apply_level_up,
-    check_quests,
+    expand_city,
     BUILDING_COSTS
 )
+import game_loop
+import quest_engine
+import profile_cache
+import query_counter
+import reference_data
+import wire
+import jobs
+from stat_mutations import apply_stat_deltas, spend_resources, level_up
 import models
+from retention import ensure_partitions
 
 from routers import admin
 
@@ -29,10 +40,24 @@ app = FastAPI(
     version="1.1.0"
 )
 
+# Async game loop endpoints (USE_ASYNC_DB=1) are registered first,
+# so they take precedence over the sync versions of the same paths below.
+if USE_ASYNC_DB:
+    from routers import game_async
+    app.include_router(game_async.router)
+
 app.include_router(admin.router)
 from routers import debug
 app.include_router(debug.router)
 
+# X-DB-Queries response header when DB_QUERY_COUNTS=1 (load testing); off the hot path otherwise
+if query_counter.ENABLED:
+    query_counter.install(engine)
+    if USE_ASYNC_DB:
+        from database import async_engine
+        query_counter.install(async_engine.sync_engine)
+    app.middleware("http")(query_counter.middleware)
+
 from fastapi.middleware.cors import CORSMiddleware
 
 app.add_middleware(
@@ -54,155 +79,75 @@ def read_root():
 @app.post("/user/onboard", response_model=schemas.User)
 def onboard(user: UserCreate, db: Session = Depends(get_db)):
     """Create a new user and initialize their stats, city, and daily boss."""
-    db_user = models.User(username=user.username, email=user.email)
-    db.add(db_user)
-    db.commit()
+    db_user = game_loop.create_user(db, user.username, user.email)
     db.refresh(db_user)
-    
-    # Init stats
-    stats = models.CharacterStats(user_id=db_user.id)
-    db.add(stats)
-    
-    # Init city (Friend's logic)
-    city = models.CityState(user_id=db_user.id)
-    db.add(city)
-    
-    # Init Legacy Kingdom (just in case)
-    kingdom = models.Kingdom(user_id=db_user.id, name=f"{user.username}'s Kingdom")
-    db.add(kingdom)
-    
-    db.commit()
-    
-    # Generate first boss
-    generate_daily_boss(db, db_user)
-    
     return db_user
 
 
 @app.get("/user/profile/{user_id}", response_model=schemas.UserProfile)
-def get_profile(user_id: str, db: Session = Depends(get_db)):
-    """Get user profile with stats, city, rules, quests."""
-    user = db.query(User).filter(User.id == user_id).first()
-    
-    # Auto-create test user for dev environment if missing
-    if not user and user_id == 'test-user-id':
-        user = models.User(id=user_id, username="Test Hero", email="test@hero.com")
-        db.add(user)
-        db.commit()
-        db.refresh(user)
-        # Continue to ensure stats/city...
-        
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    # Ensure dependencies exist
-    if not user.stats:
-        user.stats = models.CharacterStats(user_id=user.id)
-        db.add(user.stats)
-    
-    if not user.city_state:
-        city = models.CityState(user_id=user.id)
-        db.add(city)
-        
-    db.commit()
-    db.refresh(user)
-
-    # Debug Boost (Friend's Logic - kept for now)
-    if user.stats.bronze < 1000:
-         user.stats.bronze = 1000
-         user.stats.gold += 1000  
-         db.commit()
-
-    return user
+def get_profile(user_id: str, request: Request, db: Session = Depends(get_db)):
+    """Get user profile with stats, city, rules, quests. Cached; honours If-None-Match."""
+    return game_loop.profile_response(db, user_id, request.headers.get("if-none-match"))
 
 # =====================
 # SYNC & GAME LOOP
 # =====================
 
-@app.post("/sync/usage/{user_id}", response_model=schemas.SyncResponse)
-def sync_usage(user_id: str, logs: list[UsageLogCreate], db: Session = Depends(get_db)):
+@app.post("/sync/usage/{user_id}", response_model=schemas.SyncResponse, openapi_extra=wire.SYNC_REQUEST_BODY)
+def sync_usage(user_id: str, request: Request, logs: list[UsageLogCreate] = Depends(wire.read_usage_logs),
+               db: Session = Depends(get_db)):
     """
-    Core Game Loop:
-    1. Save Logs
-    2. Boss Battle (Damage Calc)
-    3. Rule Checks (XP/Resource Rewards)
-    4. Level Up Check
-    5. Quest Update
+    Core Game Loop (see game_loop.run_sync_usage).
+    Accepts and returns JSON by default, or MessagePack (see wire.py).
     """
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-        
-    # Ensure stats/city
-    if not user.stats:
-        user.stats = models.CharacterStats(user_id=user.id)
-        db.add(user.stats)
-    if not user.city_state:
-        user.city_state = models.CityState(user_id=user.id)
-        db.add(user.city_state)
-
-    # 1. Save logs (Deduplication logic needed ideally, but naive for now)
-    for log in logs:
-        db_log = models.UsageLog(
-            user_id=user_id,
-            app_package_name=log.app_package_name,
-            start_time=log.start_time,
-            end_time=log.end_time,
-            duration_seconds=log.duration_seconds
-        )
-        db.add(db_log)
-
-    # 2. Boss Battle
-    boss = get_todays_boss(db, user_id)
-    if not boss:
-        boss = generate_daily_boss(db, user)
-    
-    battle_summary = None
-    if not boss.is_defeated:
-        battle_result = calculate_battle_outcome(user.stats, logs, boss, user.rules)
-        battle_summary = BattleSummary(**battle_result)
-        
-        # Determine insight message from battle
-        if battle_result["boss_defeated"]:
-             insight_msg = f"Victory! {boss.name} defeated!"
-        else:
-             insight_msg = f"Battle: {boss.name} HP {boss.current_hp}/{boss.total_hp}"
-    else:
-        insight_msg = "Boss already defeated today."
-
-    # 3. Hybrid Rewards (XP, Resources based on Rules)
-    resource_xp, resource_msg = calculate_hybrid_rewards(user.stats, logs, user.rules)
-    
-    # If boss was defeated in THIS tick, add boss reward to stats
-    if battle_summary and battle_summary.boss_defeated and battle_summary.xp_reward > 0:
-        # Check if we already awarded this (e.g. if logs sent multiple times)? 
-        # For naive impl, we assume client sends fresh logs.
-        user.stats.xp += battle_summary.xp_reward
-        insight_msg += f" +{battle_summary.xp_reward} XP!"
-
-    # 4. Level Up
-    leveled_up, level_msg = apply_level_up(user.stats)
-    if leveled_up:
-        insight_msg = level_msg
-        # City Expansion effect
-        if user.city_state:
-            user.city_state.level += 1
-            if user.city_state.level % 5 == 0:
-                user.city_state.unlocked_rings += 1
-
-    # 5. Quests
-    if battle_summary:
-        check_quests(user, battle_summary.dict())
+    return wire.sync_response(request, game_loop.run_sync_usage(db, user_id, logs))
 
-    db.commit()
 
-    return {
-        "xp_gained": resource_xp + (battle_summary.xp_reward if battle_summary else 0),
-        "level_up": leveled_up,
-        "new_stats": user.stats,
-        "insight": f"{insight_msg} | {resource_msg}",
-        "battle": battle_summary
-    }
+# Logs inserted per round trip while streaming, and the longest accepted NDJSON line
+STREAM_BATCH_SIZE = 500
+STREAM_MAX_LINE_BYTES = 64 * 1024
+
+@app.post(
+    "/sync/usage/{user_id}/stream",
+    response_model=schemas.SyncResponse,
+    openapi_extra={"requestBody": {"content": {"application/x-ndjson": {"schema": UsageLogCreate.model_json_schema()}}}}
+)
+async def sync_usage_stream(user_id: str, request: Request, db: Session = Depends(get_db)):
+    """
+    Streaming variant of sync_usage for large backfills.
+    Body is newline-delimited JSON, one UsageLogCreate per line, and may be sent chunked.
+    Logs are validated and stored in batches as they arrive, so memory stays flat
+    however long the upload is; the battle and rewards run once at the end.
+    """
+    stream = await run_in_threadpool(game_loop.UsageStream, db, user_id)
+    batch = []
+    buffer = b""
+    line_no = 0
+
+    def parse(line: bytes):
+        nonlocal line_no
+        line_no += 1
+        if line.strip():
+            try:
+                batch.append(UsageLogCreate.model_validate_json(line))
+            except ValidationError as e:
+                raise HTTPException(status_code=422, detail={"line": line_no, "errors": e.errors(include_url=False, include_context=False)})
+
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        if len(buffer) > STREAM_MAX_LINE_BYTES:
+            raise HTTPException(status_code=413, detail=f"Line {line_no + 1} is too long")
+        for line in lines:
+            parse(line)
+            if len(batch) >= STREAM_BATCH_SIZE:
+                await run_in_threadpool(stream.add_batch, batch)
+                batch = []
+    parse(buffer)
+    if batch:
+        await run_in_threadpool(stream.add_batch, batch)
+
+    return await run_in_threadpool(stream.finish)
 
 
 # =====================
@@ -212,14 +157,7 @@ def sync_usage(user_id: str, logs: list[UsageLogCreate], db: Session = Depends(g
 @app.get("/game/boss/{user_id}", response_model=schemas.BossStatus)
 def get_boss(user_id: str, db: Session = Depends(get_db)):
     """Get today's boss status."""
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    boss = get_todays_boss(db, user_id)
-    if not boss:
-        boss = generate_daily_boss(db, user)
-    return boss
+    return game_loop.load_todays_boss(db, user_id)
 
 # =====================
 # CITY ENDPOINTS (Friend's Logic)
@@ -230,21 +168,16 @@ def buy_building(user_id: str, building_type: str, db: Session = Depends(get_db)
     if building_type not in BUILDING_COSTS:
         raise HTTPException(status_code=400, detail="Invalid building type")
         
-    user = db.query(User).filter(User.id == user_id).first()
+    user = game_loop.load_user_state(db, user_id, collections=())
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
     cost = BUILDING_COSTS[building_type]
     stats = user.stats
     
-    # Check resources
-    if stats.bronze < cost["bronze"] or stats.gold < cost["gold"] or stats.diamond < cost["diamond"]:
+    # Check and deduct resources in one conditional UPDATE
+    if not stats or not spend_resources(db, stats, cost):
         raise HTTPException(status_code=400, detail="Not enough resources")
-        
-    # Deduct resources
-    stats.bronze -= cost["bronze"]
-    stats.gold -= cost["gold"]
-    stats.diamond -= cost["diamond"]
     
     # Add building
     building = models.UserBuilding(user_id=user_id, building_type=building_type)
@@ -256,7 +189,12 @@ def buy_building(user_id: str, building_type: str, db: Session = Depends(get_db)
         # Unlock logic simplified for now
         
     db.commit()
-    return {"message": f"Purchased {building_type}", "success": True, "new_stats": stats, "unlocked_rings": user.city_state.unlocked_rings}
+    return {"message": f"Purchased {building_type}", "success": True, "new_stats": schemas.CharacterStats.model_validate(stats), "unlocked_rings": user.city_state.unlocked_rings if user.city_state else 1}
+
+@app.get("/city/costs", response_model=dict[str, dict[str, int]])
+def get_building_costs(request: Request, db: Session = Depends(get_db)):
+    """Building costs by type, from the reference data cache (ETag / 304)."""
+    return reference_data.respond("building_costs", request, db)
 
 @app.get("/city/buildings/{user_id}", response_model=list[schemas.UserBuilding])
 def get_user_buildings(user_id: str, db: Session = Depends(get_db)):
@@ -269,7 +207,7 @@ def get_user_buildings(user_id: str, db: Session = Depends(get_db)):
 def upgrade_building(user_id: str, building_id: int, db: Session = Depends(get_db)):
     from game_logic import calculate_upgrade_cost
     
-    user = db.query(User).filter(User.id == user_id).first()
+    user = game_loop.load_user_state(db, user_id, collections=())
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
         
@@ -280,19 +218,15 @@ def upgrade_building(user_id: str, building_id: int, db: Session = Depends(get_d
     cost = calculate_upgrade_cost(building.building_type, building.level)
     stats = user.stats
     
-    if stats.bronze < cost["bronze"] or stats.gold < cost["gold"] or stats.diamond < cost["diamond"]:
+    if not stats or not spend_resources(db, stats, cost):
         raise HTTPException(status_code=400, detail="Not enough resources")
-        
-    stats.bronze -= cost["bronze"]
-    stats.gold -= cost["gold"]
-    stats.diamond -= cost["diamond"]
     
     building.level += 1
     if user.city_state:
         user.city_state.population += 50
         
     db.commit()
-    return {"message": f"Upgraded {building.building_type}", "success": True, "new_level": building.level, "new_stats": stats}
+    return {"message": f"Upgraded {building.building_type}", "success": True, "new_level": building.level, "new_stats": schemas.CharacterStats.model_validate(stats)}
 
 
 # =====================
@@ -300,25 +234,24 @@ def upgrade_building(user_id: str, building_id: int, db: Session = Depends(get_d
 # =====================
 # (My Logic - Simplified for brevity but mostly intact)
 
+@app.get("/quests/definitions", response_model=list[schemas.QuestDefinition])
+def get_quest_definitions(request: Request, db: Session = Depends(get_db)):
+    """All quest definitions, from the reference data cache (ETag / 304)."""
+    return reference_data.respond("quest_definitions", request, db)
+
 @app.get("/quests/{user_id}", response_model=list[schemas.UserQuest])
 def get_user_quests(user_id: str, db: Session = Depends(get_db)):
     user = db.query(models.User).filter(models.User.id == user_id).first()
     if not user: raise HTTPException(status_code=404, detail="User not found")
 
-    # Seed quest definitions if not present
-    if db.query(models.QuestDefinition).count() == 0:
-        db.add_all([
-            models.QuestDefinition(code="DAILY_SYNC", title="First Step", target_progress=1, reward_xp=50, reward_gold=100),
-            models.QuestDefinition(code="BOSS_SLAYER", title="Boss Slayer", target_progress=1, reward_xp=200, reward_gold=250),
-            models.QuestDefinition(code="FOCUS_MASTER", title="Focus Master", target_progress=1, reward_xp=150, reward_gold=150)
-        ])
-        db.commit()
+    # Seed quest definitions if not present (cached after the first check)
+    if quest_engine.seed_quest_definitions(db):
+        reference_data.invalidate("quest_definitions")
 
     # Auto-create user quests if none exist
     if not user.quests:
-        quest_defs = db.query(models.QuestDefinition).all()
-        for qd in quest_defs:
-            uq = models.UserQuest(user_id=user_id, quest_def_id=qd.id, current_progress=0, status=models.QuestStatus.IN_PROGRESS)
+        for definition_id in quest_engine.get_definitions(db):
+            uq = models.UserQuest(user_id=user_id, quest_def_id=definition_id, current_progress=0, status=models.QuestStatus.IN_PROGRESS)
             db.add(uq)
         db.commit()
         db.refresh(user)
@@ -329,33 +262,56 @@ def get_user_quests(user_id: str, db: Session = Depends(get_db)):
 def claim_quest_reward(quest_id: str, db: Session = Depends(get_db)):
     quest = db.query(models.UserQuest).filter(models.UserQuest.id == quest_id).first()
     if not quest: raise HTTPException(status_code=404, detail="Quest not found")
-    if quest.status != models.QuestStatus.COMPLETED:
+    rewards = quest_engine.get_definition(db, quest.quest_def_id)
+    if not rewards: raise HTTPException(status_code=404, detail="Quest definition not found")
+
+    # Flip COMPLETED -> CLAIMED atomically, so a double-tapped claim pays out once
+    claimed = db.execute(
+        update(models.UserQuest)
+        .where(models.UserQuest.id == quest_id, models.UserQuest.status == models.QuestStatus.COMPLETED)
+        .values(status=models.QuestStatus.CLAIMED)
+        .execution_options(synchronize_session=False)
+    )
+    if claimed.rowcount != 1:
         raise HTTPException(status_code=400, detail="Not completed")
+    profile_cache.touch(db, quest.user_id)
         
     user = quest.user
-    rewards = quest.definition
-    
+
     if user.stats:
-        user.stats.xp += rewards.reward_xp
-        user.stats.gold += rewards.reward_gold
+        apply_stat_deltas(db, user.stats, {"xp": rewards.reward_xp, "gold": rewards.reward_gold})
         
-        # Check level up from quest XP?
-        # For simplicity, we skip full level-up curve check here or call apply_level_up
-        # apply_level_up(user.stats) # Optional
+        # Level up from quest XP
+        levels, _ = level_up(db, user.stats)
+        expand_city(user.city_state, levels)
     
-    quest.status = models.QuestStatus.CLAIMED
     db.commit()
     db.refresh(quest)
     return quest
 
 
+# =====================
+# USAGE STATS
+# =====================
+
+@app.get("/stats/daily/{user_id}", response_model=list[schemas.DailyAppUsage])
+def get_daily_usage(user_id: str, day: Optional[date] = None, db: Session = Depends(get_db)):
+    """Per-app usage totals for one day (default: today), read from the rollup table."""
+    day = day or date.today()
+    return db.query(models.DailyAppUsage).filter(
+        models.DailyAppUsage.user_id == user_id,
+        models.DailyAppUsage.day == day
+    ).order_by(models.DailyAppUsage.total_seconds.desc()).all()
+
+
 # =====================
 # RULES & CLASSES
 # =====================
 
 @app.get("/classes", response_model=list[schemas.HeroClass])
-def get_classes(db: Session = Depends(get_db)):
-    return db.query(models.HeroClass).all()
+def get_classes(request: Request, db: Session = Depends(get_db)):
+    """Hero classes, from the reference data cache (ETag / 304)."""
+    return reference_data.respond("classes", request, db)
 
 @app.post("/user/{user_id}/class/{class_id}", response_model=schemas.CharacterStats)
 def select_class(user_id: str, class_id: str, db: Session = Depends(get_db)):
@@ -376,15 +332,31 @@ def get_rules(user_id: str, db: Session = Depends(get_db)):
 
 @app.post("/rules/{user_id}", response_model=schemas.DetoxRule)
 def create_rule(user_id: str, rule: schemas.DetoxRuleCreate, db: Session = Depends(get_db)):
-    db_rule = models.DetoxRule(user_id=user_id, **rule.dict())
+    db_rule = models.DetoxRule(user_id=user_id, **rule.model_dump())
     db.add(db_rule)
     db.commit()
     db.refresh(db_rule)
     return db_rule
 
 # Startup Seeding
+@app.on_event("startup")
+async def start_job_scheduler():
+    # Nightly jobs in-process (JOB_SCHEDULER=1); otherwise run jobs.py from cron
+    app.state.scheduled_jobs = []
+    if jobs.JOB_SCHEDULER:
+        app.state.scheduled_jobs = [asyncio.create_task(job) for job in jobs.scheduled_jobs(SessionLocal)]
+
+@app.on_event("shutdown")
+async def stop_job_scheduler():
+    for task in getattr(app.state, "scheduled_jobs", []):
+        task.cancel()
+
 @app.on_event("startup")
 def startup_event():
+    # Monthly usage_logs partitions (PostgreSQL only, no-op elsewhere)
+    with engine.begin() as conn:
+        ensure_partitions(conn)
+
     db = next(get_db())
     # Seed Classes
     if db.query(models.HeroClass).count() == 0:
@@ -396,10 +368,7 @@ def startup_event():
         db.commit()
     
     # Seed Quests
-    if db.query(models.QuestDefinition).count() == 0:
-        db.add_all([
-            models.QuestDefinition(code="DAILY_SYNC", title="First Step", target_progress=1, reward_xp=50, reward_gold=100),
-            models.QuestDefinition(code="BOSS_SLAYER", title="Boss Slayer", target_progress=1, reward_xp=200, reward_gold=250),
-            models.QuestDefinition(code="FOCUS_MASTER", title="Focus Master", target_progress=1, reward_xp=150, reward_gold=150)
-        ])
-        db.commit()
+    quest_engine.seed_quest_definitions(db)
+
+    # Serve classes, quest definitions and building costs from memory
+    reference_data.load(db)
@@ -1,47 +1,124 @@
-import sqlite3
 import os
 
 DB_FILE = "sql_app.db"
 
+# Columns to check and add, per table
+NEW_COLUMNS = {
+    "users": {
+        "state_version": "INTEGER NOT NULL DEFAULT 0",
+    },
+    "character_stats": {
+        "gold": "INTEGER DEFAULT 0",
+        "diamond": "INTEGER DEFAULT 0",
+        "bronze": "INTEGER DEFAULT 0",
+        "last_sync_time": "TIMESTAMP WITH TIME ZONE",
+        "class_id": "TEXT",
+        "skill_points": "INTEGER DEFAULT 0"
+    },
+    "usage_logs": {
+        "fingerprint": "TEXT",
+    },
+}
+
+# Indexes to create if missing (name -> DDL)
+NEW_INDEXES = {
+    "uq_usage_logs_fingerprint": "CREATE UNIQUE INDEX IF NOT EXISTS uq_usage_logs_fingerprint ON usage_logs (fingerprint, start_time)",
+    "ix_usage_logs_user_start": "CREATE INDEX IF NOT EXISTS ix_usage_logs_user_start ON usage_logs (user_id, start_time DESC)",
+    "ix_boss_enemies_user_date_defeated": "CREATE INDEX IF NOT EXISTS ix_boss_enemies_user_date_defeated ON boss_enemies (user_id, date, is_defeated)",
+    "ix_users_created_at_id": "CREATE INDEX IF NOT EXISTS ix_users_created_at_id ON users (created_at, id)",
+    "ix_character_stats_user_id": "CREATE INDEX IF NOT EXISTS ix_character_stats_user_id ON character_stats (user_id)",
+    "ix_character_stats_level_user": "CREATE INDEX IF NOT EXISTS ix_character_stats_level_user ON character_stats (level, user_id)",
+    "ix_daily_app_usage_day_user": "CREATE INDEX IF NOT EXISTS ix_daily_app_usage_day_user ON daily_app_usage (day, user_id)",
+    "ix_boss_enemies_date_defeated": "CREATE INDEX IF NOT EXISTS ix_boss_enemies_date_defeated ON boss_enemies (date, is_defeated)",
+    "ix_detox_rules_user_app": "CREATE INDEX IF NOT EXISTS ix_detox_rules_user_app ON detox_rules (user_id, app_package_name)",
+    "ix_user_quests_user_status": "CREATE INDEX IF NOT EXISTS ix_user_quests_user_status ON user_quests (user_id, status)",
+    "ix_user_quests_user_created": "CREATE INDEX IF NOT EXISTS ix_user_quests_user_created ON user_quests (user_id, created_at DESC)",
+}
+
+# Superseded indexes, dropped if present
+OLD_INDEXES = ["ix_character_stats_level"]
+
+# Data fixes, safe to run repeatedly (description -> SQL)
+BACKFILLS = {
+    # The admin listing sorts on character_stats.level, so every user needs a stats row with a level
+    "character_stats for users without one": (
+        "INSERT INTO character_stats (user_id, level, xp, health, max_health, attack_power, defense, gold, diamond, bronze) "
+        "SELECT id, 1, 0, 100, 100, 5, 2, 0, 0, 0 FROM users "
+        "WHERE NOT EXISTS (SELECT 1 FROM character_stats WHERE character_stats.user_id = users.id)"
+    ),
+    "character_stats.level defaults": "UPDATE character_stats SET level = 1 WHERE level IS NULL",
+}
+
+def apply_migrations(conn) -> None:
+    """
+    Bring an existing database up to the current schema, on a SQLAlchemy connection
+    (SQLite or PostgreSQL). Every step is idempotent, so it is safe to re-run.
+    """
+    from sqlalchemy import inspect, text
+    from retention import partition_usage_logs
+
+    postgres = conn.dialect.name == "postgresql"
+    inspector = inspect(conn)
+    for table, new_columns in NEW_COLUMNS.items():
+        # Get existing columns
+        columns = [column["name"] for column in inspector.get_columns(table)]
+        print(f"Existing columns in {table}: {columns}")
+
+        for col, dtype in new_columns.items():
+            if postgres:
+                print(f"Ensuring column: {table}.{col}")
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {col} {dtype}"))
+            elif col not in columns:
+                print(f"Adding column: {table}.{col}")
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {col} {dtype}"))
+            else:
+                print(f"Column {table}.{col} exists.")
+
+    # PostgreSQL only: move a pre-partitioning usage_logs into monthly partitions
+    if partition_usage_logs(conn):
+        print("Converted usage_logs to monthly partitions.")
+
+    for name, ddl in NEW_INDEXES.items():
+        print(f"Ensuring index: {name}")
+        conn.execute(text(ddl))
+
+    for name in OLD_INDEXES:
+        print(f"Dropping index if present: {name}")
+        conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+    for description, sql in BACKFILLS.items():
+        print(f"Backfilling: {description}")
+        conn.execute(text(sql))
+
 def migrate():
     if not os.path.exists(DB_FILE):
         print("Database file not found.")
         return
 
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    
+    from sqlalchemy import create_engine
+
+    engine = create_engine(f"sqlite:///{DB_FILE}")
     try:
-        # Get existing columns
-        cursor.execute("PRAGMA table_info(character_stats)")
-        columns = [info[1] for info in cursor.fetchall()]
-        print(f"Existing columns: {columns}")
-        
-        # Columns to check and add
-        new_columns = {
-            "gold": "INTEGER DEFAULT 0",
-            "diamond": "INTEGER DEFAULT 0",
-            "bronze": "INTEGER DEFAULT 0",
-            "last_sync_time": "TIMESTAMP",
-            "class_id": "TEXT",
-            "skill_points": "INTEGER DEFAULT 0"
-        }
-        
-        for col, dtype in new_columns.items():
-            if col not in columns:
-                print(f"Adding column: {col}")
-                cursor.execute(f"ALTER TABLE character_stats ADD COLUMN {col} {dtype}")
-            else:
-                print(f"Column {col} exists.")
-                
-        conn.commit()
+        with engine.begin() as conn:
+            apply_migrations(conn)
         print("Migration complete.")
-        
     except Exception as e:
         print(f"Migration failed: {e}")
-        conn.rollback()
     finally:
-        conn.close()
+        engine.dispose()
+
+def migrate_postgres():
+    """PostgreSQL: same steps in one transaction (see apply_migrations)."""
+    from database import engine
+
+    with engine.begin() as conn:
+        apply_migrations(conn)
+    print("Migration complete.")
 
 if __name__ == "__main__":
-    migrate()
+    from database import DATABASE_URL
+
+    if DATABASE_URL.startswith("postgresql"):
+        migrate_postgres()
+    else:
+        migrate()
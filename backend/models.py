@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Enum as SQLEnum
+from sqlalchemy import text, Column, Integer, String, Boolean, ForeignKey, DateTime, Date, Index, Enum as SQLEnum
 from sqlalchemy.orm import relationship, declarative_base
 from sqlalchemy.sql import func
 import uuid
@@ -23,15 +23,21 @@ class HeroClass(Base):
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        # Admin listing keyset: ORDER BY created_at, id
+        Index("ix_users_created_at_id", "created_at", "id"),
+    )
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     username = Column(String, unique=True, index=True)
     email = Column(String, unique=True, index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Bumped whenever anything shown in the profile changes (see profile_cache.py)
+    state_version = Column(Integer, default=0, nullable=False, server_default="0")
     
     stats = relationship("CharacterStats", back_populates="user", uselist=False)
     rules = relationship("DetoxRule", back_populates="user")
-    logs = relationship("UsageLog", back_populates="user")
+    logs = relationship("UsageLog", back_populates="user", lazy="dynamic")  # Query, never loaded in full
     
     # Hybrid Integration: All Relationships
     unlocked_skills = relationship("UnlockedSkill", back_populates="user")
@@ -47,12 +53,17 @@ class User(Base):
 
 
 class CharacterStats(Base):
+    """Every user has exactly one row (game_loop.create_user; migrate_db.py backfills older users)."""
     __tablename__ = "character_stats"
+    __table_args__ = (
+        # Admin listing sorted by level (keyset on level, user_id) and the level distribution
+        Index("ix_character_stats_level_user", "level", "user_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(String, ForeignKey("users.id"))
+    user_id = Column(String, ForeignKey("users.id"), index=True)
     
-    level = Column(Integer, default=1)
+    level = Column(Integer, default=1, nullable=False)
     xp = Column(Integer, default=0)
     focus = Column(Integer, default=10)
     discipline = Column(Integer, default=10)
@@ -91,6 +102,10 @@ class UnlockedSkill(Base):
 
 class DetoxRule(Base):
     __tablename__ = "detox_rules"
+    __table_args__ = (
+        # Rule lookup per (user, app), e.g. analytics.blocked_app_minutes
+        Index("ix_detox_rules_user_app", "user_id", "app_package_name"),
+    )
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     user_id = Column(String, ForeignKey("users.id"))
@@ -103,23 +118,56 @@ class DetoxRule(Base):
     user = relationship("User", back_populates="rules")
 
 class UsageLog(Base):
+    """
+    One app session. On PostgreSQL the table is range-partitioned by start_time into
+    monthly partitions (see retention.py), so start_time is part of every unique key.
+    """
     __tablename__ = "usage_logs"
+    __table_args__ = (
+        # Dedup key for retried syncs (see ingest.py). The fingerprint already hashes start_time.
+        Index("uq_usage_logs_fingerprint", "fingerprint", "start_time", unique=True),
+        # A user's logs newest first (admin inspector), read with LIMIT
+        Index("ix_usage_logs_user_start", "user_id", text("start_time DESC")),
+        {"postgresql_partition_by": "RANGE (start_time)"},
+    )
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     user_id = Column(String, ForeignKey("users.id"))
     
     app_package_name = Column(String, index=True)
-    start_time = Column(DateTime(timezone=True))
+    start_time = Column(DateTime(timezone=True), primary_key=True)
     end_time = Column(DateTime(timezone=True))
     duration_seconds = Column(Integer)
     synced_at = Column(DateTime(timezone=True), server_default=func.now())
+    fingerprint = Column(String)
 
     user = relationship("User", back_populates="logs")
 
+class DailyAppUsage(Base):
+    """Per-user, per-app, per-day usage rollup. Updated in the same transaction as log ingest."""
+    __tablename__ = "daily_app_usage"
+    __table_args__ = (
+        # Per-day aggregates across users (analytics.py)
+        Index("ix_daily_app_usage_day_user", "day", "user_id"),
+    )
+
+    user_id = Column(String, ForeignKey("users.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    app_package_name = Column(String, primary_key=True)
+
+    total_seconds = Column(Integer, default=0)
+    session_count = Column(Integer, default=0)
+
 
 class BossEnemy(Base):
     """Daily boss enemy for the Boss Battle mechanic."""
     __tablename__ = "boss_enemies"
+    __table_args__ = (
+        # Today's boss lookup: user_id = ? AND date in [today, tomorrow) AND is_defeated = false
+        Index("ix_boss_enemies_user_date_defeated", "user_id", "date", "is_defeated"),
+        # Kill rate per day across users (analytics.py)
+        Index("ix_boss_enemies_date_defeated", "date", "is_defeated"),
+    )
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     user_id = Column(String, ForeignKey("users.id"))
@@ -190,6 +238,12 @@ class QuestDefinition(Base):
 class UserQuest(Base):
     """Link between User and Quest (Progress tracking)."""
     __tablename__ = "user_quests"
+    __table_args__ = (
+        # quest_engine.dispatch: a user's in-progress quests
+        Index("ix_user_quests_user_status", "user_id", "status"),
+        # A user's quests newest first (admin inspector), read with LIMIT
+        Index("ix_user_quests_user_created", "user_id", text("created_at DESC")),
+    )
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     user_id = Column(String, ForeignKey("users.id"))
@@ -204,6 +258,21 @@ class UserQuest(Base):
     definition = relationship("QuestDefinition")
 
 
+class QuestArchive(Base):
+    """Progress of a repeating (daily) quest, kept when the quest resets."""
+    __tablename__ = "quest_archive"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_quest_id = Column(String, index=True)
+    user_id = Column(String, ForeignKey("users.id"), index=True)
+    quest_def_id = Column(String, ForeignKey("quest_definitions.id"))
+    period = Column(Date, nullable=False)                  # Day the progress was made
+    status = Column(String)
+    current_progress = Column(Integer)
+    completed_at = Column(DateTime(timezone=True), nullable=True)
+    archived_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
 # --- DEPRECATED/COMPATIBILITY ---
 class Kingdom(Base):
     """Kingdom for resource management system. Deprecated in favor of CityState."""
@@ -0,0 +1,35 @@
+"""
+Keyset (seek) pagination.
+A page continues after the previous page's last row with
+WHERE (sort_key, id) > (<that row's sort_key, id>) ORDER BY sort_key, id LIMIT n,
+so a deep page costs the same index range scan as the first one (OFFSET would
+read and discard every earlier row), and rows inserted meanwhile never shift pages.
+The cursor is the last row's id; its key values are read back by a subquery in
+the same statement, so they never round-trip through the client.
+"""
+from typing import Optional, Sequence
+
+from sqlalchemy import Select, tuple_
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def seek(key: Sequence, anchor: Select, descending: bool = False):
+    """
+    Condition selecting the rows after `anchor` in ORDER BY `key`. `anchor` selects
+    the same key columns for the cursor row; `key` must end with a unique column.
+    """
+    anchor = anchor.correlate(None).scalar_subquery()
+    return tuple_(*key) < anchor if descending else tuple_(*key) > anchor
+
+
+def ordering(key: Sequence, descending: bool = False) -> list:
+    return [column.desc() if descending else column.asc() for column in key]
+
+
+def split_page(rows: list, limit: int, cursor_of) -> tuple[list, Optional[str]]:
+    """Cut rows fetched with LIMIT limit + 1 into (page, next cursor or None)."""
+    if len(rows) > limit:
+        return rows[:limit], cursor_of(rows[limit - 1])
+    return rows, None
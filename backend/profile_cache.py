@@ -0,0 +1,108 @@
+"""
+Versioned profile cache.
+users.state_version is bumped, in the same transaction, whenever anything the
+profile shows changes: ORM flushes of the user's stats, city, rules, quests or
+buildings are picked up by a Session listener, and set-based UPDATEs that bypass
+the unit of work call touch() (one user) or bump_state_version() (many).
+A profile GET then costs one primary-key read of the version: the serialized
+body is reused while the version matches, and the version is the ETag, so a
+client polling with If-None-Match gets a 304 without the graph being loaded.
+Hero classes and quest definitions are static reference data and not tracked.
+"""
+from typing import Callable, Iterable, Optional, Union
+
+from sqlalchemy import event, select, update
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+
+from models import User, CharacterStats, CityState, DetoxRule, UserQuest, UserBuilding
+
+# Rows whose changes show up in the profile of their `user_id`
+_PROFILE_MODELS = (CharacterStats, CityState, DetoxRule, UserQuest, UserBuilding)
+
+# Session.info key: user ids changed by the current transaction
+_CHANGED = "profile_cache.changed_users"
+
+
+def touch(db: Session, user_id: str) -> None:
+    """Mark the user's profile changed; the version is bumped when `db` commits."""
+    db.info.setdefault(_CHANGED, set()).add(user_id)
+
+
+def bump_state_version(db: Session, user_ids: Union[Iterable[str], Select]) -> None:
+    """Bump the version of every user in `user_ids` (ids, or a SELECT of ids) now, in one UPDATE."""
+    if not isinstance(user_ids, Select):
+        user_ids = list(user_ids)
+        if not user_ids:
+            return
+    db.execute(
+        update(User)
+        .where(User.id.in_(user_ids))
+        .values(state_version=User.state_version + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_users(session: Session, flush_context) -> None:
+    for obj in session.new | session.deleted:
+        if isinstance(obj, User):
+            touch(session, obj.id)
+        elif isinstance(obj, _PROFILE_MODELS) and obj.user_id:
+            touch(session, obj.user_id)
+    for obj in session.dirty:
+        # dirty also lists objects whose attributes were set to their current value
+        if not session.is_modified(obj, include_collections=False):
+            continue
+        if isinstance(obj, User):
+            touch(session, obj.id)
+        elif isinstance(obj, _PROFILE_MODELS) and obj.user_id:
+            touch(session, obj.user_id)
+
+
+@event.listens_for(Session, "before_commit")
+def _bump_changed_users(session: Session) -> None:
+    # Flush first so changes pending at commit time are collected too
+    session.flush()
+    changed = session.info.pop(_CHANGED, None)
+    if changed:
+        bump_state_version(session, changed)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_changed_users(session: Session) -> None:
+    session.info.pop(_CHANGED, None)
+
+
+# ==========================================
+# CACHE
+# ==========================================
+
+PROFILE_CACHE_SIZE = 10000
+# user_id -> (state_version, serialized profile)
+_profiles: dict[str, tuple[int, bytes]] = {}
+
+
+def etag_for(user_id: str, version: int) -> str:
+    return f'"{user_id}.{version}"'
+
+
+def get_state_version(db: Session, user_id: str) -> Optional[int]:
+    """The user's current state version, or None if the user does not exist."""
+    return db.execute(select(User.state_version).where(User.id == user_id)).scalar_one_or_none()
+
+
+def get_profile(user_id: str, version: int, build: Callable[[], bytes]) -> bytes:
+    """The serialized profile at `version`, calling build() only on a miss."""
+    entry = _profiles.get(user_id)
+    if entry is not None and entry[0] == version:
+        return entry[1]
+    body = build()
+    if entry is None and len(_profiles) >= PROFILE_CACHE_SIZE:
+        _profiles.pop(next(iter(_profiles)))  # Evict oldest entry
+    _profiles[user_id] = (version, body)
+    return body
+
+
+def clear() -> None:
+    _profiles.clear()
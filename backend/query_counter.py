@@ -0,0 +1,44 @@
+"""
+Per-request SQL statement counts.
+With DB_QUERY_COUNTS=1 every response carries an X-DB-Queries header with the number
+of statements the request executed (see loadtest.py, which reports them per endpoint).
+The count lives in a ContextVar set by the middleware, so it follows the request
+into the threadpool (sync endpoints) and AsyncSession.run_sync (async ones).
+main.py only installs the listener and the middleware when enabled, so normal
+requests pay nothing for it.
+"""
+import os
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+ENABLED = os.getenv("DB_QUERY_COUNTS", "0") == "1"
+HEADER = "X-DB-Queries"
+
+# One-item list per request, shared by every context copied from the request's
+_count: ContextVar[Optional[list]] = ContextVar("db_query_count", default=None)
+
+
+def _count_statement(conn, cursor, statement, parameters, context, executemany) -> None:
+    counter = _count.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+def install(engine: Engine) -> None:
+    """Count statements executed on `engine` (for an AsyncEngine, pass its sync_engine)."""
+    if not event.contains(engine, "before_cursor_execute", _count_statement):
+        event.listen(engine, "before_cursor_execute", _count_statement)
+
+
+async def middleware(request, call_next):
+    counter = [0]
+    token = _count.set(counter)
+    try:
+        response = await call_next(request)
+    finally:
+        _count.reset(token)
+    response.headers[HEADER] = str(counter[0])
+    return response
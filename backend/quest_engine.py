@@ -0,0 +1,161 @@
+"""
+Event-driven quest engine.
+Each quest code registers a handler for the one game event it listens to
+(sync, boss_defeated, zero_damage). A sync fires its events once, and only the user's
+in-progress quests whose code listens to one of them are loaded and advanced.
+Quest definitions are static seed data and are cached per process.
+
+Adding a quest: seed a QuestDefinition and register its code:
+
+    @quest_handler("NIGHT_WATCH", EVENT_SYNC)
+    def _night_watch(progress: int, context: dict) -> int:
+        return progress + 1
+"""
+from datetime import datetime
+from typing import Callable, Iterable, NamedTuple, Optional
+
+from sqlalchemy.orm import Session
+
+from models import QuestDefinition, UserQuest, QuestStatus
+
+# ==========================================
+# EVENTS & HANDLERS
+# ==========================================
+
+EVENT_SYNC = "sync"                    # Every sync that ran the game loop
+EVENT_BOSS_DEFEATED = "boss_defeated"  # The sync's battle defeated the boss
+EVENT_ZERO_DAMAGE = "zero_damage"      # The sync's battle dealt no damage to the hero
+
+# (current_progress, event context) -> new progress
+QuestHandler = Callable[[int, dict], int]
+
+# code -> (event, handler)
+_handlers: dict[str, tuple[str, QuestHandler]] = {}
+
+def quest_handler(code: str, event: str):
+    """Register the handler advancing quests with `code` whenever `event` fires."""
+    def register(handler: QuestHandler) -> QuestHandler:
+        _handlers[code] = (event, handler)
+        return handler
+    return register
+
+def codes_for(events: Iterable[str]) -> list[str]:
+    events = set(events)
+    return [code for code, (event, _) in _handlers.items() if event in events]
+
+@quest_handler("DAILY_SYNC", EVENT_SYNC)
+def _daily_sync(progress: int, context: dict) -> int:
+    return 1
+
+@quest_handler("FOCUS_MASTER", EVENT_ZERO_DAMAGE)
+def _focus_master(progress: int, context: dict) -> int:
+    return progress + 1
+
+@quest_handler("BOSS_SLAYER", EVENT_BOSS_DEFEATED)
+def _boss_slayer(progress: int, context: dict) -> int:
+    return progress + 1
+
+def battle_events(battle_summary: Optional[dict]) -> list[str]:
+    """Events fired by one sync, given its battle summary (None when no battle was fought)."""
+    events = [EVENT_SYNC]
+    if battle_summary:
+        if battle_summary["boss_damage_dealt"] == 0:
+            events.append(EVENT_ZERO_DAMAGE)
+        if battle_summary["boss_defeated"]:
+            events.append(EVENT_BOSS_DEFEATED)
+    return events
+
+# ==========================================
+# PROGRESS
+# ==========================================
+
+def advance_quest(quest: UserQuest, code: str, target_progress: int, events: Iterable[str], context: dict) -> bool:
+    """Run `code`'s handler on `quest` if its event fired. Returns True if the quest completed."""
+    registered = _handlers.get(code)
+    if registered is None or registered[0] not in events or quest.status != QuestStatus.IN_PROGRESS:
+        return False
+    event, handler = registered
+    quest.current_progress = handler(quest.current_progress or 0, context)
+    if quest.current_progress >= target_progress:
+        quest.status = QuestStatus.COMPLETED
+        quest.completed_at = datetime.utcnow()
+        return True
+    return False
+
+def dispatch(db: Session, user_id: str, events: Iterable[str], context: Optional[dict] = None) -> list[UserQuest]:
+    """
+    Advance the user's in-progress quests listening to `events`, loaded in one query
+    together with their code and target. Changes are flushed with the caller's commit.
+    Returns the quests that completed.
+    """
+    events = set(events)
+    codes = codes_for(events)
+    if not codes:
+        return []
+    rows = db.query(UserQuest, QuestDefinition.code, QuestDefinition.target_progress).join(
+        QuestDefinition, UserQuest.quest_def_id == QuestDefinition.id
+    ).filter(
+        UserQuest.user_id == user_id,
+        UserQuest.status == QuestStatus.IN_PROGRESS,
+        QuestDefinition.code.in_(codes)
+    ).all()
+    return [
+        quest for quest, code, target in rows
+        if advance_quest(quest, code, target, events, context or {})
+    ]
+
+# ==========================================
+# DEFINITIONS
+# ==========================================
+
+DEFAULT_QUESTS = [
+    {"code": "DAILY_SYNC", "title": "First Step", "target_progress": 1, "reward_xp": 50, "reward_gold": 100},
+    {"code": "BOSS_SLAYER", "title": "Boss Slayer", "target_progress": 1, "reward_xp": 200, "reward_gold": 250},
+    {"code": "FOCUS_MASTER", "title": "Focus Master", "target_progress": 1, "reward_xp": 150, "reward_gold": 150},
+]
+
+class QuestDefinitionInfo(NamedTuple):
+    """Detached copy of a QuestDefinition row, safe to share across sessions."""
+    id: str
+    code: str
+    quest_type: str
+    target_progress: int
+    reward_xp: int
+    reward_gold: int
+
+# Per-process cache: definition id -> QuestDefinitionInfo. None until first loaded.
+_definitions: Optional[dict[str, QuestDefinitionInfo]] = None
+
+def clear_definition_cache() -> None:
+    global _definitions
+    _definitions = None
+
+def get_definitions(db: Session) -> dict[str, QuestDefinitionInfo]:
+    """All quest definitions by id, read from the database once per process."""
+    global _definitions
+    if _definitions is None:
+        definitions = {
+            d.id: QuestDefinitionInfo(d.id, d.code, d.quest_type, d.target_progress or 1, d.reward_xp or 0, d.reward_gold or 0)
+            for d in db.query(QuestDefinition).all()
+        }
+        if not definitions:
+            return definitions  # Not seeded yet; look again next time
+        _definitions = definitions
+    return _definitions
+
+def get_definition(db: Session, definition_id: str) -> Optional[QuestDefinitionInfo]:
+    definition = get_definitions(db).get(definition_id)
+    if definition is None:
+        # Added since the cache was filled (e.g. seeded by another worker)
+        clear_definition_cache()
+        definition = get_definitions(db).get(definition_id)
+    return definition
+
+def seed_quest_definitions(db: Session) -> bool:
+    """Insert DEFAULT_QUESTS if no definitions exist. Returns True if it seeded."""
+    if get_definitions(db):
+        return False
+    db.add_all([QuestDefinition(**quest) for quest in DEFAULT_QUESTS])
+    db.commit()
+    clear_definition_cache()
+    return True
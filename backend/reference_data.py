@@ -0,0 +1,87 @@
+"""
+Static reference data: hero classes, quest definitions and building costs.
+Each dataset is serialized once per process (at startup, or on first request)
+and served with a strong ETag, so app launches revalidate with If-None-Match and
+get a 304 without a database query. Call invalidate() after changing seed data.
+"""
+import hashlib
+import json
+from typing import Callable, Optional
+
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+from sqlalchemy.orm import Session
+
+import models
+import schemas
+from game_logic import BUILDING_COSTS
+
+# Clients may keep a copy but must revalidate (cheap: 304) before each use,
+# so an invalidation shows up on the next app launch.
+CACHE_CONTROL = "public, no-cache"
+
+
+class ReferenceEntry:
+    """One serialized dataset and its ETag."""
+    __slots__ = ("body", "etag")
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self.etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def _hero_classes(db: Session) -> bytes:
+    classes = db.query(models.HeroClass).order_by(models.HeroClass.name).all()
+    return TypeAdapter(list[schemas.HeroClass]).dump_json(classes)
+
+def _quest_definitions(db: Session) -> bytes:
+    definitions = db.query(models.QuestDefinition).order_by(models.QuestDefinition.code).all()
+    return TypeAdapter(list[schemas.QuestDefinition]).dump_json(definitions)
+
+def _building_costs(db: Session) -> bytes:
+    return json.dumps(BUILDING_COSTS, sort_keys=True, separators=(",", ":")).encode()
+
+LOADERS: dict[str, Callable[[Session], bytes]] = {
+    "classes": _hero_classes,
+    "quest_definitions": _quest_definitions,
+    "building_costs": _building_costs,
+}
+
+# Per-process cache: dataset name -> ReferenceEntry
+_cache: dict[str, ReferenceEntry] = {}
+
+
+def load(db: Session) -> None:
+    """Serialize every dataset; called at startup after seeding."""
+    for name, loader in LOADERS.items():
+        _cache[name] = ReferenceEntry(loader(db))
+
+def invalidate(name: Optional[str] = None) -> None:
+    """Drop one dataset (or all); it is reloaded on next request."""
+    if name is None:
+        _cache.clear()
+    else:
+        _cache.pop(name, None)
+
+def get(name: str, db: Session) -> ReferenceEntry:
+    entry = _cache.get(name)
+    if entry is None:
+        entry = _cache[name] = ReferenceEntry(LOADERS[name](db))
+    return entry
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison: ignore W/ prefixes
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+
+def respond(name: str, request: Request, db: Session) -> Response:
+    """The dataset as JSON, or 304 Not Modified when the client's copy is current."""
+    entry = get(name, db)
+    headers = {"ETag": entry.etag, "Cache-Control": CACHE_CONTROL}
+    if etag_matches(request.headers.get("if-none-match"), entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
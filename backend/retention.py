@@ -0,0 +1,223 @@
+"""
+Usage log retention: monthly partitions and cold archival.
+
+PostgreSQL: usage_logs is range-partitioned by start_time into monthly partitions
+(usage_logs_yYYYYmMM) plus a default partition. Expired months are archived, then
+detached and dropped, so the hot table's indexes only cover the retention window.
+SQLite has no native partitioning: expired months are archived, then deleted by
+start_time range in one statement each.
+
+A usage_logs table created before partitioning stays a plain table until it is
+converted with partition_usage_logs (run by migrate_db.py on PostgreSQL); until then
+retention falls back to range deletes and logs a warning.
+Ingest rejects logs older than the retention cutoff (see ingest.py): their month may
+already be archived, so the hot table can no longer tell a retried sync from a new one.
+
+Archives are compressed, column-oriented NumPy files (.npz), one or more per month,
+under USAGE_LOG_ARCHIVE_DIR.
+
+Usage: python retention.py [--days 90] [--archive-dir ./archive]
+"""
+import argparse
+import logging
+import os
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import select, delete, func, text
+from sqlalchemy.orm import Session
+
+from models import UsageLog
+
+RETENTION_DAYS = int(os.getenv("USAGE_LOG_RETENTION_DAYS", "90"))
+ARCHIVE_DIR = Path(os.getenv("USAGE_LOG_ARCHIVE_DIR", Path(__file__).resolve().parent / "archive"))
+ARCHIVE_CHUNK_ROWS = 100_000  # Rows per archive file, bounds memory while archiving
+PARTITION_MONTHS_AHEAD = 2
+
+logger = logging.getLogger(__name__)
+
+# ==========================================
+# MONTH HELPERS
+# ==========================================
+
+def month_start(day: date) -> date:
+    return date(day.year, day.month, 1)
+
+def add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+def month_bounds(month: date) -> tuple[datetime, datetime]:
+    """[start, end) of a month as datetimes, for start_time range filters."""
+    return datetime.combine(month, datetime.min.time()), datetime.combine(add_months(month, 1), datetime.min.time())
+
+def partition_name(month: date) -> str:
+    return f"usage_logs_y{month.year}m{month.month:02d}"
+
+def retention_cutoff(today: Optional[date] = None, retention_days: int = RETENTION_DAYS) -> date:
+    """First month kept in the hot table; run_retention archives every month before it."""
+    today = today or date.today()
+    return month_start(date.fromordinal(today.toordinal() - retention_days))
+
+# ==========================================
+# POSTGRES PARTITIONS
+# ==========================================
+
+def _is_partitioned(conn) -> bool:
+    if conn.dialect.name != "postgresql":
+        return False
+    return conn.execute(text(
+        "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE c.relname = 'usage_logs'"
+    )).first() is not None
+
+def ensure_partitions(conn, today: Optional[date] = None, months_ahead: int = PARTITION_MONTHS_AHEAD,
+                      since: Optional[date] = None) -> list[str]:
+    """
+    Create the default partition and monthly partitions from `since` (default: this month)
+    up to `months_ahead` months out.
+    No-op unless usage_logs is a partitioned PostgreSQL table. Returns created partition names.
+    """
+    if not _is_partitioned(conn):
+        return []
+    conn.execute(text("CREATE TABLE IF NOT EXISTS usage_logs_default PARTITION OF usage_logs DEFAULT"))
+    last = add_months(month_start(today or date.today()), months_ahead)
+    month = month_start(since) if since else month_start(today or date.today())
+    names = []
+    while month <= last:
+        name = partition_name(month)
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF usage_logs "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+        ))
+        names.append(name)
+        month = add_months(month, 1)
+    return names
+
+def _partition_exists(conn, name: str) -> bool:
+    return conn.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar() is not None
+
+def partition_usage_logs(conn, today: Optional[date] = None) -> bool:
+    """
+    Convert a plain usage_logs table (created before partitioning) to the partitioned
+    layout: move it aside, create the partitioned table and its indexes, add a partition
+    for every month it holds, copy the rows over and drop the old table.
+    Runs in the caller's transaction and keeps usage_logs locked until it commits, so
+    run it in a maintenance window. No-op on SQLite or an already partitioned table.
+    Returns whether the table was converted.
+    """
+    if conn.dialect.name != "postgresql" or _is_partitioned(conn) or not _partition_exists(conn, "usage_logs"):
+        return False
+    conn.execute(text("ALTER TABLE usage_logs RENAME TO usage_logs_unpartitioned"))
+    # Index (and primary key) names are schema-wide: free them for the new table
+    indexes = conn.execute(text(
+        "SELECT indexname FROM pg_indexes WHERE tablename = 'usage_logs_unpartitioned'"
+    )).scalars().all()
+    for name in indexes:
+        conn.execute(text(f'ALTER INDEX "{name}" RENAME TO "{name}_unpartitioned"'))
+
+    UsageLog.__table__.create(conn)
+    oldest = conn.execute(text("SELECT min(start_time) FROM usage_logs_unpartitioned")).scalar()
+    ensure_partitions(conn, today, since=oldest.date() if oldest else None)
+    columns = ", ".join(column.name for column in UsageLog.__table__.columns)
+    conn.execute(text(f"INSERT INTO usage_logs ({columns}) SELECT {columns} FROM usage_logs_unpartitioned"))
+    conn.execute(text("DROP TABLE usage_logs_unpartitioned"))
+    return True
+
+# ==========================================
+# ARCHIVAL
+# ==========================================
+
+def _to_naive_utc(value: datetime) -> datetime:
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def _write_chunk(path: Path, rows: list) -> None:
+    user_ids, packages, starts, ends, durations, fingerprints = zip(*rows)
+    np.savez_compressed(
+        path,
+        user_id=np.array(user_ids, dtype=str),
+        app_package_name=np.array(packages, dtype=str),
+        start_time=np.array([_to_naive_utc(v) for v in starts], dtype="datetime64[s]"),
+        end_time=np.array([_to_naive_utc(v) if v else None for v in ends], dtype="datetime64[s]"),
+        duration_seconds=np.array([d or 0 for d in durations], dtype=np.int64),
+        fingerprint=np.array([f or "" for f in fingerprints], dtype=str),
+    )
+
+def archive_month(db: Session, month: date, archive_dir: Path = ARCHIVE_DIR) -> list[Path]:
+    """Write one month of usage logs to compressed columnar files. Returns the files written."""
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    start, end = month_bounds(month)
+    result = db.execute(
+        select(
+            UsageLog.user_id, UsageLog.app_package_name, UsageLog.start_time,
+            UsageLog.end_time, UsageLog.duration_seconds, UsageLog.fingerprint
+        ).where(
+            UsageLog.start_time >= start,
+            UsageLog.start_time < end
+        ).execution_options(yield_per=ARCHIVE_CHUNK_ROWS)
+    )
+    paths = []
+    for part, rows in enumerate(result.partitions()):
+        path = archive_dir / f"{partition_name(month)}.part{part:04d}.npz"
+        _write_chunk(path, rows)
+        paths.append(path)
+    return paths
+
+def drop_month(db: Session, month: date) -> None:
+    """Remove one month from the hot table: drop its partition if it has one, else range-delete."""
+    conn = db.connection()
+    name = partition_name(month)
+    if _is_partitioned(conn) and _partition_exists(conn, name):
+        conn.execute(text(f"ALTER TABLE usage_logs DETACH PARTITION {name}"))
+        conn.execute(text(f"DROP TABLE {name}"))
+    # Rows outside a monthly partition (SQLite, or the Postgres default partition)
+    start, end = month_bounds(month)
+    db.execute(delete(UsageLog).where(UsageLog.start_time >= start, UsageLog.start_time < end))
+
+def run_retention(db: Session, today: Optional[date] = None, retention_days: int = RETENTION_DAYS,
+                  archive_dir: Path = ARCHIVE_DIR) -> list[Path]:
+    """
+    Archive and drop every whole month that ended more than `retention_days` ago.
+    Each month is committed on its own, after its archive files are written.
+    Daily rollups (daily_app_usage) are kept; only raw logs leave the hot table.
+    """
+    conn = db.connection()
+    if conn.dialect.name == "postgresql" and not _is_partitioned(conn):
+        logger.warning("usage_logs is not partitioned: expired months are deleted row by row. "
+                       "Run migrate_db.py to convert it.")
+    cutoff = retention_cutoff(today, retention_days)
+    oldest = db.execute(select(func.min(UsageLog.start_time))).scalar()
+    if oldest is None:
+        return []
+
+    paths = []
+    month = month_start(oldest)
+    while month < cutoff:
+        paths.extend(archive_month(db, month, archive_dir))
+        drop_month(db, month)
+        db.commit()
+        month = add_months(month, 1)
+    return paths
+
+
+if __name__ == "__main__":
+    from database import SessionLocal, engine
+
+    parser = argparse.ArgumentParser(description="Archive and drop expired usage logs.")
+    parser.add_argument("--days", type=int, default=RETENTION_DAYS, help="Days of raw logs to keep")
+    parser.add_argument("--archive-dir", type=Path, default=ARCHIVE_DIR)
+    args = parser.parse_args()
+
+    with engine.begin() as conn:
+        ensure_partitions(conn)
+
+    db = SessionLocal()
+    try:
+        written = run_retention(db, retention_days=args.days, archive_dir=args.archive_dir)
+        print(f"Archived {len(written)} file(s) to {args.archive_dir}")
+    finally:
+        db.close()
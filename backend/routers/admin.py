@@ -1,12 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from typing import List
+from sqlalchemy import Select, func, select
+from typing import List, Literal, Optional
+from datetime import date, timedelta
 import os
 
 from database import get_db
 import models, schemas
+import profile_cache
+import analytics
+from game_logic import invalidate_boss_cache, expand_city
+from stat_mutations import apply_stat_deltas, level_up
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, seek, ordering, split_page
 
 router = APIRouter(
     prefix="/admin",
@@ -25,37 +31,165 @@ async def admin_dashboard(request: Request):
 
 # --- API Routes ---
 
+# Sort keys for the user listing, each ending with a unique user id. created_at and level
+# are raw indexed columns (ix_users_created_at_id, ix_character_stats_level_user), so any
+# page is an index range scan. class orders by the joined class name, which no index can
+# serve: each page of it sorts every matching user, so deep pages cost a full scan.
+# Filter by class_name and sort by created_at or level to page a large class cheaply.
+_USER_CLASS = func.coalesce(models.HeroClass.name, "None")
+_USER_SORTS = {
+    "created_at": (models.User.created_at, models.User.id),
+    "level": (models.CharacterStats.level, models.CharacterStats.user_id),
+    "class": (_USER_CLASS, models.User.id),
+}
+
+def _user_listing(*columns) -> Select:
+    """SELECT columns FROM users with their stats (one row per user) and class joined in."""
+    return select(*columns).select_from(models.User).join(
+        models.CharacterStats, models.CharacterStats.user_id == models.User.id
+    ).outerjoin(
+        models.HeroClass, models.HeroClass.id == models.CharacterStats.class_id
+    )
+
 @router.get("/api/users")
-def get_all_users(db: Session = Depends(get_db)):
-    """Get brief summary of all users."""
-    users = db.query(models.User).all()
-    summary = []
-    for u in users:
-        stats = u.stats
-        summary.append({
-            "id": u.id,
-            "username": u.username,
-            "level": stats.level if stats else 1,
-            "class": u.stats.hero_class.name if u.stats and u.stats.hero_class else "None",
-            "last_active": u.created_at.isoformat() # Placeholder for real last active
-        })
-    return summary
+def get_all_users(
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    sort: Literal["created_at", "level", "class"] = "created_at",
+    order: Literal["asc", "desc"] = "desc",
+    class_name: Optional[str] = None,
+    min_level: Optional[int] = None,
+    max_level: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    One page of user summaries, from a single joined query projecting only the listed
+    columns. Pass the returned next_cursor to get the following page (keyset, see
+    pagination.py; the class sort is not index-served, see _USER_SORTS); total is only
+    counted for the first page.
+    """
+    filters = []
+    if class_name is not None:
+        filters.append(_USER_CLASS == class_name)
+    if min_level is not None:
+        filters.append(models.CharacterStats.level >= min_level)
+    if max_level is not None:
+        filters.append(models.CharacterStats.level <= max_level)
+
+    key, descending = _USER_SORTS[sort], order == "desc"
+    query = _user_listing(
+        models.User.id,
+        models.User.username,
+        models.CharacterStats.level,
+        _USER_CLASS.label("class_name"),
+        func.coalesce(models.CharacterStats.last_sync_time, models.User.created_at).label("last_active")
+    ).where(*filters)
+    if cursor:
+        query = query.where(seek(key, _user_listing(*key).where(models.User.id == cursor), descending))
+    rows = db.execute(query.order_by(*ordering(key, descending)).limit(limit + 1)).all()
+    rows, next_cursor = split_page(rows, limit, lambda row: row.id)
+
+    return {
+        "users": [{
+            "id": row.id,
+            "username": row.username,
+            "level": row.level,
+            "class": row.class_name,
+            "last_active": row.last_active.isoformat() if row.last_active else None
+        } for row in rows],
+        "next_cursor": next_cursor,
+        "total": None if cursor else db.scalar(_user_listing(func.count()).where(*filters))
+    }
+
+# Inspector collections, newest first. Each is read as one keyset page from an index
+# leading with user_id, so inspecting a long-time user costs the same as a new one.
+_LOG_KEY = (models.UsageLog.start_time, models.UsageLog.id)        # ix_usage_logs_user_start
+_BOSS_KEY = (models.BossEnemy.date, models.BossEnemy.id)           # ix_boss_enemies_user_date_defeated
+_QUEST_KEY = (models.UserQuest.created_at, models.UserQuest.id)   # ix_user_quests_user_created
+
+def _keyset_page(db: Session, query: Select, key: tuple, anchor: Select, cursor: Optional[str], limit: int) -> dict:
+    """One page of `query` newest first, continuing after the row with id `cursor`."""
+    if cursor:
+        query = query.where(seek(key, anchor, descending=True))
+    rows = db.execute(query.order_by(*ordering(key, descending=True)).limit(limit + 1)).all()
+    rows, next_cursor = split_page(rows, limit, lambda row: row.id)
+    return {"items": [row._asdict() for row in rows], "next_cursor": next_cursor}
+
+def _log_page(db: Session, user_id: str, cursor: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE) -> dict:
+    Log = models.UsageLog
+    return _keyset_page(
+        db,
+        select(Log.id, Log.app_package_name, Log.start_time, Log.end_time, Log.duration_seconds).where(Log.user_id == user_id),
+        _LOG_KEY, select(*_LOG_KEY).where(Log.user_id == user_id, Log.id == cursor), cursor, limit
+    )
+
+def _boss_page(db: Session, user_id: str, cursor: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE) -> dict:
+    Boss = models.BossEnemy
+    return _keyset_page(
+        db,
+        select(Boss.id, Boss.date, Boss.name, Boss.total_hp, Boss.current_hp, Boss.damage_dealt_to_user,
+               Boss.is_defeated).where(Boss.user_id == user_id),
+        _BOSS_KEY, select(*_BOSS_KEY).where(Boss.user_id == user_id, Boss.id == cursor), cursor, limit
+    )
+
+def _quest_page(db: Session, user_id: str, cursor: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE) -> dict:
+    Quest, Definition = models.UserQuest, models.QuestDefinition
+    return _keyset_page(
+        db,
+        select(Quest.id, Definition.code, Definition.title, Quest.status, Quest.current_progress,
+               Definition.target_progress, Quest.completed_at)
+        .join(Definition, Quest.quest_def_id == Definition.id).where(Quest.user_id == user_id),
+        _QUEST_KEY, select(*_QUEST_KEY).where(Quest.user_id == user_id, Quest.id == cursor), cursor, limit
+    )
 
 @router.get("/api/users/{user_id}")
 def get_user_details(user_id: str, db: Session = Depends(get_db)):
-    """Get full details for inspector."""
+    """Get details for inspector: stats, kingdom, recent usage and the first page of each collection."""
     user = db.query(models.User).filter(models.User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
+    # Last 7 days of per-app usage from the rollup table
+    week_start = date.today() - timedelta(days=6)
+    daily_usage = db.query(models.DailyAppUsage).filter(
+        models.DailyAppUsage.user_id == user_id,
+        models.DailyAppUsage.day >= week_start
+    ).order_by(models.DailyAppUsage.day.desc(), models.DailyAppUsage.total_seconds.desc()).all()
+
     return {
         "user": user,
         "stats": user.stats,
         "kingdom": user.kingdom,
-        "quests": user.quests,
-        "logs": user.logs[-5:] if user.logs else [] # Last 5 logs
+        "quests": _quest_page(db, user_id),
+        "bosses": _boss_page(db, user_id, limit=5),
+        "logs": _log_page(db, user_id, limit=5),  # Last 5 logs
+        "daily_usage": [schemas.DailyAppUsage.model_validate(row) for row in daily_usage]
     }
 
+@router.get("/api/users/{user_id}/logs")
+def get_user_logs(user_id: str, cursor: Optional[str] = None,
+                  limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), db: Session = Depends(get_db)):
+    """The user's usage logs, newest first, one keyset page at a time."""
+    return _log_page(db, user_id, cursor, limit)
+
+@router.get("/api/users/{user_id}/bosses")
+def get_user_bosses(user_id: str, cursor: Optional[str] = None,
+                    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), db: Session = Depends(get_db)):
+    """The user's bosses, newest first, one keyset page at a time."""
+    return _boss_page(db, user_id, cursor, limit)
+
+@router.get("/api/users/{user_id}/quests")
+def get_user_quests(user_id: str, cursor: Optional[str] = None,
+                    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), db: Session = Depends(get_db)):
+    """The user's quests with their definition, newest first, one keyset page at a time."""
+    return _quest_page(db, user_id, cursor, limit)
+
+@router.get("/api/analytics/{report}")
+def get_analytics(report: Literal["levels", "daily_active", "boss_kill_rate", "blocked_minutes"],
+                  days: int = Query(30, ge=1, le=analytics.MAX_DAYS), db: Session = Depends(get_db)):
+    """Dashboard aggregates computed in SQL (see analytics.py); cached for a minute."""
+    return {"report": report, "days": days, "rows": analytics.report(db, report, days)}
+
 @router.post("/api/users/{user_id}/grant")
 def grant_resources(user_id: str, xp: int = 0, gold: int = 0, db: Session = Depends(get_db)):
     """Grant resources to a user."""
@@ -63,17 +197,17 @@ def grant_resources(user_id: str, xp: int = 0, gold: int = 0, db: Session = Depe
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
+    new_stats = None
     if user.stats:
-        user.stats.xp += xp
-        user.stats.gold += gold
-        # Check level up
-        while user.stats.xp >= 100 * user.stats.level:
-            user.stats.level += 1
-            user.stats.xp -= 100 * (user.stats.level - 1)
-            user.stats.health = user.stats.max_health
+        stats = user.stats
+        apply_stat_deltas(db, stats, {"xp": xp, "gold": gold})
+        # Check level up (same curve and rewards as the game loop)
+        levels, _ = level_up(db, stats)
+        expand_city(user.city_state, levels)
+        new_stats = schemas.CharacterStats.model_validate(stats)
             
     db.commit()
-    return {"message": f"Granted {xp} XP and {gold} Gold", "new_stats": user.stats}
+    return {"message": f"Granted {xp} XP and {gold} Gold", "new_stats": new_stats}
 
 @router.post("/api/users/{user_id}/reset")
 def reset_user(user_id: str, db: Session = Depends(get_db)):
@@ -93,6 +227,7 @@ def reset_user(user_id: str, db: Session = Depends(get_db)):
         
     # Reset Quests
     db.query(models.UserQuest).filter(models.UserQuest.user_id == user_id).delete()
+    profile_cache.touch(db, user_id)
     
     # Reset Kingdom
     if user.kingdom:
@@ -102,4 +237,5 @@ def reset_user(user_id: str, db: Session = Depends(get_db)):
     db.query(models.BossEnemy).filter(models.BossEnemy.user_id == user_id).delete()
     
     db.commit()
+    invalidate_boss_cache(user_id)
     return {"message": "User reset successfully"}
@@ -2,7 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from database import get_db
 import models
-from game_logic import generate_daily_boss
+from game_logic import generate_daily_boss, invalidate_boss_cache
 
 router = APIRouter(
     prefix="/debug",
@@ -49,9 +49,12 @@ def reset_boss(user_id: str, db: Session = Depends(get_db)):
         db.delete(b)
     
     db.commit()
+    invalidate_boss_cache(user_id)
     
     # Generate new
     new_boss = generate_daily_boss(db, user)
+    db.commit()
+    db.refresh(new_boss)
     return {"message": "Boss reset", "boss": new_boss}
 
 @router.post("/set_level/{user_id}/{level}")
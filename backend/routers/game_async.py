@@ -0,0 +1,40 @@
+from fastapi import APIRouter, Depends, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import get_async_db
+import game_loop
+import schemas
+import wire
+
+# Async versions of the hot game loop endpoints.
+# The game loop itself stays synchronous ORM code; AsyncSession.run_sync drives it
+# on the async driver's connection, so requests never occupy a threadpool worker.
+# Responses are serialized inside run_sync, where lazy loads are still allowed.
+router = APIRouter(
+    tags=["game"]
+)
+
+@router.get("/user/profile/{user_id}", response_model=schemas.UserProfile)
+async def get_profile_async(user_id: str, request: Request, db: AsyncSession = Depends(get_async_db)):
+    """Get user profile with stats, city, rules, quests. Cached; honours If-None-Match."""
+    def run(session):
+        return game_loop.profile_response(session, user_id, request.headers.get("if-none-match"))
+    return await db.run_sync(run)
+
+@router.post("/sync/usage/{user_id}", response_model=schemas.SyncResponse, openapi_extra=wire.SYNC_REQUEST_BODY)
+async def sync_usage_async(user_id: str, request: Request,
+                           logs: list[schemas.UsageLogCreate] = Depends(wire.read_usage_logs),
+                           db: AsyncSession = Depends(get_async_db)):
+    """Core Game Loop (see game_loop.run_sync_usage). JSON or MessagePack, see wire.py."""
+    def run(session):
+        result = game_loop.run_sync_usage(session, user_id, logs)
+        return schemas.SyncResponse.model_validate(result, from_attributes=True)
+    return wire.sync_response(request, await db.run_sync(run))
+
+@router.get("/game/boss/{user_id}", response_model=schemas.BossStatus)
+async def get_boss_async(user_id: str, db: AsyncSession = Depends(get_async_db)):
+    """Get today's boss status."""
+    def run(session):
+        boss = game_loop.load_todays_boss(session, user_id)
+        return schemas.BossStatus.model_validate(boss)
+    return await db.run_sync(run)
@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 from typing import List, Optional
-from datetime import datetime
+from datetime import date, datetime
 
 # User Schemas
 class UserBase(BaseModel):
@@ -89,6 +89,15 @@ class UsageLogCreate(BaseModel):
     end_time: datetime
     duration_seconds: int
 
+class DailyAppUsage(BaseModel):
+    """Rolled-up usage of one app on one day"""
+    app_package_name: str
+    day: date
+    total_seconds: int
+    session_count: int
+    class Config:
+        from_attributes = True
+
 # City Schemas (Friend's)
 class CityStateBase(BaseModel):
     level: int
@@ -136,6 +145,7 @@ class BattleSummary(BaseModel):
 class SyncResponse(BaseModel):
     xp_gained: int
     level_up: bool
+    levels_gained: int = 0
     new_stats: CharacterStats
     insight: Optional[str] = None
     battle: Optional[BattleSummary] = None # Optional boss battle info
@@ -0,0 +1,128 @@
+"""
+Atomic stat mutations.
+Changes to CharacterStats are written as relative UPDATEs
+(SET xp = xp + :d, gold = gold - :cost ... WHERE gold >= :cost) instead of
+read-modify-write through the ORM, so concurrent requests for the same user
+cannot overwrite each other's gains. Guards in the WHERE clause make
+conditional changes (purchases, level-ups) all-or-nothing without row locks.
+The new values come back with RETURNING and are loaded into the ORM object.
+"""
+from sqlalchemy import case, func, select, update
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+
+from models import CharacterStats
+from game_logic import apply_level_up
+import profile_cache
+
+# Counters that are only ever changed through this module
+STAT_COLUMNS = (
+    "level", "xp", "focus", "discipline", "energy", "willpower",
+    "attack_power", "defense", "health", "max_health",
+    "gold", "diamond", "bronze", "skill_points",
+)
+
+
+def snapshot(stats: CharacterStats) -> dict:
+    """Current in-memory stat values, to diff against with commit_stat_changes."""
+    return {column: getattr(stats, column) or 0 for column in STAT_COLUMNS}
+
+
+def _load_returned(stats: CharacterStats, row) -> None:
+    for column, value in zip(STAT_COLUMNS, row):
+        set_committed_value(stats, column, value)
+
+
+def apply_stat_deltas(db: Session, stats: CharacterStats, deltas: dict, *guards, assign: dict = None) -> bool:
+    """
+    Add `deltas` (column -> amount) to the stats row in one UPDATE, if every guard holds.
+    Results are floored at 0. `assign` sets columns to SQL expressions evaluated on the
+    row's current values (e.g. health=CharacterStats.max_health).
+    On success `stats` holds the row's new values; returns False, writing nothing,
+    when a guard fails.
+    """
+    if stats.id is None:
+        db.flush()
+
+    values = {}
+    for column, delta in deltas.items():
+        if not delta:
+            continue
+        new_value = func.coalesce(getattr(CharacterStats, column), 0) + delta
+        values[column] = case((new_value < 0, 0), else_=new_value) if delta < 0 else new_value
+    values.update(assign or {})
+
+    if not values and not guards:
+        return True
+
+    returned = [getattr(CharacterStats, column) for column in STAT_COLUMNS]
+    if not values:
+        row = db.execute(select(*returned).where(CharacterStats.id == stats.id, *guards)).first()
+    else:
+        stmt = (
+            update(CharacterStats)
+            .where(CharacterStats.id == stats.id, *guards)
+            .values(values)
+            .execution_options(synchronize_session=False)
+        )
+        if db.get_bind().dialect.update_returning:
+            row = db.execute(stmt.returning(*returned)).first()
+        else:
+            result = db.execute(stmt)
+            row = db.execute(select(*returned).where(CharacterStats.id == stats.id)).first() if result.rowcount else None
+
+    if row is None:
+        return False
+    _load_returned(stats, row)
+    if values:
+        profile_cache.touch(db, stats.user_id)
+    return True
+
+
+def commit_stat_changes(db: Session, stats: CharacterStats, before: dict, *guards, assign: dict = None) -> bool:
+    """
+    Write the in-memory changes made to `stats` since `before` (see snapshot) as
+    relative deltas, so game logic can keep mutating the ORM object directly.
+    The pending absolute values are discarded rather than flushed.
+    Returns False, with `stats` restored to `before`, when a guard fails.
+    """
+    deltas = {}
+    for column in STAT_COLUMNS:
+        current = getattr(stats, column) or 0
+        if current != before[column]:
+            if not (assign and column in assign):
+                deltas[column] = current - before[column]
+            set_committed_value(stats, column, before[column])
+    return apply_stat_deltas(db, stats, deltas, *guards, assign=assign)
+
+
+def spend_resources(db: Session, stats: CharacterStats, cost: dict) -> bool:
+    """Deduct a {"bronze", "gold", "diamond"} cost only if the user can afford all of it."""
+    return apply_stat_deltas(
+        db, stats,
+        {resource: -amount for resource, amount in cost.items()},
+        *(func.coalesce(getattr(CharacterStats, resource), 0) >= amount for resource, amount in cost.items())
+    )
+
+
+def level_up(db: Session, stats: CharacterStats) -> tuple[int, str]:
+    """
+    Apply every level up the row's XP pays for (game_logic.apply_level_up) in one UPDATE.
+    Guarded on the level and XP it started from, so of two concurrent requests only one
+    spends the same XP; the other gets 0 and `stats` reloaded as the row now stands.
+    Call after the XP itself has been written. Returns (levels_gained, message).
+    """
+    before = snapshot(stats)
+    levels, message = apply_level_up(stats)
+    if not levels:
+        return 0, ""
+    spent = before["xp"] - stats.xp
+    if not commit_stat_changes(
+        db, stats, before,
+        CharacterStats.level == before["level"],
+        func.coalesce(CharacterStats.xp, 0) >= spent,
+        assign={"health": CharacterStats.max_health + 10 * (levels - 1)}
+    ):
+        db.refresh(stats)
+        return 0, ""
+    return levels, message
@@ -1,10 +1,15 @@
 import pytest
+from datetime import date, datetime, time, timedelta
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 from fastapi.testclient import TestClient
 
 from main import app
+import quest_engine
+import reference_data
+import profile_cache
+import analytics
 from database import get_db
 from models import User, CharacterStats, QuestDefinition, QuestType, QuestStatus, Base
 
@@ -22,6 +27,11 @@ TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engin
 def db_session():
     """Create a fresh database for each test function."""
     Base.metadata.create_all(bind=engine)
+    # Process caches of seed data belong to the previous database
+    quest_engine.clear_definition_cache()
+    reference_data.invalidate()
+    profile_cache.clear()
+    analytics.clear_cache()
     session = TestingSessionLocal()
     try:
         yield session
@@ -54,3 +64,14 @@ def test_user(db_session):
     db_session.add(stats)
     db_session.commit()
     return user
+
+def recent_morning(days_ago: int = 1) -> datetime:
+    """09:00 a few days back: inside the usage log retention window, so syncs accept it."""
+    return datetime.combine(date.today() - timedelta(days=days_ago), time(9, 0))
+
+class Rule:
+    """Stand-in for a DetoxRule row, for the rule engines that only read these attributes."""
+    def __init__(self, app_package_name, daily_limit_minutes=None, is_blocked=False):
+        self.app_package_name = app_package_name
+        self.daily_limit_minutes = daily_limit_minutes
+        self.is_blocked = is_blocked
@@ -1,6 +1,8 @@
 import pytest
 from datetime import datetime, timedelta
 
+from tests.conftest import recent_morning
+
 def test_sync_usage_focus(client, test_user):
     """Test syncing usage with 0 distraction."""
     user_id = test_user.id
@@ -65,3 +67,578 @@ def test_quest_flow(client, test_user):
     response = client.get(f"/user/profile/{user_id}")
     profile = response.json()
     assert profile["stats"]["gold"] >= 10 # Reward
+
+def test_sync_reports_rule_xp_without_applying_it(client, test_user, db_session):
+    """Test that rule-based XP is reported by a sync but, as before, not added to the hero."""
+    from game_logic import XP_NO_RULE
+
+    test_user.stats.attack_power = 0  # The boss survives, so no boss XP either
+    db_session.commit()
+    user_id = test_user.id
+    start = recent_morning()
+    log = {
+        "app_package_name": "com.example.reader",
+        "start_time": start.isoformat(),
+        "end_time": (start + timedelta(minutes=5)).isoformat(),
+        "duration_seconds": 300,
+    }
+
+    data = client.post(f"/sync/usage/{user_id}", json=[log]).json()
+    assert data["xp_gained"] == XP_NO_RULE
+    assert data["new_stats"]["xp"] == 0
+
+def test_sync_uses_current_rules(client, test_user, db_session):
+    """Test that a rule edited in place (same rule count) applies from the next sync."""
+    from game_logic import XP_OVER_LIMIT, XP_WITHIN_LIMIT
+    from models import DetoxRule
+
+    test_user.stats.attack_power = 0  # The boss survives, so only rule XP is reported
+    db_session.commit()
+    user_id = test_user.id
+    client.post(f"/rules/{user_id}", json={"app_package_name": "com.example.game", "daily_limit_minutes": 30})
+
+    def sync(start):
+        log = {
+            "app_package_name": "com.example.game",
+            "start_time": start.isoformat(),
+            "end_time": (start + timedelta(minutes=5)).isoformat(),
+            "duration_seconds": 300,
+        }
+        return client.post(f"/sync/usage/{user_id}", json=[log]).json()
+
+    start = recent_morning()
+    assert sync(start)["xp_gained"] == XP_WITHIN_LIMIT
+
+    db_session.query(DetoxRule).filter(DetoxRule.user_id == user_id).update({"daily_limit_minutes": 1})
+    db_session.commit()
+    assert sync(start + timedelta(minutes=10))["xp_gained"] == XP_OVER_LIMIT
+
+def test_sync_usage_stores_logs(client, test_user, db_session):
+    """Test that every uploaded log is persisted by the bulk ingest path."""
+    from models import UsageLog
+
+    user_id = test_user.id
+    start = recent_morning()
+    logs = [
+        {
+            "app_package_name": f"com.app{i}",
+            "start_time": (start + timedelta(minutes=i)).isoformat(),
+            "end_time": (start + timedelta(minutes=i + 1)).isoformat(),
+            "duration_seconds": 60,
+        }
+        for i in range(25)
+    ]
+
+    response = client.post(f"/sync/usage/{user_id}", json=logs)
+    assert response.status_code == 200
+
+    stored = db_session.query(UsageLog).filter(UsageLog.user_id == user_id).all()
+    assert len(stored) == 25
+    assert {log.app_package_name for log in stored} == {f"com.app{i}" for i in range(25)}
+
+def test_sync_usage_retry_is_idempotent(client, test_user, db_session):
+    """Test that a retried sync neither re-inserts logs nor re-awards XP."""
+    from models import UsageLog
+
+    user_id = test_user.id
+    start = recent_morning()
+    log = {
+        "app_package_name": "com.instagram.android",
+        "start_time": start.isoformat(),
+        "end_time": (start + timedelta(minutes=10)).isoformat(),
+        "duration_seconds": 600,
+    }
+
+    # Duplicates inside one upload are collapsed too
+    first = client.post(f"/sync/usage/{user_id}", json=[log, log])
+    assert first.status_code == 200
+    assert db_session.query(UsageLog).count() == 1
+
+    retry = client.post(f"/sync/usage/{user_id}", json=[log])
+    assert retry.status_code == 200
+    data = retry.json()
+    assert data["xp_gained"] == 0
+    assert data["battle"] is None
+    assert data["new_stats"] == first.json()["new_stats"]
+    assert db_session.query(UsageLog).count() == 1
+
+def test_sync_usage_loads_state_eagerly(client, test_user, db_session):
+    """Test that a sync does not lazy-load the user graph row by row."""
+    from sqlalchemy import event
+
+    user_id = test_user.id
+    test_user.stats.attack_power = 0  # Keep today's boss alive between syncs
+    db_session.commit()
+    client.get(f"/quests/{user_id}")  # Seed quests (with definitions)
+    client.post(f"/sync/usage/{user_id}", json=[])  # Create today's boss
+
+    statements = []
+    def count_selects(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append(statement)
+
+    bind = db_session.get_bind()
+    event.listen(bind, "before_cursor_execute", count_selects)
+    try:
+        response = client.post(f"/sync/usage/{user_id}", json=[])
+    finally:
+        event.remove(bind, "before_cursor_execute", count_selects)
+
+    assert response.status_code == 200
+    # user+stats+city, rules, quests+definitions, boss
+    assert len(statements) <= 4
+
+def test_buy_building(client, test_user, db_session):
+    """Test buying a building deducts its cost."""
+    user_id = test_user.id
+    test_user.stats.bronze = 500
+    test_user.stats.gold = 100
+    db_session.commit()
+
+    response = client.post(f"/city/buy/{user_id}/mine")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["success"] is True
+    assert data["new_stats"]["bronze"] == 200
+    assert data["new_stats"]["gold"] == 50
+
+    response = client.post(f"/city/buy/{user_id}/mine")
+    assert response.status_code == 400
+
+def test_daily_usage_rollup(client, test_user, db_session):
+    """Test that syncs roll usage up per app and day, and daily limits use the day total."""
+    user_id = test_user.id
+    client.post(f"/rules/{user_id}", json={"app_package_name": "com.instagram.android", "daily_limit_minutes": 30})
+
+    day = recent_morning()
+    def session(start, minutes):
+        return {
+            "app_package_name": "com.instagram.android",
+            "start_time": start.isoformat(),
+            "end_time": (start + timedelta(minutes=minutes)).isoformat(),
+            "duration_seconds": minutes * 60,
+        }
+
+    # 20 minutes: within the 30 minute limit
+    first = client.post(f"/sync/usage/{user_id}", json=[session(day, 20)])
+    assert "Good job!" in first.json()["insight"]
+
+    # Another 20 minutes the same day: 40 minutes total, over the limit
+    second = client.post(f"/sync/usage/{user_id}", json=[session(day + timedelta(hours=3), 20)])
+    assert "Limit exceeded" in second.json()["insight"]
+
+    response = client.get(f"/stats/daily/{user_id}", params={"day": day.date().isoformat()})
+    assert response.status_code == 200
+    assert response.json() == [{
+        "app_package_name": "com.instagram.android",
+        "day": day.date().isoformat(),
+        "total_seconds": 40 * 60,
+        "session_count": 2,
+    }]
+
+def test_sync_usage_stream_matches_sync(client, test_user, db_session, monkeypatch):
+    """Test that a chunked NDJSON backfill gives the same result as one JSON upload."""
+    import json
+    import main
+    from models import User, CharacterStats, UsageLog
+
+    monkeypatch.setattr(main, "STREAM_BATCH_SIZE", 64)
+    other = User(username="Other Hero", email="other@hero.com")
+    db_session.add(other)
+    db_session.flush()
+    db_session.add(CharacterStats(user_id=other.id, attack_power=0))
+    test_user.stats.attack_power = 0  # Keep the random boss out of the XP totals
+    db_session.commit()
+    user_id, other_id = test_user.id, other.id
+
+    for uid in (user_id, other_id):
+        client.post(f"/rules/{uid}", json={"app_package_name": "com.app0", "daily_limit_minutes": 60, "is_blocked": True})
+        client.post(f"/rules/{uid}", json={"app_package_name": "com.app1", "daily_limit_minutes": 600})
+
+    start = recent_morning()
+    logs = [
+        {
+            "app_package_name": f"com.app{i % 3}",
+            "start_time": (start + timedelta(minutes=10 * i)).isoformat(),
+            "end_time": (start + timedelta(minutes=10 * i + 5)).isoformat(),
+            "duration_seconds": 300,
+        }
+        for i in range(300)  # Spans three days
+    ]
+    body = "".join(json.dumps(log) + "\n" for log in logs).encode()
+    chunks = (body[i:i + 1000] for i in range(0, len(body), 1000))  # Lines split across chunks
+
+    streamed = client.post(f"/sync/usage/{user_id}/stream", content=chunks,
+                           headers={"Content-Type": "application/x-ndjson"})
+    buffered = client.post(f"/sync/usage/{other_id}", json=logs)
+    assert streamed.status_code == 200
+    assert db_session.query(UsageLog).filter(UsageLog.user_id == user_id).count() == 300
+
+    streamed, buffered = streamed.json(), buffered.json()
+    assert streamed["xp_gained"] == buffered["xp_gained"]
+    assert streamed["battle"]["boss_damage_dealt"] == buffered["battle"]["boss_damage_dealt"]
+    assert streamed["insight"].split(" | ")[1] == buffered["insight"].split(" | ")[1]
+
+    retry = client.post(f"/sync/usage/{user_id}/stream", content=body)
+    assert retry.json()["insight"] == "Already synced."
+
+def test_sync_usage_stream_rejects_bad_line(client, test_user, db_session):
+    """Test that an invalid NDJSON line fails the upload and stores nothing."""
+    from models import UsageLog
+
+    user_id = test_user.id
+    body = b'{"app_package_name": "com.app", "start_time": "2024-01-01T09:00:00", "end_time": "2024-01-01T09:01:00", "duration_seconds": 60}\n{"oops": 1}\n'
+    response = client.post(f"/sync/usage/{user_id}/stream", content=body)
+    assert response.status_code == 422
+    assert response.json()["detail"]["line"] == 2
+    assert db_session.query(UsageLog).count() == 0
+
+def test_sync_usage_msgpack(client, test_user, db_session):
+    """Test the MessagePack wire format: same stored logs, binary response on request."""
+    import msgpack
+    import wire
+    from models import UsageLog
+    from schemas import UsageLogCreate
+
+    user_id = test_user.id
+    start = recent_morning()
+    logs = [
+        UsageLogCreate(
+            app_package_name=f"com.app{i % 2}",
+            start_time=start + timedelta(minutes=10 * i),
+            end_time=start + timedelta(minutes=10 * i + 5),
+            duration_seconds=300
+        )
+        for i in range(10)
+    ]
+    body = wire.encode_msgpack_logs(logs)
+    json_body = "[" + ",".join(log.model_dump_json() for log in logs) + "]"
+    assert len(body) < len(json_body) / 3
+
+    response = client.post(f"/sync/usage/{user_id}", content=body, headers={
+        "Content-Type": wire.MSGPACK_MEDIA_TYPE,
+        "Accept": wire.MSGPACK_MEDIA_TYPE,
+    })
+    assert response.status_code == 200
+    assert response.headers["content-type"] == wire.MSGPACK_MEDIA_TYPE
+    data = msgpack.unpackb(response.content)
+    assert data["new_stats"]["level"] >= 1
+    assert "battle" in data
+
+    stored = db_session.query(UsageLog).order_by(UsageLog.start_time).all()
+    assert [(log.app_package_name, log.start_time) for log in stored] == \
+        [(log.app_package_name, log.start_time) for log in logs]
+
+    # The same logs uploaded as JSON are recognized as already synced
+    retry = client.post(f"/sync/usage/{user_id}", content=json_body, headers={"Content-Type": "application/json"})
+    assert retry.json()["insight"] == "Already synced."
+
+def test_sync_usage_rejects_unknown_payload(client, test_user):
+    user_id = test_user.id
+    assert client.post(f"/sync/usage/{user_id}", content=b"\xc1", headers={"Content-Type": "application/x-msgpack"}).status_code == 400
+    assert client.post(f"/sync/usage/{user_id}", content=b"[]", headers={"Content-Type": "text/csv"}).status_code == 415
+
+def test_sync_usage_rejects_bad_package_index(client, test_user):
+    """Test that a MessagePack log pointing outside the package table is rejected, negative indices included."""
+    import msgpack
+
+    user_id = test_user.id
+    for index in (-1, 1):
+        body = msgpack.packb({"packages": ["com.example.app"], "logs": [[index, 1700000000, 1700000060, 60]]})
+        response = client.post(f"/sync/usage/{user_id}", content=body, headers={"Content-Type": "application/x-msgpack"})
+        assert response.status_code == 400
+
+def test_boss_poll_is_cached(client, test_user, db_session):
+    """Test that polling today's boss is served from the cache until it changes."""
+    from sqlalchemy import event
+
+    user_id = test_user.id
+    first = client.get(f"/game/boss/{user_id}").json()
+
+    statements = []
+    def count_statements(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    bind = db_session.get_bind()
+    event.listen(bind, "before_cursor_execute", count_statements)
+    try:
+        assert client.get(f"/game/boss/{user_id}").json() == first
+    finally:
+        event.remove(bind, "before_cursor_execute", count_statements)
+    assert statements == []
+
+    # A sync updates the cached copy
+    synced = client.post(f"/sync/usage/{user_id}", json=[]).json()
+    polled = client.get(f"/game/boss/{user_id}").json()
+    if synced["battle"]["boss_defeated"]:
+        assert polled["id"] != first["id"]  # Replaced by a fresh boss
+    else:
+        assert polled["current_hp"] == synced["battle"]["boss_hp_remaining"]
+
+    # Resetting drops the cached boss
+    reset = client.post(f"/debug/reset_boss/{user_id}").json()
+    assert client.get(f"/game/boss/{user_id}").json()["id"] == reset["boss"]["id"]
+
+def test_admin_grant_uses_xp_curve(client, test_user):
+    """Test that granted XP resolves through the shared curve, several levels at once."""
+    from game_logic import resolve_level
+
+    user_id = test_user.id
+    response = client.post(f"/admin/api/users/{user_id}/grant", params={"xp": 5000, "gold": 0})
+    assert response.status_code == 200
+    stats = response.json()["new_stats"]
+
+    level, xp = resolve_level(1, 5000)
+    assert level > 2
+    assert (stats["level"], stats["xp"]) == (level, xp)
+    assert stats["gold"] == 150 * (level - 1)
+
+def test_reference_data_etags(client, db_session):
+    """Test that reference data revalidates with 304 without querying, until invalidated."""
+    from sqlalchemy import event
+    import reference_data
+    from models import HeroClass
+
+    db_session.add(HeroClass(name="Night Owl", bonus_type="NIGHT_OWL"))
+    db_session.commit()
+
+    first = client.get("/classes")
+    assert first.status_code == 200
+    assert [c["name"] for c in first.json()] == ["Night Owl"]
+    etag = first.headers["etag"]
+    assert first.headers["cache-control"] == reference_data.CACHE_CONTROL
+
+    statements = []
+    def count_statements(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    bind = db_session.get_bind()
+    event.listen(bind, "before_cursor_execute", count_statements)
+    try:
+        cached = client.get("/classes", headers={"If-None-Match": etag})
+    finally:
+        event.remove(bind, "before_cursor_execute", count_statements)
+    assert cached.status_code == 304
+    assert cached.headers["etag"] == etag
+    assert statements == []
+
+    # Seed data changes show up after invalidation, under a new ETag
+    db_session.add(HeroClass(name="Balanced", bonus_type="BALANCED"))
+    db_session.commit()
+    reference_data.invalidate("classes")
+    changed = client.get("/classes", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+    assert len(changed.json()) == 2
+
+def test_quest_definitions_and_costs(client, test_user):
+    """Test that seeding quests refreshes the cached definitions list."""
+    user_id = test_user.id
+    assert client.get("/quests/definitions").json() == []
+    client.get(f"/quests/{user_id}")  # Seeds the default quests
+    assert {d["code"] for d in client.get("/quests/definitions").json()} == {"DAILY_SYNC", "BOSS_SLAYER", "FOCUS_MASTER"}
+
+    costs = client.get("/city/costs")
+    assert costs.json()["mine"] == {"bronze": 300, "gold": 50, "diamond": 0}
+    assert client.get("/city/costs", headers={"If-None-Match": costs.headers["etag"]}).status_code == 304
+
+def test_profile_is_cached_and_read_only(client, test_user, db_session):
+    """Test that profile polls write nothing, revalidate with 304, and change after a sync."""
+    from sqlalchemy import event
+
+    user_id = test_user.id
+    first = client.get(f"/user/profile/{user_id}")
+    assert first.status_code == 200
+    assert first.json()["city_state"] is None  # Not created by a GET
+    etag = first.headers["etag"]
+
+    statements = []
+    def count_statements(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    bind = db_session.get_bind()
+    event.listen(bind, "before_cursor_execute", count_statements)
+    try:
+        again = client.get(f"/user/profile/{user_id}")
+        revalidated = client.get(f"/user/profile/{user_id}", headers={"If-None-Match": etag})
+    finally:
+        event.remove(bind, "before_cursor_execute", count_statements)
+    assert again.content == first.content
+    assert revalidated.status_code == 304
+    assert len(statements) == 2  # One version lookup per request
+    assert all(s.lstrip().upper().startswith("SELECT") for s in statements)
+
+    # A sync changes the stats (set-based UPDATE), so the version and ETag move on
+    client.post(f"/sync/usage/{user_id}", json=[])
+    changed = client.get(f"/user/profile/{user_id}", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+
+    # So does a row added through the ORM
+    client.post(f"/rules/{user_id}", json={"app_package_name": "com.example.game", "daily_limit_minutes": 30})
+    with_rule = client.get(f"/user/profile/{user_id}", headers={"If-None-Match": changed.headers["etag"]})
+    assert with_rule.status_code == 200
+    assert [r["app_package_name"] for r in with_rule.json()["rules"]] == ["com.example.game"]
+
+    assert client.get("/user/profile/missing-user").status_code == 404
+
+def test_onboard_creates_profile(client):
+    """Test that onboarding creates everything the profile shows, with starting resources."""
+    from game_loop import STARTING_BRONZE, STARTING_GOLD
+
+    user = client.post("/user/onboard", json={"username": "New Hero", "email": "new@hero.com"}).json()
+    profile = client.get(f"/user/profile/{user['id']}").json()
+    assert profile["city_state"] is not None
+    assert (profile["stats"]["bronze"], profile["stats"]["gold"]) == (STARTING_BRONZE, STARTING_GOLD)
+    assert client.get(f"/game/boss/{user['id']}").status_code == 200
+
+def test_admin_users_keyset_pages(client, db_session):
+    """Test that the admin listing pages through every user once, filtered and sorted server-side."""
+    from sqlalchemy import event, text
+    from models import User, CharacterStats, HeroClass
+    from pagination import ordering, seek
+    from routers.admin import _USER_SORTS, _user_listing
+
+    monk = HeroClass(name="Techno Monk", bonus_type="BALANCED")
+    db_session.add(monk)
+    db_session.flush()
+    for i in range(7):
+        user = User(username=f"Hero {i}", email=f"hero{i}@hero.com")
+        db_session.add(user)
+        db_session.flush()
+        db_session.add(CharacterStats(user_id=user.id, level=i % 3 + 1, class_id=monk.id if i % 2 else None))
+    db_session.commit()
+
+    statements = []
+    def count_statements(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    bind = db_session.get_bind()
+    event.listen(bind, "before_cursor_execute", count_statements)
+    try:
+        first = client.get("/admin/api/users", params={"limit": 3, "sort": "level", "order": "asc"}).json()
+    finally:
+        event.remove(bind, "before_cursor_execute", count_statements)
+    assert len(statements) == 2  # The page and the count, whatever the page size
+    assert first["total"] == 7
+
+    seen, page = [], first
+    while True:
+        seen += page["users"]
+        if not page["next_cursor"]:
+            break
+        page = client.get("/admin/api/users", params={"limit": 3, "sort": "level", "order": "asc",
+                                                      "cursor": page["next_cursor"]}).json()
+        assert page["total"] is None
+    assert len({u["id"] for u in seen}) == 7
+    assert [u["level"] for u in seen] == sorted(u["level"] for u in seen)
+
+    monks = client.get("/admin/api/users", params={"class_name": "Techno Monk", "min_level": 2}).json()
+    assert monks["total"] == len(monks["users"]) == 2
+    assert {u["class"] for u in monks["users"]} == {"Techno Monk"}
+
+    # Level pages walk ix_character_stats_level_user instead of sorting every user
+    key = _USER_SORTS["level"]
+    query = _user_listing(User.id).where(seek(key, _user_listing(*key).where(User.id == seen[3]["id"]))) \
+        .order_by(*ordering(key)).limit(3)
+    sql = query.compile(bind, compile_kwargs={"literal_binds": True})
+    plan = [row[-1] for row in db_session.execute(text(f"EXPLAIN QUERY PLAN {sql}")).all()]
+    assert any("ix_character_stats_level_user" in step for step in plan)
+    assert not any("TEMP B-TREE" in step for step in plan)
+
+def test_admin_inspector_pages(client, test_user, db_session):
+    """Test that the inspector reads recent logs and bosses newest first, in bounded pages."""
+    from sqlalchemy import text
+    from models import UsageLog, BossEnemy
+
+    user_id = test_user.id
+    start = datetime(2024, 1, 1, 8, 0, 0)
+    db_session.add_all([
+        UsageLog(user_id=user_id, app_package_name=f"com.example.app{i}", start_time=start + timedelta(hours=i),
+                 end_time=start + timedelta(hours=i, minutes=5), duration_seconds=300)
+        for i in range(12)
+    ])
+    db_session.add_all([
+        BossEnemy(user_id=user_id, date=start + timedelta(days=i), name=f"Boss {i}", total_hp=100, current_hp=100)
+        for i in range(3)
+    ])
+    db_session.commit()
+
+    details = client.get(f"/admin/api/users/{user_id}").json()
+    assert [log["app_package_name"] for log in details["logs"]["items"]] == [f"com.example.app{i}" for i in (11, 10, 9, 8, 7)]
+    assert [boss["name"] for boss in details["bosses"]["items"]] == ["Boss 2", "Boss 1", "Boss 0"]
+    assert details["bosses"]["next_cursor"] is None
+
+    seen, cursor = [], details["logs"]["next_cursor"]
+    while cursor:
+        page = client.get(f"/admin/api/users/{user_id}/logs", params={"cursor": cursor, "limit": 5}).json()
+        seen += [log["app_package_name"] for log in page["items"]]
+        cursor = page["next_cursor"]
+    assert seen == [f"com.example.app{i}" for i in range(6, -1, -1)]
+
+    plan = db_session.execute(text(
+        "EXPLAIN QUERY PLAN SELECT id FROM usage_logs WHERE user_id = :u ORDER BY start_time DESC LIMIT 5"
+    ), {"u": user_id}).all()
+    assert any("ix_usage_logs_user_start" in row[-1] for row in plan)
+
+def test_admin_inspector_boss_and_quest_pages(client, test_user, db_session):
+    """Test that bosses and quests page newest first, and a cursor only resolves within its user."""
+    from models import User, BossEnemy, QuestDefinition, UserQuest
+
+    other = User(username="Other Hero", email="other@hero.com")
+    definition = QuestDefinition(code="PAGE_TEST", title="Page Test", description="", target_progress=1)
+    db_session.add_all([other, definition])
+    db_session.flush()
+    user_id, other_id = test_user.id, other.id
+    start = datetime(2024, 1, 1, 8, 0, 0)
+    db_session.add_all([
+        BossEnemy(user_id=user_id, date=start + timedelta(days=i), name=f"Boss {i}", total_hp=100, current_hp=100)
+        for i in range(5)
+    ] + [
+        UserQuest(user_id=user_id, quest_def_id=definition.id, current_progress=i, created_at=start + timedelta(days=i))
+        for i in range(5)
+    ])
+    other_boss = BossEnemy(user_id=other_id, date=start + timedelta(days=10), name="Other Boss", total_hp=100, current_hp=100)
+    db_session.add(other_boss)
+    db_session.commit()
+    other_boss_id = other_boss.id
+
+    def read_all(collection, field):
+        seen, params = [], {"limit": 2}
+        while True:
+            page = client.get(f"/admin/api/users/{user_id}/{collection}", params=params).json()
+            seen += [item[field] for item in page["items"]]
+            if page["next_cursor"] is None:
+                return seen
+            params["cursor"] = page["next_cursor"]
+
+    assert read_all("bosses", "name") == [f"Boss {i}" for i in range(4, -1, -1)]
+    assert read_all("quests", "current_progress") == [4, 3, 2, 1, 0]
+
+    foreign = client.get(f"/admin/api/users/{user_id}/bosses", params={"cursor": other_boss_id}).json()
+    assert foreign == {"items": [], "next_cursor": None}
+
+def test_admin_analytics(client, test_user, db_session):
+    """Test that the dashboard aggregates come back grouped per level and per day."""
+    from datetime import date
+    from models import BossEnemy, DailyAppUsage, DetoxRule
+
+    user_id = test_user.id
+    today = date.today()
+    midnight = datetime.combine(today, datetime.min.time())
+    db_session.add_all([
+        DetoxRule(user_id=user_id, app_package_name="com.example.game", is_blocked=True),
+        DailyAppUsage(user_id=user_id, day=today, app_package_name="com.example.game", total_seconds=1800, session_count=2),
+        DailyAppUsage(user_id=user_id, day=today, app_package_name="com.example.reader", total_seconds=600, session_count=1),
+        BossEnemy(user_id=user_id, date=midnight, name="Boss A", total_hp=100, current_hp=0, is_defeated=True),
+        BossEnemy(user_id=user_id, date=midnight + timedelta(hours=1), name="Boss B", total_hp=100, current_hp=100),
+    ])
+    db_session.commit()
+
+    def rows(report, **params):
+        response = client.get(f"/admin/api/analytics/{report}", params=params)
+        assert response.status_code == 200
+        return response.json()["rows"]
+
+    assert rows("levels") == [{"level": 1, "users": 1}]
+    assert rows("daily_active", days=7) == [{"day": today.isoformat(), "users": 1}]
+    assert rows("boss_kill_rate") == [{"day": today.isoformat(), "bosses": 2, "defeated": 1, "kill_rate": 0.5}]
+    assert rows("blocked_minutes") == [{"day": today.isoformat(), "total_minutes": 30.0, "users": 1, "avg_minutes": 30.0}]
+    assert client.get("/admin/api/analytics/unknown").status_code == 422
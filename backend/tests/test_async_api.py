@@ -0,0 +1,80 @@
+import pytest
+from datetime import datetime, timedelta
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from database import get_async_db, to_async_url
+from models import Base, User, CharacterStats, UsageLog
+from routers import game_async
+from tests.conftest import recent_morning
+
+@pytest.fixture(scope="function")
+def async_client(tmp_path):
+    """Async router served from a file-backed SQLite database through aiosqlite."""
+    db_file = tmp_path / "async_test.db"
+    sync_engine = create_engine(f"sqlite:///{db_file}")
+    Base.metadata.create_all(bind=sync_engine)
+
+    # Seed a user through the sync stack
+    SyncSession = sessionmaker(bind=sync_engine)
+    with SyncSession() as session:
+        user = User(username="Async Hero", email="async@hero.com")
+        session.add(user)
+        session.commit()
+        session.add(CharacterStats(user_id=user.id, attack_power=10))
+        session.commit()
+        user_id = user.id
+
+    # NullPool: every request opens its connection on the TestClient's event loop
+    async_engine = create_async_engine(to_async_url(f"sqlite:///{db_file}"), poolclass=NullPool)
+    AsyncTestingSession = async_sessionmaker(bind=async_engine)
+
+    async def override_get_async_db():
+        async with AsyncTestingSession() as db:
+            yield db
+
+    app = FastAPI()
+    app.include_router(game_async.router)
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    yield TestClient(app), user_id, SyncSession
+    sync_engine.dispose()
+
+def test_to_async_url():
+    assert to_async_url("sqlite:///./sql_app.db") == "sqlite+aiosqlite:///./sql_app.db"
+    assert to_async_url("postgresql://user:pw@db:5432/idlehero") == "postgresql+asyncpg://user:pw@db:5432/idlehero"
+
+def test_async_game_loop(async_client):
+    """Test sync, boss and profile through the async endpoints."""
+    client, user_id, SyncSession = async_client
+    start = recent_morning()
+    logs = [{
+        "app_package_name": "com.example.reader",
+        "start_time": start.isoformat(),
+        "end_time": (start + timedelta(minutes=5)).isoformat(),
+        "duration_seconds": 300,
+    }]
+
+    response = client.post(f"/sync/usage/{user_id}", json=logs)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["battle"]["player_damage_dealt"] > 0
+
+    response = client.get(f"/game/boss/{user_id}")
+    assert response.status_code == 200
+    assert response.json()["total_hp"] > 0
+
+    response = client.get(f"/user/profile/{user_id}")
+    assert response.status_code == 200
+    assert response.json()["stats"]["level"] >= 1
+
+    with SyncSession() as session:
+        assert session.query(UsageLog).filter(UsageLog.user_id == user_id).count() == 1
+
+def test_async_unknown_user(async_client):
+    client, _, _ = async_client
+    response = client.get("/game/boss/missing-user")
+    assert response.status_code == 404
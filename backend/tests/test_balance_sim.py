@@ -0,0 +1,35 @@
+import random
+
+from balance_sim import SimStats, METRICS, run_population, simulate_player, _build
+from game_logic import resolve_level
+
+def test_sim_stats_start_like_onboarding():
+    stats = SimStats()
+    assert (stats.level, stats.xp, stats.attack_power, stats.defense) == (1, 0, 5, 2)
+    assert stats.bronze == stats.gold == 1000
+
+def test_simulated_player_follows_xp_curve():
+    """Test that simulated heroes level along the real curve."""
+    checkpoints = simulate_player(random.Random(3), days=10, checkpoints=(1, 10))
+    assert len(checkpoints) == 2
+    level, xp = checkpoints[-1][0], checkpoints[-1][1]
+    assert level > 1
+    assert resolve_level(level, xp) == (level, xp)  # Nothing left unlevelled
+
+def test_build_buys_cheapest_first():
+    """Test that starting resources go to the cheapest buildings and upgrades, at real prices."""
+    stats = SimStats()
+    buildings = {}
+    _build(stats, buildings)
+    # Park (200 bronze), mine (300), park upgrade (300): 200 bronze left, short of anything else
+    assert buildings == {"park": 2, "mine": 1}
+    assert (stats.bronze, stats.gold) == (200, 1000 - 100 - 50 - 150)
+
+def test_population_report_is_reproducible():
+    first = run_population(users=30, days=8, workers=1, seed=7)
+    again = run_population(users=30, days=8, workers=1, seed=7)
+    assert first["checkpoints"] == again["checkpoints"]
+    assert list(first["checkpoints"]) == ["1", "7", "8"]
+    assert set(first["checkpoints"]["8"]) == set(METRICS)
+    median_level = first["checkpoints"]["8"]["level"]["p50"]
+    assert first["checkpoints"]["8"]["level"]["p5"] <= median_level <= first["checkpoints"]["8"]["level"]["p99"]
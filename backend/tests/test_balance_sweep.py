@@ -0,0 +1,48 @@
+import numpy as np
+
+import balance_sweep
+from balance_sweep import cumulative_xp, resolve_levels, building_costs, purchase, grid, run_sweep, SweepParams
+from balance_sim import SimStats, _build
+from game_logic import CUMULATIVE_XP, resolve_level, BUILDING_COSTS
+
+def test_curve_matches_game_logic():
+    """Test that the sweep's XP tables and level resolution are the game's for default parameters."""
+    table = cumulative_xp(100, 1.5)
+    assert table.tolist() == CUMULATIVE_XP
+    level = np.array([[1, 3, 10, 999]])
+    xp = np.array([[0, 5000, 123456, 10 ** 9]])
+    new_level, new_xp = resolve_levels(table[None], level, xp)
+    assert list(zip(new_level[0], new_xp[0])) == [resolve_level(l, x) for l, x in zip(level[0], xp[0])]
+
+def test_purchase_matches_reference():
+    """Test that vectorized purchases buy what balance_sim._build buys, and scale with cost_scale."""
+    stats, buildings = SimStats(), {}
+    _build(stats, buildings)
+
+    wallet = np.array([[[1000, 1000, 0]], [[1000, 1000, 0]]], dtype=np.int64)
+    levels = np.zeros((2, 1, len(balance_sweep.BUILDING_KINDS)), dtype=np.int64)
+    purchase(building_costs(np.array([1.0, 10.0])), wallet, levels)
+    assert dict(zip(balance_sweep.BUILDING_KINDS, levels[0, 0])) == {kind: buildings.get(kind, 0) for kind in BUILDING_COSTS}
+    assert tuple(wallet[0, 0]) == (stats.bronze, stats.gold, stats.diamond)
+    assert levels[1].sum() == 0  # Ten times the prices: nothing affordable
+
+def test_sweep_is_cached(tmp_path, monkeypatch):
+    """Test that results are memoized per parameter set and overlapping grids only compute new points."""
+    first, hits = run_sweep(grid(base_xp=(100, 200)), players=50, days=10, cache_dir=tmp_path)
+    assert hits == 0 and len(list(tmp_path.glob("*.npz"))) == 2
+
+    simulated = []
+    simulate_block = balance_sweep.simulate_block
+    monkeypatch.setattr(balance_sweep, "simulate_block", lambda params, *a: simulated.extend(params) or simulate_block(params, *a))
+    again, hits = run_sweep(grid(base_xp=(100, 200, 300)), players=50, days=10, cache_dir=tmp_path)
+    assert hits == 2 and simulated == [SweepParams(base_xp=300)]
+    assert again[:2] == first
+
+    # A steeper curve levels slower
+    assert again[0]["checkpoints"]["10"]["level"]["p50"] > again[2]["checkpoints"]["10"]["level"]["p50"]
+
+def test_cache_key_tracks_game_rules(monkeypatch):
+    """Test that changing a game rule the sweep reads invalidates its cached results."""
+    key = balance_sweep.cache_key(SweepParams(), players=50, days=10, seed=1)
+    monkeypatch.setattr(balance_sweep, "LEVEL_UP_GOLD", balance_sweep.LEVEL_UP_GOLD + 1)
+    assert balance_sweep.cache_key(SweepParams(), players=50, days=10, seed=1) != key
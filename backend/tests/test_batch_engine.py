@@ -0,0 +1,96 @@
+import random
+from collections import Counter
+import pytest
+import numpy as np
+from datetime import datetime, timedelta
+
+from batch_engine import encode_logs, encode_aggregates, batch_battle_outcome, batch_hybrid_rewards, grouped_totals
+from game_logic import RuleIndex, calculate_battle_outcome, calculate_hybrid_rewards
+from models import BossEnemy, CharacterStats
+from schemas import UsageLogCreate
+from tests.conftest import Rule
+
+PACKAGES = ["com.instagram.android", "com.reddit.frontpage", "com.tiktok", "com.kindle", "com.maps"]
+
+def _random_logs(rng, count):
+    start = datetime(2024, 1, 1, 8, 0, 0)
+    logs = []
+    for _ in range(count):
+        seconds = rng.randint(0, 3 * 3600)
+        logs.append(UsageLogCreate(
+            app_package_name=rng.choice(PACKAGES),
+            start_time=start,
+            end_time=start + timedelta(seconds=seconds),
+            duration_seconds=seconds
+        ))
+    return logs
+
+def _stats():
+    return CharacterStats(level=3, xp=0, health=100, max_health=120, attack_power=7, defense=2)
+
+def _boss():
+    return BossEnemy(name="Test Boss", total_hp=5000, current_hp=5000, damage_dealt_to_user=0, is_defeated=False)
+
+RULE_SETS = [
+    [],
+    [Rule("com.instagram.android", 30, True), Rule("com.tiktok", None, True)],
+    [Rule("com.reddit.frontpage", 10), Rule("com.reddit.frontpage", 500, True), Rule("com.kindle", 120)],
+]
+
+@pytest.mark.parametrize("rules", RULE_SETS)
+@pytest.mark.parametrize("count", [0, 1, 50, 1000])
+def test_batch_engine_matches_scalar(rules, count):
+    """Test that the vectorized engine gives the same results as the scalar reference."""
+    logs = _random_logs(random.Random(count), count)
+    index = RuleIndex(rules)
+    columns = encode_logs(logs)
+
+    scalar_stats, scalar_boss = _stats(), _boss()
+    batch_stats, batch_boss = _stats(), _boss()
+
+    assert batch_battle_outcome(batch_stats, columns, batch_boss, index) == \
+        calculate_battle_outcome(scalar_stats, logs, scalar_boss, rules)
+    assert (batch_stats.health, batch_boss.current_hp) == (scalar_stats.health, scalar_boss.current_hp)
+
+    assert batch_hybrid_rewards(batch_stats, columns, index) == \
+        calculate_hybrid_rewards(scalar_stats, logs, rules)
+
+def test_batch_engine_matches_scalar_with_daily_totals():
+    """Test both engines agree when limits are judged on rolled-up day totals."""
+    rng = random.Random(3)
+    logs = _random_logs(rng, 400)
+    daily_totals = {(package, logs[0].start_time.date()): rng.randint(0, 4 * 3600) for package in PACKAGES}
+    rules = RULE_SETS[2]
+
+    assert batch_hybrid_rewards(None, encode_logs(logs, daily_totals), RuleIndex(rules)) == \
+        calculate_hybrid_rewards(None, logs, rules, daily_totals)
+
+def test_grouped_totals():
+    """Test per-group totals against the scalar engine run group by group."""
+    rng = random.Random(7)
+    logs = _random_logs(rng, 600)
+    group_ids = np.array([rng.randrange(4) for _ in logs])
+    rules = RULE_SETS[1]
+    index = RuleIndex(rules)
+
+    xp, screen_seconds = grouped_totals(encode_logs(logs), index, group_ids, 4)
+
+    for group in range(4):
+        group_logs = [log for log, g in zip(logs, group_ids) if g == group]
+        assert xp[group] == calculate_hybrid_rewards(None, group_logs, rules)[0]
+        assert screen_seconds[group] == sum(log.duration_seconds for log in group_logs if log.app_package_name in index.blocked)
+
+def test_aggregates_match_logs():
+    """Test that per-(app, day) aggregates score the same as the logs they summarize."""
+    logs = _random_logs(random.Random(11), 500)
+    sessions, seconds = Counter(), Counter()
+    for log in logs:
+        key = (log.app_package_name, log.start_time.date())
+        sessions[key] += 1
+        seconds[key] += log.duration_seconds
+    daily_totals = dict(seconds)
+    index = RuleIndex(RULE_SETS[2])
+
+    by_log, by_key = encode_logs(logs, daily_totals), encode_aggregates(sessions, seconds, daily_totals)
+    assert batch_hybrid_rewards(None, by_key, index) == batch_hybrid_rewards(None, by_log, index)
+    assert batch_battle_outcome(_stats(), by_key, _boss(), index) == batch_battle_outcome(_stats(), by_log, _boss(), index)
@@ -0,0 +1,21 @@
+from bench_game_logic import CASES, compare, run_benchmarks, run_suite
+
+def test_benchmark_cases_run():
+    """Test that every case runs and reports a time per call and a normalized cost."""
+    results = run_benchmarks(repeats=1, target=0.001)
+    assert set(results["cases"]) == set(CASES)
+    assert all(case["us_per_call"] > 0 and case["calibration_us"] > 0 and case["normalized"] > 0
+               for case in results["cases"].values())
+
+def test_suite_takes_median_over_processes():
+    """Test that the suite runs in fresh processes and reports one median entry per selected case."""
+    results = run_suite(name_filter="upgrade_cost", processes=2, repeats=1, target=0.001)
+    assert set(results["cases"]) == {name for name in CASES if "upgrade_cost" in name}
+    assert all(case["normalized"] > 0 for case in results["cases"].values())
+
+def test_compare_flags_regressions_over_threshold():
+    """Test that only cases slower than baseline * (1 + threshold) are flagged, and new cases are skipped."""
+    baseline = {"cases": {"fast": {"normalized": 1.0}, "slow": {"normalized": 1.0}}}
+    results = {"cases": {"fast": {"normalized": 1.2}, "slow": {"normalized": 1.5}, "new": {"normalized": 9.0}}}
+    assert compare(results, baseline, threshold=0.25) == [("slow", 1.5)]
+    assert compare(results, baseline, threshold=0.1) == [("fast", 1.2), ("slow", 1.5)]
@@ -1,9 +1,14 @@
 import pytest
-from game_logic import calculate_battle_outcome, check_quests
-from models import QuestDefinition, UserQuest, QuestType, QuestStatus, BossEnemy, CharacterStats
+from game_logic import (
+    calculate_battle_outcome, check_quests, calculate_xp_required,
+    resolve_level, apply_level_up, expand_city
+)
+from models import QuestDefinition, UserQuest, QuestType, QuestStatus, BossEnemy, CharacterStats, CityState
 from schemas import UsageLogCreate
 from datetime import datetime, timedelta
 
+from tests.conftest import Rule
+
 @pytest.fixture
 def mock_boss(test_user):
     return BossEnemy(
@@ -89,3 +94,58 @@ def test_quest_fail_focus(test_user, db_session):
     
     assert u_quest.status == QuestStatus.IN_PROGRESS # Should NOT complete
     assert u_quest.current_progress == 0
+
+def _log(package, minutes):
+    now = datetime(2024, 1, 1, 12, 0, 0)
+    return UsageLogCreate(
+        app_package_name=package,
+        start_time=now,
+        end_time=now + timedelta(minutes=minutes),
+        duration_seconds=minutes * 60
+    )
+
+def test_rule_index_matches_rule_list(test_user):
+    """Test that the compiled index gives the same rewards as the raw rule list."""
+    from game_logic import RuleIndex, calculate_hybrid_rewards
+
+    rules = [
+        Rule("com.instagram.android", daily_limit_minutes=30, is_blocked=True),
+        Rule("com.instagram.android", daily_limit_minutes=999),  # Shadowed by the first rule
+        Rule("com.reddit.frontpage", daily_limit_minutes=10),
+        Rule("com.tiktok", is_blocked=True),  # Blocked without a limit
+    ]
+    logs = [_log("com.instagram.android", 45), _log("com.reddit.frontpage", 5), _log("com.tiktok", 20), _log("com.other", 60)]
+
+    index = RuleIndex(rules)
+    assert index.blocked == {"com.instagram.android", "com.tiktok"}
+    assert calculate_hybrid_rewards(test_user.stats, logs, index) == calculate_hybrid_rewards(test_user.stats, logs, rules)
+    assert calculate_hybrid_rewards(test_user.stats, logs, index) == (-10 + 20 + 20 + 5, "Limit exceeded! Lost XP.")
+
+def _step_level_up(level, xp):
+    """Reference: one level at a time with calculate_xp_required."""
+    while xp >= calculate_xp_required(level):
+        xp -= calculate_xp_required(level)
+        level += 1
+    return level, xp
+
+def test_resolve_level_matches_stepping():
+    for level, xp in [(1, 0), (1, 99), (1, 100), (1, 10_000), (7, 1_234_567), (50, 0), (3, 519)]:
+        assert resolve_level(level, xp) == _step_level_up(level, xp)
+
+def test_apply_level_up_multi_level():
+    """Test that a big XP grant catches up every level and pays each level's rewards."""
+    stats = CharacterStats(level=1, xp=100 + 282 + 50, health=20, max_health=100, attack_power=5, gold=0, diamond=0)
+    levels, message = apply_level_up(stats)
+
+    assert levels == 2
+    assert "x2" in message
+    assert (stats.level, stats.xp) == (3, 50)
+    assert (stats.max_health, stats.health) == (120, 110)
+    assert (stats.attack_power, stats.gold, stats.diamond) == (7, 300, 20)
+
+    assert apply_level_up(stats) == (0, "")
+
+def test_expand_city_rings():
+    city = CityState(level=3, unlocked_rings=1)
+    expand_city(city, 8)
+    assert (city.level, city.unlocked_rings) == (11, 3)
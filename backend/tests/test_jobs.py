@@ -0,0 +1,66 @@
+import random
+from datetime import date, datetime, timedelta
+
+from game_logic import get_todays_boss
+from jobs import pregenerate_bosses, reset_daily_quests, _seconds_until
+from models import User, CharacterStats, BossEnemy, QuestArchive, QuestDefinition, QuestType, QuestStatus, UserQuest
+
+def test_pregenerate_bosses(client, test_user, db_session):
+    """Test that active users get today's boss in one pass, once, and syncs use it."""
+    user_id = test_user.id
+    idle = User(username="Idle Hero", email="idle@hero.com")
+    db_session.add(idle)
+    db_session.flush()
+    db_session.add(CharacterStats(user_id=idle.id, level=4, last_sync_time=datetime.now() - timedelta(days=30)))
+    test_user.stats.level = 3
+    db_session.commit()
+    idle_id = idle.id
+
+    assert pregenerate_bosses(db_session, day=date.today(), rng=random.Random(1)) == 1
+    assert pregenerate_bosses(db_session, day=date.today()) == 0  # Already has one
+
+    boss = get_todays_boss(db_session, user_id)
+    assert boss is not None and 300 <= boss.total_hp <= 450
+    assert db_session.query(BossEnemy).filter(BossEnemy.user_id == idle_id).count() == 0
+    boss_name = boss.name
+
+    response = client.post(f"/sync/usage/{user_id}", json=[])
+    assert response.json()["battle"]["boss_name"] == boss_name
+
+def test_sync_marks_user_active(client, test_user, db_session):
+    user_id = test_user.id
+    test_user.stats.last_sync_time = datetime.now() - timedelta(days=30)
+    db_session.commit()
+
+    client.post(f"/sync/usage/{user_id}", json=[])
+    db_session.expire_all()
+    assert pregenerate_bosses(db_session) == 1  # Tomorrow's boss
+
+def test_seconds_until():
+    now = datetime(2024, 1, 1, 23, 0)
+    assert _seconds_until(datetime.min.time().replace(hour=23, minute=30), now) == 30 * 60
+    assert _seconds_until(datetime.min.time().replace(hour=22), now) == 23 * 3600
+
+def test_reset_daily_quests(test_user, db_session):
+    """Test that daily quests are archived and reset for everyone, other types untouched."""
+    daily = QuestDefinition(code="DAILY_SYNC", title="First Step", quest_type=QuestType.DAILY)
+    story = QuestDefinition(code="STORY_1", title="Prologue", quest_type=QuestType.STORY)
+    db_session.add_all([daily, story])
+    db_session.flush()
+    done = UserQuest(user_id=test_user.id, quest_def_id=daily.id, current_progress=1,
+                     status=QuestStatus.COMPLETED, completed_at=datetime(2024, 3, 1, 20, 0))
+    untouched = UserQuest(user_id=test_user.id, quest_def_id=daily.id, current_progress=0, status=QuestStatus.IN_PROGRESS)
+    story_quest = UserQuest(user_id=test_user.id, quest_def_id=story.id, current_progress=1, status=QuestStatus.COMPLETED)
+    db_session.add_all([done, untouched, story_quest])
+    db_session.commit()
+
+    assert reset_daily_quests(db_session, day=date(2024, 3, 1)) == 1
+    assert reset_daily_quests(db_session, day=date(2024, 3, 1)) == 0  # Nothing left to reset
+
+    db_session.expire_all()
+    assert (done.status, done.current_progress, done.completed_at) == (QuestStatus.IN_PROGRESS, 0, None)
+    assert story_quest.status == QuestStatus.COMPLETED
+
+    archived = db_session.query(QuestArchive).one()
+    assert (archived.user_quest_id, archived.period, archived.status, archived.current_progress) == \
+        (done.id, date(2024, 3, 1), QuestStatus.COMPLETED, 1)
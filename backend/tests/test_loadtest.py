@@ -0,0 +1,57 @@
+import asyncio
+
+import httpx
+from fastapi.testclient import TestClient
+from starlette.middleware.base import BaseHTTPMiddleware
+
+import query_counter
+from database import get_db
+from loadtest import TRAFFIC_MIX, onboard_users, run_load
+from main import app
+from tests.conftest import engine, TestingSessionLocal
+
+def _counted_app():
+    """The app as main.py wires it with DB_QUERY_COUNTS=1."""
+    query_counter.install(engine)
+    return BaseHTTPMiddleware(app, dispatch=query_counter.middleware)
+
+def test_query_count_header(client, test_user):
+    """Test that responses carry the request's statement count when enabled."""
+    user_id = test_user.id
+    assert query_counter.HEADER not in client.get(f"/user/profile/{user_id}").headers
+
+    counted = TestClient(_counted_app())
+    profile = counted.get(f"/user/profile/{user_id}")
+    assert int(profile.headers[query_counter.HEADER]) >= 1
+    cached = counted.get(f"/user/profile/{user_id}", headers={"If-None-Match": profile.headers["etag"]})
+    assert cached.headers[query_counter.HEADER] == "1"  # Version lookup only
+
+def test_run_load_in_process(db_session):
+    """Test a short load run end to end against the app in-process."""
+    counted = _counted_app()
+
+    def override_get_db():
+        db = TestingSessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    async def load():
+        transport = httpx.ASGITransport(app=counted)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest") as client:
+            user_ids = await onboard_users(client, 3, run_id="test")
+            return await run_load(client, user_ids, rps=200, duration=0.3, concurrency=1)
+
+    app.dependency_overrides[get_db] = override_get_db
+    try:
+        report = asyncio.run(load())
+    finally:
+        del app.dependency_overrides[get_db]
+
+    assert set(report) <= set(TRAFFIC_MIX)
+    assert sum(row["requests"] for row in report.values()) > 10
+    for row in report.values():
+        assert row["error_rate"] == 0
+        assert row["p50_ms"] <= row["p95_ms"] <= row["p99_ms"]
+        assert row["db_queries_mean"] > 0
@@ -0,0 +1,39 @@
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import Session
+
+from migrate_db import NEW_COLUMNS, NEW_INDEXES, apply_migrations
+from models import Base, User
+
+def test_migration_upgrades_old_schema(tmp_path):
+    """Test that an old-schema database gains the new columns, indexes and backfills, and the ORM works on it."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        # Roll the schema back to before the backlog's columns and indexes
+        for name in NEW_INDEXES:
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+        conn.execute(text("CREATE INDEX ix_character_stats_level ON character_stats (level)"))
+        for table, columns in NEW_COLUMNS.items():
+            for column in columns:
+                if column == "class_id":  # SQLite cannot drop a foreign key column
+                    continue
+                conn.execute(text(f"ALTER TABLE {table} DROP COLUMN {column}"))
+        conn.execute(text("INSERT INTO users (id, username, email) VALUES ('old-user', 'Old Hero', 'old@hero.com')"))
+
+    with engine.begin() as conn:
+        apply_migrations(conn)
+    with engine.begin() as conn:
+        apply_migrations(conn)  # Re-running is a no-op
+
+    inspector = inspect(engine)
+    for table, columns in NEW_COLUMNS.items():
+        assert set(columns) <= {column["name"] for column in inspector.get_columns(table)}
+    indexes = {index["name"] for table in inspector.get_table_names() for index in inspector.get_indexes(table)}
+    assert set(NEW_INDEXES) <= indexes
+    assert "ix_character_stats_level" not in indexes
+
+    with Session(engine) as db:
+        user = db.get(User, "old-user")
+        assert user.state_version == 0
+        assert user.stats.level == 1  # Backfilled stats row
+    engine.dispose()
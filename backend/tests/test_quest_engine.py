@@ -0,0 +1,97 @@
+import quest_engine
+from quest_engine import (
+    EVENT_SYNC, EVENT_BOSS_DEFEATED, EVENT_ZERO_DAMAGE,
+    battle_events, dispatch, quest_handler, seed_quest_definitions, get_definitions
+)
+from models import QuestDefinition, UserQuest, QuestStatus
+
+def _give_quests(db_session, user_id, codes):
+    definitions = {d.code: d.id for d in get_definitions(db_session).values()}
+    quests = {code: UserQuest(user_id=user_id, quest_def_id=definitions[code], current_progress=0,
+                              status=QuestStatus.IN_PROGRESS) for code in codes}
+    db_session.add_all(quests.values())
+    db_session.commit()
+    return quests
+
+def test_battle_events():
+    assert battle_events(None) == [EVENT_SYNC]
+    assert battle_events({"boss_damage_dealt": 0, "boss_defeated": True}) == \
+        [EVENT_SYNC, EVENT_ZERO_DAMAGE, EVENT_BOSS_DEFEATED]
+
+def test_dispatch_updates_only_listening_quests(test_user, db_session):
+    """Test that an event only advances the quests registered for it."""
+    assert seed_quest_definitions(db_session)
+    assert not seed_quest_definitions(db_session)  # Already seeded
+    quests = _give_quests(db_session, test_user.id, ["DAILY_SYNC", "BOSS_SLAYER", "FOCUS_MASTER"])
+
+    completed = dispatch(db_session, test_user.id, [EVENT_SYNC, EVENT_ZERO_DAMAGE])
+    db_session.commit()
+
+    assert {q.id for q in completed} == {quests["DAILY_SYNC"].id, quests["FOCUS_MASTER"].id}
+    assert quests["BOSS_SLAYER"].status == QuestStatus.IN_PROGRESS
+    assert quests["DAILY_SYNC"].completed_at is not None
+
+    # Completed quests no longer listen
+    assert dispatch(db_session, test_user.id, [EVENT_SYNC, EVENT_ZERO_DAMAGE]) == []
+
+def test_registered_handler(test_user, db_session, monkeypatch):
+    """Test that a new quest code plugs in through quest_handler."""
+    monkeypatch.setattr(quest_engine, "_handlers", dict(quest_engine._handlers))
+
+    @quest_handler("MARATHON", EVENT_SYNC)
+    def _marathon(progress, context):
+        return progress + context["minutes"]
+
+    db_session.add(QuestDefinition(code="MARATHON", title="Marathon", target_progress=90))
+    db_session.commit()
+    quest = _give_quests(db_session, test_user.id, ["MARATHON"])["MARATHON"]
+
+    dispatch(db_session, test_user.id, [EVENT_SYNC], {"minutes": 60})
+    assert (quest.current_progress, quest.status) == (60, QuestStatus.IN_PROGRESS)
+    dispatch(db_session, test_user.id, [EVENT_SYNC], {"minutes": 60})
+    assert (quest.current_progress, quest.status) == (120, QuestStatus.COMPLETED)
+
+def test_sync_passes_battle_context(client, test_user, db_session, monkeypatch):
+    """Test that the game loop hands quest handlers the sync's battle summary."""
+    monkeypatch.setattr(quest_engine, "_handlers", dict(quest_engine._handlers))
+
+    @quest_handler("HARD_HITTER", EVENT_SYNC)
+    def _hard_hitter(progress, context):
+        return progress + context["player_damage_dealt"]
+
+    db_session.add(QuestDefinition(code="HARD_HITTER", title="Hard Hitter", target_progress=10 ** 9))
+    db_session.commit()
+    quest = _give_quests(db_session, test_user.id, ["HARD_HITTER"])["HARD_HITTER"]
+    quest_id = quest.id
+
+    battle = client.post(f"/sync/usage/{test_user.id}", json=[]).json()["battle"]
+    db_session.expire_all()
+    assert db_session.get(UserQuest, quest_id).current_progress == battle["player_damage_dealt"] > 0
+
+def test_sync_without_battle_skips_quests(client, test_user, db_session, monkeypatch):
+    """Test that quests are only checked on syncs that fought a battle, as before the engine."""
+    import game_loop
+    from types import SimpleNamespace
+
+    seed_quest_definitions(db_session)
+    quest_id = _give_quests(db_session, test_user.id, ["DAILY_SYNC"])["DAILY_SYNC"].id
+    defeated = SimpleNamespace(id="defeated-boss", name="Doom Scroller", total_hp=100, current_hp=0,
+                               damage_dealt_to_user=0, is_defeated=True)
+    monkeypatch.setattr(game_loop, "get_todays_boss", lambda db, user_id: defeated)
+    monkeypatch.setattr(game_loop, "cache_todays_boss", lambda user_id, boss: None)
+
+    assert client.post(f"/sync/usage/{test_user.id}", json=[]).json()["battle"] is None
+    db_session.expire_all()
+    assert db_session.get(UserQuest, quest_id).status == QuestStatus.IN_PROGRESS
+
+def test_claim_without_definition(client, test_user, db_session):
+    """Test that claiming a quest whose definition is gone is a 404 and leaves it unclaimed."""
+    quest = UserQuest(user_id=test_user.id, quest_def_id="missing", status=QuestStatus.COMPLETED)
+    db_session.add(quest)
+    db_session.commit()
+    quest_id = quest.id
+
+    response = client.post(f"/quests/claim/{quest_id}")
+    assert response.status_code == 404
+    db_session.expire_all()
+    assert db_session.get(UserQuest, quest_id).status == QuestStatus.COMPLETED
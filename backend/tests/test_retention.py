@@ -0,0 +1,60 @@
+import numpy as np
+from datetime import date, datetime, timedelta
+
+from ingest import insert_new_usage_logs, update_daily_rollups
+from models import UsageLog, DailyAppUsage
+from retention import add_months, run_retention
+from schemas import UsageLogCreate
+
+def _log(start, minutes=10, package="com.instagram.android"):
+    return UsageLogCreate(
+        app_package_name=package,
+        start_time=start,
+        end_time=start + timedelta(minutes=minutes),
+        duration_seconds=minutes * 60
+    )
+
+def test_add_months():
+    assert add_months(date(2024, 11, 1), 3) == date(2025, 2, 1)
+    assert add_months(date(2024, 1, 1), -1) == date(2023, 12, 1)
+
+def test_run_retention_archives_expired_months(test_user, db_session, tmp_path):
+    """Test that whole expired months are archived to disk and dropped from the hot table."""
+    user_id = test_user.id
+    logs = [
+        _log(datetime(2024, 1, 5, 9, 0)),
+        _log(datetime(2024, 1, 20, 9, 0), package="com.reddit.frontpage"),
+        _log(datetime(2024, 2, 10, 9, 0)),
+        _log(datetime(2024, 5, 1, 9, 0)),  # Inside the retention window
+    ]
+    insert_new_usage_logs(db_session, user_id, logs, today=date(2024, 1, 5))  # Synced while recent
+    update_daily_rollups(db_session, user_id, logs)
+    db_session.commit()
+
+    # 90 days before 2024-05-15 is 2024-02-15: January is expired, February is not complete yet
+    paths = run_retention(db_session, today=date(2024, 5, 15), retention_days=90, archive_dir=tmp_path)
+
+    assert [p.name for p in paths] == ["usage_logs_y2024m01.part0000.npz"]
+    remaining = sorted(log.start_time for log in db_session.query(UsageLog).all())
+    assert remaining == [datetime(2024, 2, 10, 9, 0), datetime(2024, 5, 1, 9, 0)]
+
+    archive = np.load(paths[0])
+    assert sorted(archive["app_package_name"]) == ["com.instagram.android", "com.reddit.frontpage"]
+    assert list(archive["duration_seconds"]) == [600, 600]
+    assert set(archive["user_id"]) == {user_id}
+
+    # Rollups outlive the raw logs
+    assert db_session.query(DailyAppUsage).count() == 4
+
+def test_ingest_rejects_logs_before_retention_cutoff(test_user, db_session):
+    """Test that logs from an archivable month are not inserted, so a late retry is not rewarded again."""
+    user_id = test_user.id
+    logs = [_log(datetime(2024, 1, 31, 9, 0)), _log(datetime(2024, 2, 1, 9, 0))]
+
+    # Cutoff for 2024-05-15 with 90 days is 2024-02-01
+    inserted = insert_new_usage_logs(db_session, user_id, logs, today=date(2024, 5, 15))
+    assert [log.start_time for log in inserted] == [datetime(2024, 2, 1, 9, 0)]
+    assert db_session.query(UsageLog).count() == 1
+
+def test_run_retention_without_logs(db_session, tmp_path):
+    assert run_retention(db_session, today=date(2024, 5, 15), archive_dir=tmp_path) == []
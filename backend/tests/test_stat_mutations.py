@@ -0,0 +1,57 @@
+from models import CharacterStats
+from stat_mutations import apply_stat_deltas, snapshot, commit_stat_changes, spend_resources
+from tests.conftest import TestingSessionLocal
+
+def test_concurrent_deltas_are_not_lost(test_user, db_session):
+    """Test that two sessions holding stale copies both land their XP."""
+    stats_id = test_user.stats.id
+    first, second = TestingSessionLocal(), TestingSessionLocal()
+    try:
+        a = first.get(CharacterStats, stats_id)
+        b = second.get(CharacterStats, stats_id)
+
+        apply_stat_deltas(first, a, {"xp": 10})
+        first.commit()
+        apply_stat_deltas(second, b, {"xp": 5})
+        second.commit()
+
+        assert b.xp == 15  # Returned value, not the stale copy plus 5
+    finally:
+        first.close()
+        second.close()
+    db_session.expire_all()
+    assert db_session.get(CharacterStats, stats_id).xp == 15
+
+def test_spend_resources_guard(test_user, db_session):
+    """Test that a purchase is all-or-nothing."""
+    stats = test_user.stats
+    stats.gold, stats.bronze, stats.diamond = 100, 50, 0
+    db_session.commit()
+
+    assert not spend_resources(db_session, stats, {"bronze": 60, "gold": 10, "diamond": 0})
+    assert (stats.bronze, stats.gold) == (50, 100)
+
+    assert spend_resources(db_session, stats, {"bronze": 50, "gold": 10, "diamond": 0})
+    assert (stats.bronze, stats.gold) == (0, 90)
+    db_session.commit()
+    db_session.expire_all()
+    assert (stats.bronze, stats.gold) == (0, 90)
+
+def test_commit_stat_changes(test_user, db_session):
+    """Test that in-memory edits are written as deltas on top of the current row."""
+    stats = test_user.stats
+    before = snapshot(stats)
+    stats.xp += 30
+    stats.health -= 500  # Floored at 0
+
+    # Someone else adds XP meanwhile
+    db_session.execute(CharacterStats.__table__.update().values(xp=CharacterStats.xp + 7))
+
+    assert commit_stat_changes(db_session, stats, before)
+    assert (stats.xp, stats.health) == (37, 0)
+    assert not db_session.is_modified(stats)
+
+    before = snapshot(stats)
+    stats.level += 1
+    assert not commit_stat_changes(db_session, stats, before, CharacterStats.level == 99)
+    assert stats.level == before["level"]
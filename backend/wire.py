@@ -0,0 +1,120 @@
+"""
+Wire formats for the sync endpoint.
+JSON stays the default. Clients can opt into MessagePack with
+Content-Type / Accept: application/x-msgpack, using a compact layout:
+
+    request:  {"packages": ["com.app", ...],
+               "logs": [[package_index, start_epoch, end_epoch, duration_seconds], ...]}
+    response: SyncResponse as a MessagePack map
+
+Package names are sent once per upload and logs refer to them by index.
+Timestamps are integer seconds since the Unix epoch (UTC).
+"""
+from datetime import datetime, timezone
+
+import msgpack
+from fastapi import HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import Response
+from pydantic import TypeAdapter, ValidationError
+
+from schemas import UsageLogCreate, SyncResponse
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPE = "application/x-msgpack"
+
+_usage_logs = TypeAdapter(list[UsageLogCreate])
+
+# OpenAPI description of the request body, since it is read by hand
+SYNC_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            JSON_MEDIA_TYPE: {"schema": _usage_logs.json_schema()},
+            MSGPACK_MEDIA_TYPE: {"schema": {
+                "type": "object",
+                "properties": {
+                    "packages": {"type": "array", "items": {"type": "string"}},
+                    "logs": {"type": "array", "items": {"type": "array", "items": {"type": "integer"}, "minItems": 4, "maxItems": 4}},
+                },
+                "required": ["packages", "logs"],
+            }},
+        },
+    },
+    "responses": {"200": {"content": {MSGPACK_MEDIA_TYPE: {}}}},
+}
+
+
+def _media_type(header: str) -> str:
+    return header.split(";", 1)[0].strip().lower()
+
+
+def _to_epoch(value: datetime) -> int:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp())
+
+
+def _from_epoch(seconds: int) -> datetime:
+    # Naive UTC, like the datetimes JSON clients send
+    return datetime.fromtimestamp(seconds, timezone.utc).replace(tzinfo=None)
+
+
+def decode_msgpack_logs(body: bytes) -> list[UsageLogCreate]:
+    """Decode the compact MessagePack upload into UsageLogCreate objects."""
+    try:
+        payload = msgpack.unpackb(body, raw=False)
+        packages = payload["packages"]
+        if any(not 0 <= row[0] < len(packages) for row in payload["logs"]):
+            raise IndexError("package index out of range")
+        return [
+            UsageLogCreate(
+                app_package_name=packages[package],
+                start_time=_from_epoch(start),
+                end_time=_from_epoch(end),
+                duration_seconds=duration,
+            )
+            for package, start, end, duration in payload["logs"]
+        ]
+    except ValidationError as e:
+        raise RequestValidationError(e.errors(include_url=False, include_context=False))
+    except (ValueError, TypeError, KeyError, IndexError, OverflowError, msgpack.UnpackException):
+        raise HTTPException(status_code=400, detail="Malformed MessagePack sync payload")
+
+
+def encode_msgpack_logs(logs: list[UsageLogCreate]) -> bytes:
+    """Client-side counterpart of decode_msgpack_logs (used by tests and tools)."""
+    codes = {}
+    rows = [
+        [codes.setdefault(log.app_package_name, len(codes)),
+         _to_epoch(log.start_time), _to_epoch(log.end_time), log.duration_seconds]
+        for log in logs
+    ]
+    return msgpack.packb({"packages": list(codes), "logs": rows})
+
+
+async def read_usage_logs(request: Request) -> list[UsageLogCreate]:
+    """Dependency: the sync upload, decoded according to its Content-Type."""
+    body = await request.body()
+    media_type = _media_type(request.headers.get("content-type", JSON_MEDIA_TYPE))
+    if media_type == MSGPACK_MEDIA_TYPE:
+        return decode_msgpack_logs(body)
+    if media_type != JSON_MEDIA_TYPE:
+        raise HTTPException(status_code=415, detail=f"Unsupported sync payload type: {media_type}")
+    try:
+        return _usage_logs.validate_json(body)
+    except ValidationError as e:
+        raise RequestValidationError(e.errors(include_url=False, include_context=False))
+
+
+def wants_msgpack(request: Request) -> bool:
+    accept = request.headers.get("accept", "")
+    return any(_media_type(part) == MSGPACK_MEDIA_TYPE for part in accept.split(","))
+
+
+def sync_response(request: Request, result):
+    """Return the sync result as MessagePack if the client asked for it, else let FastAPI serialize JSON."""
+    if not wants_msgpack(request):
+        return result
+    body = SyncResponse.model_validate(result, from_attributes=True).model_dump(mode="json")
+    return Response(content=msgpack.packb(body), media_type=MSGPACK_MEDIA_TYPE)
@@ -24,4 +24,15 @@ api.claimQuest = async (questId) => {
     return response.data;
 };
 
+// --- Usage Stats ---
+api.getDailyUsage = async (userId, day) => {
+    try {
+        const response = await api.get(`/stats/daily/${userId}`, { params: day ? { day } : {} });
+        return response.data;
+    } catch (error) {
+        console.error("Error fetching daily usage:", error);
+        return [];
+    }
+};
+
 export default api;